@@ -0,0 +1,294 @@
+# -- [ Headless batch inference over folders of tiles ] -- #
+# Runs the same models as the app (through inference.py) without Streamlit and writes
+# masks, boxes and metrics to disk. Progress is recorded as it goes so an interrupted run
+# can be started again with the same arguments and it will skip what is already done.
+#
+# e.g. python batch_infer.py --model "U-Net" --input "images/*/test/*.png" --output outputs/unet --device cpu
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import cv2
+import numpy as np
+import utils_metrics as metrics
+# -- ############################### -- #
+
+MODEL_CHOICES = ["U-Net", "Deeplabv3+", "MMYOLOv8", "MMYOLO -> SAM"]
+PROGRESS_FILE = "progress.jsonl"
+# -- semantic models stream this many batches per task, so progress is saved regularly -- #
+BATCHES_PER_TASK = 8
+METRICS_FILE = "metrics.csv"
+METRICS_SUMMARY_FILE = "metrics_summary.json"
+COUNT_NAMES = ["tp", "fp", "fn", "tn"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batch inference over a folder of H&E tiles")
+    parser.add_argument("--model", required=True, choices=MODEL_CHOICES)
+    parser.add_argument("--input", required=True, help="glob of images, e.g. 'images/*/test/*.png'")
+    parser.add_argument("--output", required=True, type=Path, help="directory to write results to")
+    parser.add_argument("--device", default=None,
+                        help="torch device, e.g. cpu or cuda:0 (default APP_DEVICE, else cuda:0 if available, else cpu)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (each loads its own model)")
+    parser.add_argument("--batch-size", type=int, default=1, help="images per forward pass (semantic models)")
+    parser.add_argument("--score-thr", type=float, default=0.0, help="detector score threshold")
+    parser.add_argument("--sam-model", default=None, choices=["vit_h", "vit_l", "vit_b"],
+                        help="SAM backbone, default vit_h on GPU and vit_b on CPU")
+    parser.add_argument("--sam-budget", type=float, default=0, help="SAM memory budget per batch in MB, 0 = auto")
+    parser.add_argument("--tile", type=int, default=0,
+                        help="sliding window size for large images/slides (.npy, .tif, .svs ...), 0 = whole image")
+    parser.add_argument("--overlap", type=int, default=128, help="overlap between neighbouring tiles in pixels")
+    parser.add_argument("--throughput", action="store_true",
+                        help="semantic models only: report images/s at batch sizes 1, 2, 4, 8 and exit")
+    parser.add_argument("--no-resume", action="store_true", help="reprocess images already listed in the progress file")
+    args = parser.parse_args()
+    if args.throughput:
+        from utils_common import SEMANTIC_MODELS
+        if args.model not in SEMANTIC_MODELS:
+            parser.error(f"--throughput only measures the semantic models ({', '.join(SEMANTIC_MODELS)}), not {args.model}")
+    return args
+
+# -- [ Resumable progress ] -- #
+def load_progress(output:Path) -> set:
+    """Images already done, failed ones (with an "error") are tried again"""
+    done = set()
+    progress_file = output / PROGRESS_FILE
+    if progress_file.exists():
+        with open(progress_file) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    if "error" not in entry:
+                        done.add(entry["image"])
+    return done
+
+def record_progress(output:Path, image:str, image_scores:dict = None, error:str = None):
+    entry = {"image": image} if error is None else {"image": image, "error": error}
+    with open(output / PROGRESS_FILE, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    if image_scores:
+        metrics_file = output / METRICS_FILE
+        header = None
+        if metrics_file.exists():
+            with open(metrics_file, newline="") as f:
+                header = next(csv.reader(f), None)
+        with open(metrics_file, "a", newline="") as f:
+            # -- rows follow the existing header, so resuming into a metrics.csv from an older version
+            # -- drops the columns it doesn't have and leaves the ones it has but we don't empty -- #
+            writer = csv.DictWriter(f, fieldnames=header or list(image_scores.keys()), extrasaction="ignore")
+            if not header:
+                writer.writeheader()
+            writer.writerow(image_scores)
+
+def summarise_metrics(output:Path) -> dict:
+    """
+    NAME: summarise_metrics
+    DESC: Dataset level scores from the pixel counts of every image in metrics.csv (not the mean of
+          the per image scores), written to metrics_summary.json
+    """
+    metrics_file = output / METRICS_FILE
+    if not metrics_file.exists():
+        return None
+    totals = dict.fromkeys(COUNT_NAMES, 0)
+    images = 0
+    with open(metrics_file, newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get("tp"):
+                for name in COUNT_NAMES:
+                    totals[name] += int(row[name])
+                images += 1
+    if not images:
+        return None
+    summary = {"images": images, **metrics.class_scores(metrics.counts_matrix(**totals)), **totals}
+    (output / METRICS_SUMMARY_FILE).write_text(json.dumps(summary, indent=2))
+    return summary
+
+# -- [ Worker side ] -- #
+def init_worker(workers:int):
+    import devices
+    # -- split the CPU between the worker processes instead of each one grabbing every core -- #
+    devices.configure_cpu_threads(int(os.environ.get(devices.THREADS_ENV, 0)) or
+                                  max(1, devices.available_cpus() // workers))
+
+def image_metrics(image_path:str, mask:np.ndarray) -> dict:
+    """Metrics against the ground truth mask, if the image has one (sample datasets only)"""
+    import utils_common as utils
+    gt_path = utils.mask_searcher(Path(image_path).name)
+    if gt_path is None:
+        return None
+    # -- one confusion matrix: the scores plus the pixel counts summarise_metrics adds up -- #
+    matrix = metrics.confusion_matrix(utils.read_mask(gt_path), mask)
+    return {"image": image_path, "name": Path(gt_path).stem, **metrics.class_scores(matrix), **metrics.class_counts(matrix)}
+
+def write_boxes(path:Path, detections):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["x1", "y1", "x2", "y2", "score", "label"])
+        for box, score, label in zip(detections.boxes.tolist(), detections.scores.tolist(), detections.labels.tolist()):
+            writer.writerow([*box, round(score, 4), label])
+
+def write_instance_map(output:Path, stem:str, instance_map:np.ndarray):
+    """16 bit png of the instance ids when they fit, else .npy (a png can't hold more than 65535 ids)"""
+    if instance_map.max(initial=0) <= np.iinfo(np.uint16).max:
+        cv2.imwrite(str(output / f"{stem}_instances.png"), instance_map.astype(np.uint16))
+    else:
+        np.save(output / f"{stem}_instances.npy", instance_map)
+
+def guarded(path:str, work) -> tuple:
+    """(path, metrics dict or None, error or None) of work(), so one bad image doesn't stop the run"""
+    try:
+        return path, work(), None
+    except Exception as error:
+        print(f"[!] {path} failed: {type(error).__name__}: {error}")
+        return path, None, f"{type(error).__name__}: {error}"
+
+def process_tiled(model_name:str, image_paths:list, output:Path, device:str, tile:int, overlap:int,
+                  score_thr:float) -> list:
+    """
+    NAME: process_tiled
+    DESC: Sliding window version of process_batch for images too big to run in one go,
+          semantic masks are written as memory-mapped .npy files
+    """
+    import inference
+    import tiling
+    def run(path):
+        reader = tiling.open_region_reader(path)
+        stem = Path(path).stem
+        if model_name in inference.SEMANTIC_MODELS:
+            model = inference.semantic_model(model_name, device=device)
+            tiling.tiled_semantic_inference(model, reader, output / f"{stem}_mask.npy", tile=tile, overlap=overlap)
+        else:
+            model = inference.detector_model(device=device)
+            detections = tiling.tiled_detection_inference(model, reader, tile=tile, overlap=overlap, score_thr=score_thr)
+            write_boxes(output / f"{stem}_boxes.csv", detections)
+        return None
+    return [guarded(path, lambda path=path: run(path)) for path in image_paths]
+
+def process_batch(model_name:str, image_paths:list, output:Path, device:str, batch_size:int,
+                  score_thr:float, sam_budget:float, sam_model:str) -> list:
+    """
+    NAME: process_batch
+    DESC: Runs a chunk of images through the chosen model and writes the results for each one.
+          An image that fails is reported and skipped, the others carry on.
+    OUTPUT: list of (image path, metrics dict or None, error or None)
+    """
+    import inference
+    done = []
+    if model_name in inference.SEMANTIC_MODELS:
+        model = inference.semantic_model(model_name, device=device)
+        def save(path, mask):
+            cv2.imwrite(str(output / f"{Path(path).stem}_mask.png"), mask)
+            return image_metrics(path, mask)
+        finished = set()
+        try:
+            for path, mask in inference.batched_semantic_inference(model, image_paths, batch_size=batch_size):
+                done.append(guarded(path, lambda: save(path, mask)))
+                finished.add(path)
+        except Exception as error:
+            # -- a bad tile stops the batched generator, what's left goes one image at a time -- #
+            print(f"[!] Batch failed ({type(error).__name__}: {error}), retrying its images one by one")
+            for path in image_paths:
+                if path not in finished:
+                    done.append(guarded(path, lambda path=path: save(*next(
+                        inference.batched_semantic_inference(model, [path], batch_size=1)))))
+    elif model_name == "MMYOLOv8":
+        def run(path):
+            detections = inference.detection_inference(path, device=device, score_thr=score_thr)
+            write_boxes(output / f"{Path(path).stem}_boxes.csv", detections)
+            return None
+        done = [guarded(path, lambda path=path: run(path)) for path in image_paths]
+    else:
+        def run(path):
+            image = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+            result = inference.pipeline_inference(path, image, device=device, score_thr=score_thr,
+                                                  sam_budget=sam_budget, sam_model=sam_model)
+            stem = Path(path).stem
+            write_boxes(output / f"{stem}_boxes.csv", result.detections)
+            mask = (result.instance_map > 0).astype(np.uint8)
+            cv2.imwrite(str(output / f"{stem}_mask.png"), mask)
+            write_instance_map(output, stem, result.instance_map)
+            np.savez_compressed(output / f"{stem}_instances.npz", **result.instances._asdict())
+            return image_metrics(path, mask)
+        done = [guarded(path, lambda path=path: run(path)) for path in image_paths]
+    return done
+
+# -- [ Driver ] -- #
+def main():
+    args = parse_args()
+    import devices
+    # -- resolved once here so every worker gets the same device (and the cpu fallback) -- #
+    args.device = devices.select_device(args.device)
+    args.output.mkdir(parents=True, exist_ok=True)
+    image_paths = sorted(p.replace("\\", "/") for p in glob.glob(args.input))
+    if args.tile and args.model == "MMYOLO -> SAM":
+        raise SystemExit("[!] Tiled inference is only available for the semantic and detection models")
+    if args.throughput:
+        import inference
+        init_worker(1)
+        model = inference.semantic_model(args.model, device=args.device)
+        for batch_size in (1, 2, 4, 8):
+            print(f"[*] batch size {batch_size}: {inference.semantic_throughput(model, image_paths, batch_size):.2f} images/s")
+        return
+    done = set() if args.no_resume else load_progress(args.output)
+    todo = [path for path in image_paths if path not in done]
+    print(f"[*] {len(image_paths)} images found, {len(image_paths) - len(todo)} already done, {len(todo)} to process")
+    if not todo:
+        return
+    batch_size = max(1, args.batch_size)
+    chunk = batch_size * BATCHES_PER_TASK
+    batches = [todo[i:i + chunk] for i in range(0, len(todo), chunk)]
+    job = process_batch
+    job_args = (args.output, args.device, batch_size, args.score_thr, args.sam_budget, args.sam_model)
+    if args.tile:
+        # -- one slide per task, tiles are streamed inside it -- #
+        job = process_tiled
+        batches = [[path] for path in todo]
+        job_args = (args.output, args.device, args.tile, args.overlap, args.score_thr)
+    finished = 0
+    failed = 0
+    start = time.perf_counter()
+    def record(results):
+        nonlocal finished, failed
+        for image, image_scores, error in results:
+            record_progress(args.output, image, image_scores, error)
+            finished += 1
+            failed += error is not None
+            print(f"[**] {finished}/{len(todo)} | {image}" + (" | failed" if error else ""))
+    def task_failed(batch, error):
+        # -- the whole task went down (e.g. the model didn't load), every image of it is marked failed -- #
+        print(f"[!] Task failed: {type(error).__name__}: {error}")
+        return [(image, None, f"{type(error).__name__}: {error}") for image in batch]
+    if args.workers <= 1:
+        init_worker(1)
+        for batch in batches:
+            try:
+                results = job(args.model, batch, *job_args)
+            except Exception as error:
+                results = task_failed(batch, error)
+            record(results)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.workers,)) as pool:
+            futures = {pool.submit(job, args.model, batch, *job_args): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as error:
+                    results = task_failed(futures[future], error)
+                record(results)
+    elapsed = time.perf_counter() - start
+    print(f"[*] Done, {finished} images in {elapsed:.1f}s ({finished / elapsed:.2f} images/s), results in {args.output}")
+    if failed:
+        print(f"[!] {failed} images failed (see {PROGRESS_FILE}), run the same command again to retry them")
+    summary = summarise_metrics(args.output)
+    if summary:
+        print(f"[*] Dataset metrics over {summary['images']} images: " +
+              ", ".join(f"{name} {summary[name]:.4f}" for name in metrics.METRIC_NAMES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -- [ Micro-batching of concurrent inference requests ] -- #
+# Single image requests from different threads (job workers, inference server clients) are held
+# for a short window, grouped by key (model / settings / tile size) and run as one batched call,
+# then every caller gets its own result back. A batch goes as soon as max_batch requests with its
+# key are waiting, and the window counts from when its oldest request arrived, so no request waits
+# more than the window (plus the calls ahead of it) for company.
+#   APP_BATCH_WINDOW_MS = how long the first request of a batch waits for others (default 20, 0 = take only what is already queued)
+#   APP_MAX_BATCH       = most images per batched call (default 8)
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Hashable
+# -- ############################### -- #
+
+BATCH_WINDOW_MS = float(os.environ.get("APP_BATCH_WINDOW_MS", 20))
+MAX_BATCH = int(os.environ.get("APP_MAX_BATCH", 8))
+
+
+class MicroBatcher:
+    """
+    NAME: MicroBatcher
+    DESC: One scheduler thread. The oldest request picks the key of the next batch, which takes every
+          request with that key arriving within window_ms of it (at most max_batch), requests for
+          other keys wait their turn in the backlog. run(key, items) is called once per batch and
+          must return one result per item, an exception fails every request of the batch.
+    """
+    def __init__(self, name:str, run:Callable, window_ms:float = BATCH_WINDOW_MS, max_batch:int = MAX_BATCH):
+        self.name = name
+        self.run = run
+        self.window_s = max(window_ms, 0) / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._backlog = deque()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "largest": 0, "waited_ms": 0.0, "run_ms": 0.0}
+        threading.Thread(target=self._loop, name=f"batcher-{name}", daemon=True).start()
+
+    def submit(self, key:Hashable, item) -> Future:
+        future = Future()
+        self._queue.put((key, item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, key:Hashable, item):
+        """Blocking submit: the result for item"""
+        return self.submit(key, item).result()
+
+    def stats(self) -> dict:
+        """Counters with the mean batch size and mean time requests waited for their batch"""
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"] or 1
+        stats["mean_batch"] = round(stats["requests"] / (stats["batches"] or 1), 2)
+        stats["mean_wait_ms"] = round(stats.pop("waited_ms") / requests, 2)
+        stats["run_ms"] = round(stats["run_ms"], 1)
+        stats["waiting"] = self._queue.qsize() + len(self._backlog)
+        return stats
+
+    def _collect(self):
+        """(key, [(item, future, queued)]) of the next batch"""
+        if not self._backlog:
+            self._backlog.append(self._queue.get())
+        key = self._backlog[0][0]
+        deadline = self._backlog[0][3] + self.window_s
+        count = sum(1 for request in self._backlog if request[0] == key)
+        while count < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._backlog.append(request)
+            count += request[0] == key
+        batch, rest = [], deque()
+        for request in self._backlog:
+            (batch if request[0] == key and len(batch) < self.max_batch else rest).append(request)
+        self._backlog = rest
+        return key, [(item, future, queued) for _, item, future, queued in batch]
+
+    def _loop(self):
+        while True:
+            key, batch = self._collect()
+            start = time.perf_counter()
+            try:
+                results = list(self.run(key, [item for item, _, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch of {len(batch)} requests gave {len(results)} results")
+            except Exception as error: # -- handed to the callers, the scheduler keeps going -- #
+                for _, future, _ in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            with self._lock:
+                self._stats["requests"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["largest"] = max(self._stats["largest"], len(batch))
+                self._stats["waited_ms"] += sum(start - queued for _, _, queued in batch) * 1000
+                self._stats["run_ms"] += (time.perf_counter() - start) * 1000
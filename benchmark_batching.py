@@ -0,0 +1,66 @@
+# -- [ Micro-batching benchmark ] -- #
+# Simulates --users sessions pressing "Process Image" at the same time on MoNuSeg test tiles and
+# compares every request running its own forward pass with inference.BatchedInference, which
+# micro-batches them (batching.py). Reports throughput and the median / worst request latency.
+#
+# e.g. python benchmark_batching.py --model U-Net --users 8 --window-ms 20 --max-batch 8
+import argparse
+import glob
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+# -- ############################### -- #
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Throughput / latency with and without micro-batching")
+    parser.add_argument("--model", default="U-Net", choices=["U-Net", "Deeplabv3+", "MMYOLOv8"])
+    parser.add_argument("--input", default="images/MoNuSeg/test/*.png")
+    parser.add_argument("--users", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--rounds", type=int, default=3, help="requests per user")
+    parser.add_argument("--window-ms", type=float, default=20)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--device", default=None, help="torch device, default APP_DEVICE / auto")
+    return parser.parse_args()
+
+def run_load(engine, model_name:str, images:list, users:int, rounds:int, device) -> dict:
+    """users threads each sending rounds single image requests back to back"""
+    def request(image):
+        start = time.perf_counter()
+        if model_name == "MMYOLOv8":
+            engine.detection_inference(image, device=device)
+        else:
+            engine.semantic_inference(model_name, [image], device=device)
+        return time.perf_counter() - start
+    def user(index):
+        return [request(images[(index + r) % len(images)]) for r in range(rounds)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        latencies = [t for per_user in pool.map(user, range(users)) for t in per_user]
+    elapsed = time.perf_counter() - start
+    return {"images_per_s": round(len(latencies) / elapsed, 2),
+            "median_ms": round(float(np.median(latencies)) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1)}
+
+def main():
+    args = parse_args()
+    import devices
+    import inference
+    device = devices.select_device(args.device)
+    # -- same size tiles so the semantic requests can share a batch -- #
+    images = [cv2.imread(path) for path in sorted(glob.glob(args.input))]
+    assert images, f"No images match {args.input}"
+    shape = images[0].shape
+    images = [image for image in images if image.shape == shape]
+    batched = inference.BatchedInference(window_ms=args.window_ms, max_batch=args.max_batch)
+    run_load(inference, args.model, images, 1, 1, device) # -- load + warm up -- #
+    run_load(batched, args.model, images, 1, 1, device)
+    print(f"[*] {args.model} on {device}: {args.users} users x {args.rounds} requests, {len(images)} tiles of {shape[:2]}")
+    for name, engine in (("one pass per request", inference), (f"micro-batched ({args.window_ms:g} ms / {args.max_batch})", batched)):
+        print(f"      {name}: {run_load(engine, args.model, images, args.users, args.rounds, device)}")
+    print(f"      batching: {batched.stats()}")
+
+
+if __name__ == "__main__":
+    main()
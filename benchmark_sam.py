@@ -0,0 +1,101 @@
+# -- [ SAM backbone benchmark ] -- #
+# Latency and peak memory of each SAM backbone (vit_b / vit_l / vit_h) on one MoNuSeg test tile,
+# prompted with the ground truth nuclei boxes. Each backbone runs in its own process so the peak
+# memory numbers don't include the previous one.
+#
+# e.g. python benchmark_sam.py --device cpu
+import argparse
+import multiprocessing as mp
+import resource
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+# -- ############################### -- #
+
+DEFAULT_IMAGE = "images/MoNuSeg/test/TCGA-2Z-A9J9-01A-01-TS1.png"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Latency / peak memory per SAM backbone")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="MoNuSeg tile to prompt")
+    parser.add_argument("--device", default=None, help="torch device, default APP_DEVICE / auto")
+    parser.add_argument("--models", nargs="+", default=["vit_b", "vit_l", "vit_h"])
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs after one warm up run")
+    return parser.parse_args()
+
+def gt_boxes(image_path:str) -> np.ndarray:
+    """Nuclei boxes (x1, y1, x2, y2) from the ground truth mask of a MoNuSeg test tile"""
+    mask = cv2.imread(f"images/MoNuSeg/masks/test/{Path(image_path).name}", cv2.IMREAD_GRAYSCALE)
+    assert mask is not None, "No ground truth mask for this image, use one from images/MoNuSeg/test"
+    count, _, stats, _ = cv2.connectedComponentsWithStats((mask > 0).astype(np.uint8))
+    x, y, w, h = stats[1:, 0], stats[1:, 1], stats[1:, 2], stats[1:, 3]
+    return np.stack([x, y, x + w, y + h], axis=1).astype(np.int32)
+
+def peak_memory_mb(device:str) -> float:
+    import torch
+    if device.startswith("cuda"):
+        return torch.cuda.max_memory_allocated() / 1024**2
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # -- kB on linux -- #
+
+def run_backbone(model_type:str, image_path:str, device:str, repeats:int, results):
+    import torch
+    from segment_anything import sam_model_registry, SamPredictor
+    import utils
+    import devices
+    device = devices.select_device(device) # -- sets the CPU thread counts in this process -- #
+    image = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB)
+    boxes = gt_boxes(image_path)
+    start = time.perf_counter()
+    sam = sam_model_registry[model_type](checkpoint=utils.sam_checkpoint_path(model_type))
+    sam.to(device=device)
+    predictor = SamPredictor(sam)
+    load_time = time.perf_counter() - start
+    batch_size = utils.sam_batch_size(image.shape, device)
+    encoder_times, decoder_times = [], []
+    with torch.no_grad():
+        for run in range(repeats + 1):
+            start = time.perf_counter()
+            predictor.set_image(image)
+            if device.startswith("cuda"):
+                torch.cuda.synchronize()
+            encoder = time.perf_counter() - start
+            decoder = sum(batch.seconds for batch in
+                          utils.stream_prompts_sam(image.shape, predictor, utils.input_boxes_sam(boxes, batch_size)))
+            if run > 0: # -- first run is the warm up -- #
+                encoder_times.append(encoder)
+                decoder_times.append(decoder)
+    results.put({
+        "backbone": model_type,
+        "params_M": round(sum(p.numel() for p in sam.parameters()) / 1e6, 1),
+        "load_s": round(load_time, 2),
+        "encoder_s": round(float(np.median(encoder_times)), 3),
+        "decoder_s": round(float(np.median(decoder_times)), 3),
+        "boxes": len(boxes),
+        "peak_mb": round(peak_memory_mb(device), 1),
+    })
+
+def main():
+    args = parse_args()
+    import devices
+    args.device = devices.select_device(args.device)
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    rows = []
+    for model_type in args.models:
+        print(f"[*] Benchmarking SAM {model_type} on {args.device}")
+        proc = ctx.Process(target=run_backbone, args=(model_type, args.image, args.device, args.repeats, results))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            print(f"[!] {model_type} failed (exit code {proc.exitcode})")
+            continue
+        rows.append(results.get())
+    header = ["backbone", "params_M", "load_s", "encoder_s", "decoder_s", "boxes", "peak_mb"]
+    print(" | ".join(header))
+    for row in rows:
+        print(" | ".join(str(row[key]) for key in header))
+
+
+if __name__ == "__main__":
+    main()
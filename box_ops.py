@@ -0,0 +1,39 @@
+# -- [ Box helpers without torch / OpenMMLab ] -- #
+# Shared by the tiled detector (cross-tile NMS) and the exported model backend.
+import numpy as np
+# -- ############################### -- #
+
+
+def nms(boxes:np.ndarray, scores:np.ndarray, iou_thr:float = 0.5) -> np.ndarray:
+    """
+    NAME: nms
+    DESC: Greedy non maximum suppression on (N, 4) x1, y1, x2, y2 boxes
+    OUTPUT: indices of the kept boxes, highest score first
+    """
+    boxes = boxes.astype(np.float32)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        order = rest[iou <= iou_thr]
+    return np.asarray(keep, dtype=np.int64)
+
+def box_iou(boxes_a:np.ndarray, boxes_b:np.ndarray) -> np.ndarray:
+    """(N, M) IoU between two sets of x1, y1, x2, y2 boxes"""
+    boxes_a = boxes_a.astype(np.float32)[:, None]
+    boxes_b = boxes_b.astype(np.float32)[None]
+    inter_w = np.clip(np.minimum(boxes_a[..., 2], boxes_b[..., 2]) - np.maximum(boxes_a[..., 0], boxes_b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(boxes_a[..., 3], boxes_b[..., 3]) - np.maximum(boxes_a[..., 1], boxes_b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (boxes_a[..., 2] - boxes_a[..., 0]) * (boxes_a[..., 3] - boxes_a[..., 1])
+    area_b = (boxes_b[..., 2] - boxes_b[..., 0]) * (boxes_b[..., 3] - boxes_b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
@@ -0,0 +1,69 @@
+# -- [ Mask overlays ] -- #
+# Label maps (semantic classes, instance ids, ground truth vs prediction codes ...) are coloured with
+# a single palette lookup per pixel and laid over the image with an integer alpha blend, so the cost
+# is O(pixels) whatever the number of labels. The coloured RGBA layer is made once per mask, moving
+# the opacity slider only redoes the blend.
+from typing import Sequence
+import numpy as np
+# -- ############################### -- #
+
+DEFAULT_OPACITY = 0.5
+BINARY_PALETTE = [[0, 0, 0], [255, 255, 255]]
+# -- codes of gt_pred_codes: nothing, prediction only, ground truth only, both -- #
+GT_PRED_PALETTE = [[0, 0, 0], [255, 0, 0], [0, 0, 255], [255, 0, 255]]
+# -- cycled over instance ids, every nucleus gets a colour different from its id neighbours -- #
+INSTANCE_PALETTE = [[30, 144, 255], [255, 99, 71], [50, 205, 50], [255, 215, 0], [186, 85, 211],
+                    [0, 206, 209], [255, 140, 0], [255, 105, 180], [154, 205, 50], [100, 149, 237]]
+
+
+def as_labels(labels:np.ndarray) -> np.ndarray:
+    """Label map usable as lookup table indices (bool masks become 0 / 1)"""
+    labels = np.asarray(labels)
+    return labels.view(np.uint8) if labels.dtype == bool else labels
+
+def palette_lut(palette:Sequence, size:int, transparent:Sequence[int] = ()) -> np.ndarray:
+    """(size, 4) uint8 RGBA table: palette cycled over labels 0 .. size - 1, alpha 0 for the transparent labels"""
+    palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+    lut = np.empty((size, 4), dtype=np.uint8)
+    lut[:, :3] = palette[np.arange(size) % len(palette)]
+    lut[:, 3] = 255
+    lut[[label for label in transparent if 0 <= label < size], 3] = 0
+    return lut
+
+def _lut_for(labels:np.ndarray, palette:Sequence, transparent:Sequence[int] = ()) -> np.ndarray:
+    size = 256 if labels.dtype == np.uint8 else max(len(palette), int(labels.max(initial=0)) + 1)
+    return palette_lut(palette, size, transparent)
+
+def colour_labels(labels:np.ndarray, palette:Sequence) -> np.ndarray:
+    """(H, W, 3) uint8 RGB image of a label map, one table lookup per pixel"""
+    labels = as_labels(labels)
+    return np.ascontiguousarray(_lut_for(labels, palette)[:, :3])[labels]
+
+def colour_layer(labels:np.ndarray, palette:Sequence, transparent:Sequence[int] = (0,)) -> np.ndarray:
+    """(H, W, 4) uint8 RGBA layer of a label map, the transparent labels (background) get alpha 0"""
+    labels = as_labels(labels)
+    return _lut_for(labels, palette, transparent)[labels]
+
+def blend(image:np.ndarray, layer:np.ndarray, opacity:float = DEFAULT_OPACITY) -> np.ndarray:
+    """
+    NAME: blend
+    DESC: image (H, W, 3) uint8 with the RGBA layer laid over it at opacity (0 - 1).
+          Integer arithmetic: out = (image * (255 - a) + colour * a) / 255 with a = layer alpha * opacity.
+    """
+    alpha = layer[..., 3:].astype(np.uint16)
+    alpha = (alpha * int(round(min(max(opacity, 0.0), 1.0) * 255)) + 127) // 255
+    out = image.astype(np.uint16) * (255 - alpha)
+    out += layer[..., :3] * alpha
+    out += 127
+    out //= 255
+    return out.astype(np.uint8)
+
+def background_labels(classes:Sequence[str]) -> list:
+    """Indices of the classes not worth drawing (background)"""
+    return [label for label, name in enumerate(classes) if str(name).lower() in ("background", "bg")]
+
+def gt_pred_codes(gt:np.ndarray, pred:np.ndarray) -> np.ndarray:
+    """0 nothing, 1 prediction only, 2 ground truth only, 3 both (colours: GT_PRED_PALETTE)"""
+    codes = (np.asarray(gt) > 0).view(np.uint8) << 1
+    codes |= (np.asarray(pred) > 0).view(np.uint8)
+    return codes
@@ -0,0 +1,69 @@
+# -- [ Device selection ] -- #
+# Every model initialiser asks here which device to use instead of hardcoding cuda, so the app runs
+# unchanged on CPU-only inference nodes. torch is imported on first use, not with this module.
+#   APP_DEVICE      = auto (default) | cpu | cuda | cuda:<n>
+#   APP_NUM_THREADS = threads for torch / OpenCV on CPU (default: every core this process may use)
+import os
+import threading
+from typing import Optional
+import cv2
+# -- ############################### -- #
+
+DEVICE_ENV = "APP_DEVICE"
+THREADS_ENV = "APP_NUM_THREADS"
+
+_threads_lock = threading.Lock()
+_threads_configured = {} # -- pid -> thread count, forked workers configure their own -- #
+
+
+def available_cpus() -> int:
+    """Cores this process is allowed to run on (respects taskset / container cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def configure_cpu_threads(num_threads:Optional[int] = None) -> int:
+    """
+    NAME: configure_cpu_threads
+    DESC: Sets torch intra-op / inter-op and OpenCV thread counts for CPU inference. Uses num_threads,
+          else APP_NUM_THREADS, else every available core. Only the first call in a process does
+          anything, later calls return the count already set (torch can't change inter-op threads
+          once it has run).
+    """
+    import torch
+    with _threads_lock:
+        if os.getpid() in _threads_configured:
+            return _threads_configured[os.getpid()]
+        threads = num_threads or int(os.environ.get(THREADS_ENV, 0)) or available_cpus()
+        threads = max(1, threads)
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(max(1, min(4, threads // 4)))
+        except RuntimeError:
+            pass # -- parallel work already started in this process, keep torch's default -- #
+        cv2.setNumThreads(threads)
+        _threads_configured[os.getpid()] = threads
+        print(f"[*] CPU inference using {threads} threads")
+        return threads
+
+def select_device(preferred:Optional[str] = None) -> str:
+    """
+    NAME: select_device
+    DESC: Device for the models: preferred if given, else APP_DEVICE, else auto. cuda requests fall
+          back to cpu when no GPU is available, and choosing cpu configures the thread counts.
+    OUTPUT: torch device string, "cpu" or "cuda:<n>"
+    """
+    import torch
+    requested = (preferred or os.environ.get(DEVICE_ENV) or "auto").strip().lower()
+    if requested == "auto":
+        requested = "cuda:0" if torch.cuda.is_available() else "cpu"
+    if requested.startswith("cuda"):
+        if not torch.cuda.is_available():
+            print(f"[!] {requested} requested but CUDA is not available, falling back to cpu")
+            requested = "cpu"
+        elif requested == "cuda":
+            requested = "cuda:0"
+    if requested == "cpu":
+        configure_cpu_threads()
+    return requested
@@ -0,0 +1,79 @@
+# -- [ Float vs INT8 accuracy / latency check ] -- #
+# Runs each model in float and int8 on the CPU over the MoNuSeg test tiles and reports IoU / F1
+# against the ground truth masks (utils_metrics, mean per tile and pooled over the dataset) with
+# the median latency per tile, so the accuracy given up for the speedup is known before turning
+# APP_QUANTIZE on.
+#
+# e.g. python evaluate_quantization.py --models U-Net "MMYOLO -> SAM"
+import argparse
+import glob
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import utils_metrics as metrics
+# -- ############################### -- #
+
+MODEL_CHOICES = ["U-Net", "Deeplabv3+", "MMYOLO -> SAM"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="IoU / F1 and latency of the float and int8 models on CPU")
+    parser.add_argument("--models", nargs="+", default=MODEL_CHOICES, choices=MODEL_CHOICES)
+    parser.add_argument("--input", default="images/MoNuSeg/test/*.png", help="glob of tiles with ground truth masks")
+    parser.add_argument("--sam-model", default="vit_b", choices=["vit_h", "vit_l", "vit_b"])
+    return parser.parse_args()
+
+def predict(model_name:str, path:str, quantize:bool, sam_model:str) -> np.ndarray:
+    """Binary (H, W) nuclei mask of one tile"""
+    import inference
+    image = cv2.imread(path)
+    if model_name == "MMYOLO -> SAM":
+        result = inference.pipeline_inference(path, cv2.cvtColor(image, cv2.COLOR_BGR2RGB), device="cpu",
+                                              sam_model=sam_model, quantize=quantize)
+        return (result.instance_map > 0).astype(np.uint8)
+    return inference.semantic_inference(model_name, [image], device="cpu", quantize=quantize)[0]
+
+def evaluate(model_name:str, paths:list, quantize:bool, sam_model:str) -> dict:
+    ious, f1s, latencies = [], [], []
+    totals = metrics.ConfusionMatrix(2)
+    predict(model_name, paths[0], quantize, sam_model) # -- warm up (and quantize / calibrate) -- #
+    for path in paths:
+        gt = cv2.imread(f"images/MoNuSeg/masks/test/{Path(path).name}", cv2.IMREAD_GRAYSCALE)
+        start = time.perf_counter()
+        pred = predict(model_name, path, quantize, sam_model)
+        latencies.append(time.perf_counter() - start)
+        scores = metrics.class_scores(totals.update(gt, pred))
+        ious.append(scores["iou"])
+        f1s.append(scores["f1"])
+    return {
+        "model": model_name,
+        "mode": "int8" if quantize else "float",
+        "iou": round(float(np.mean(ious)), 4),
+        "f1": round(float(np.mean(f1s)), 4),
+        "dataset_iou": round(totals.scores()["iou"], 4), # -- every tile's pixels pooled -- #
+        "latency_s": round(float(np.median(latencies)), 3),
+    }
+
+def main():
+    args = parse_args()
+    import devices
+    import sam_embeddings
+    devices.select_device("cpu")
+    sam_embeddings.SAM_EMBEDDINGS.spill_dir = None # -- time the encoder every run, not the cache -- #
+    sam_embeddings.SAM_EMBEDDINGS.max_entries = 0
+    paths = sorted(glob.glob(args.input))
+    assert paths, f"No images match {args.input}"
+    rows = []
+    for model_name in args.models:
+        for quantize in (False, True):
+            print(f"[*] {model_name} ({'int8' if quantize else 'float'}) on {len(paths)} tiles")
+            rows.append(evaluate(model_name, paths, quantize, args.sam_model))
+    header = ["model", "mode", "iou", "f1", "dataset_iou", "latency_s"]
+    print(" | ".join(header))
+    for row in rows:
+        print(" | ".join(str(row[key]) for key in header))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# -- [ Export U-Net / DeepLabv3+ / MMYOLOv8 to ONNX or TorchScript ] -- #
+# Writes <key>.onnx and/or <key>.torchscript.pt to models/exported (EXPORT_DIR), plus <key>.json with
+# what the exported backend needs to redo the test pipeline without OpenMMLab. Only the network is exported:
+#   semantic -> normalised image to logits at the input size (the sliding window runs outside)
+#   detector -> normalised 512 x 512 letterboxed image to decoded boxes + sigmoid scores (NMS runs outside)
+# --check compares the exported model with the native one on the MoNuSeg test tiles.
+#
+# e.g. python export_models.py --model unet mmyolo --format onnx torchscript --check
+import argparse
+import glob
+import json
+import sys
+from pathlib import Path
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch import nn
+# -- ############################### -- #
+
+MODEL_CHOICES = ["unet", "deeplab", "mmyolo"]
+FORMAT_BACKENDS = {"onnx": "onnxruntime", "torchscript": "torchscript"}
+ONNX_OPSET = 13
+# -- minimum agreement with the native model for --check to pass -- #
+MIN_PIXEL_AGREEMENT = 0.99
+MIN_BOX_IOU = 0.95
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export the app's models to ONNX / TorchScript")
+    parser.add_argument("--model", nargs="+", default=MODEL_CHOICES, choices=MODEL_CHOICES)
+    parser.add_argument("--format", nargs="+", default=["onnx"], choices=list(FORMAT_BACKENDS))
+    parser.add_argument("--check", action="store_true", help="compare exported and native outputs on the test tiles")
+    parser.add_argument("--check-images", default="images/MoNuSeg/test/*.png")
+    return parser.parse_args()
+
+
+class SegmentorExport(nn.Module):
+    """EncoderDecoder.encode_decode without the data samples: normalised image -> logits at the input size"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, inputs):
+        logits = self.model.decode_head(self.model.extract_feat(inputs))
+        return F.interpolate(logits, size=inputs.shape[2:], mode="bilinear", align_corners=self.model.align_corners)
+
+
+class DetectorExport(nn.Module):
+    """YOLODetector up to the decoded boxes: normalised image -> boxes (B, N, 4) xyxy, scores (B, N, C)"""
+    def __init__(self, model, input_hw):
+        super().__init__()
+        self.model = model
+        head = model.bbox_head
+        featmap_sizes = [(input_hw[0] // stride, input_hw[1] // stride) for stride in head.featmap_strides]
+        priors = torch.cat(head.prior_generator.grid_priors(featmap_sizes, device="cpu", with_stride=True))
+        self.register_buffer("points", priors[:, :2])
+        self.register_buffer("strides", priors[:, 2:3])
+
+    def forward(self, inputs):
+        cls_scores, bbox_preds = self.model.bbox_head(self.model.extract_feat(inputs))[:2]
+        batch = inputs.shape[0]
+        scores = torch.cat([s.permute(0, 2, 3, 1).reshape(batch, -1, s.shape[1]) for s in cls_scores], 1).sigmoid()
+        distances = torch.cat([b.permute(0, 2, 3, 1).reshape(batch, -1, 4) for b in bbox_preds], 1) * self.strides
+        boxes = torch.cat([self.points - distances[..., :2], self.points + distances[..., 2:]], dim=-1)
+        return boxes, scores
+
+
+def class_names(model) -> list:
+    classes = model.dataset_meta.get("classes", [])
+    return [classes] if isinstance(classes, str) else list(classes)
+
+def semantic_export(model_name:str):
+    """(wrapper, dummy input, metadata) for U-Net / DeepLabv3+"""
+    import inference
+    model = inference.semantic_model(model_name, device="cpu", quantize=False)
+    cfg = model.cfg
+    resize = next(t for t in cfg.test_pipeline if t["type"] == "Resize")
+    preprocessor = cfg.model.data_preprocessor
+    test_cfg = cfg.model.test_cfg
+    meta = {
+        "task": "semantic",
+        "classes": class_names(model),
+        "scale": list(resize["scale"]),
+        "keep_ratio": bool(resize.get("keep_ratio", False)),
+        "mean": list(preprocessor["mean"]),
+        "std": list(preprocessor["std"]),
+        "bgr_to_rgb": bool(preprocessor.get("bgr_to_rgb", False)),
+        "mode": test_cfg.get("mode", "whole"),
+        "crop_size": list(test_cfg.get("crop_size", ())),
+        "stride": list(test_cfg.get("stride", ())),
+    }
+    height, width = meta["crop_size"] if meta["mode"] == "slide" else meta["scale"][::-1]
+    return SegmentorExport(model).eval(), torch.zeros(1, 3, height, width), meta
+
+def detector_export():
+    """(wrapper, dummy input, metadata) for MMYOLOv8"""
+    import inference
+    model = inference.detector_model(device="cpu", quantize=False)
+    cfg = model.cfg
+    letterbox = next(t for t in cfg.test_pipeline if t["type"] == "LetterResize")
+    preprocessor = cfg.model.data_preprocessor
+    test_cfg = cfg.model.test_cfg
+    width, height = letterbox["scale"]
+    meta = {
+        "task": "detection",
+        "classes": class_names(model),
+        "img_scale": [width, height],
+        "pad_val": letterbox.get("pad_val", {}).get("img", 114),
+        "mean": list(preprocessor["mean"]),
+        "std": list(preprocessor["std"]),
+        "bgr_to_rgb": bool(preprocessor.get("bgr_to_rgb", False)),
+        "test_cfg": {"score_thr": test_cfg["score_thr"], "nms_pre": test_cfg["nms_pre"],
+                     "iou_threshold": test_cfg["nms"]["iou_threshold"], "max_per_img": test_cfg["max_per_img"]},
+    }
+    return DetectorExport(model, (height, width)).eval(), torch.zeros(1, 3, height, width), meta
+
+def export(modelstr:str, formats:list, output:Path):
+    from mmengine.model import revert_sync_batchnorm
+    import inference
+    import exported_backend
+    names = {key: name for name, (key, _, _) in inference.SEMANTIC_MODELS.items()}
+    if modelstr == inference.DETECTOR_MODEL[0]:
+        wrapper, dummy, meta = detector_export()
+        output_names, dynamic_axes = ["boxes", "scores"], {"inputs": {0: "batch"}}
+    else:
+        wrapper, dummy, meta = semantic_export(names[modelstr])
+        output_names = ["logits"]
+        dynamic_axes = {"inputs": {0: "batch", 2: "height", 3: "width"}, "logits": {0: "batch", 2: "height", 3: "width"}}
+    wrapper = revert_sync_batchnorm(wrapper) # -- SyncBN has no CPU / ONNX kernel -- #
+    output.mkdir(parents=True, exist_ok=True)
+    with torch.no_grad():
+        for fmt in formats:
+            path = exported_backend.artifact_path(modelstr, FORMAT_BACKENDS[fmt], output)
+            if fmt == "onnx":
+                torch.onnx.export(wrapper, dummy, str(path), input_names=["inputs"], output_names=output_names,
+                                  dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET)
+            else:
+                torch.jit.trace(wrapper, dummy).save(str(path))
+            print(f"[*] {modelstr} -> {path}")
+    (output / f"{modelstr}.json").write_text(json.dumps(meta, indent=2))
+
+# -- [ Parity with the native models ] -- #
+def check(modelstr:str, backend:str, image_paths:list) -> bool:
+    import inference
+    import utils_metrics as metrics
+    from box_ops import box_iou
+    import exported_backend
+    exported = exported_backend.load_exported(modelstr, backend)
+    names = {key: name for name, (key, _, _) in inference.SEMANTIC_MODELS.items()}
+    scores = []
+    for path in image_paths:
+        if modelstr == inference.DETECTOR_MODEL[0]:
+            native = inference.detection_inference(path, device="cpu", quantize=False, backend="pytorch")
+            ours = exported.predict(path)
+            if len(native.boxes) == 0 or len(ours["boxes"]) == 0:
+                scores.append(float(len(native.boxes) == len(ours["boxes"])))
+                continue
+            # -- each native box against its best exported match -- #
+            scores.append(float(box_iou(native.boxes, ours["boxes"]).max(axis=1).mean()))
+        else:
+            image = cv2.imread(path)
+            native = inference.semantic_inference(names[modelstr], [image], device="cpu", quantize=False, backend="pytorch")[0]
+            ours = exported.predict(image)
+            scores.append(float((native == ours).mean()))
+            print(f"[**] {Path(path).name}: nuclei IoU native vs {backend} {metrics.iou(native, ours):.4f}")
+    threshold = MIN_BOX_IOU if modelstr == inference.DETECTOR_MODEL[0] else MIN_PIXEL_AGREEMENT
+    score = float(np.mean(scores))
+    passed = score >= threshold
+    measure = "mean matched box IoU" if modelstr == inference.DETECTOR_MODEL[0] else "pixel agreement"
+    print(f"[{'*' if passed else '!'}] {modelstr} {backend}: {measure} {score:.4f} (needs {threshold}) "
+          f"-> {'PASS' if passed else 'FAIL'}")
+    return passed
+
+def main():
+    args = parse_args()
+    import exported_backend
+    for modelstr in args.model:
+        export(modelstr, args.format, exported_backend.EXPORT_DIR)
+    if not args.check:
+        return
+    image_paths = sorted(glob.glob(args.check_images))
+    results = [check(modelstr, FORMAT_BACKENDS[fmt], image_paths) for modelstr in args.model for fmt in args.format]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# -- [ Exported model backend (ONNX Runtime / TorchScript) ] -- #
+# Runs the artifacts written by export_models.py on the CPU with nothing but numpy, OpenCV and
+# onnxruntime (or torch.jit for TorchScript), i.e. without importing mmengine / mmseg / mmdet.
+# The pre / post processing of the native test pipelines is redone here from the .json written
+# next to each artifact:
+#   semantic -> resize, normalise, whole image or sliding window logits, resize back, argmax
+#   detector -> keep ratio resize + letterbox, decoded boxes from the graph, score filter + NMS, undo letterbox
+#
+# Backend per model (gdrive key: unet, deeplab, mmyolo):
+#   APP_BACKEND_<KEY> = pytorch | onnxruntime | torchscript   e.g. APP_BACKEND_UNET=onnxruntime
+#   APP_BACKEND       = default for every model (pytorch)
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from box_ops import nms
+# -- ############################### -- #
+
+EXPORT_DIR = Path(os.environ.get("EXPORT_DIR", "./models/exported"))
+BACKENDS = ("pytorch", "onnxruntime", "torchscript")
+ARTIFACT_SUFFIX = {"onnxruntime": ".onnx", "torchscript": ".torchscript.pt"}
+
+
+def artifact_path(modelstr:str, backend:str, root:Path = EXPORT_DIR) -> Path:
+    return Path(root) / f"{modelstr}{ARTIFACT_SUFFIX[backend]}"
+
+def meta_path(modelstr:str, root:Path = EXPORT_DIR) -> Path:
+    return Path(root) / f"{modelstr}.json"
+
+def model_backend(modelstr:str, requested:Optional[str] = None) -> str:
+    """
+    NAME: model_backend
+    DESC: Backend for one model: requested if given, else APP_BACKEND_<KEY>, else APP_BACKEND, else
+          pytorch. Falls back to pytorch (with a warning) when the model hasn't been exported yet.
+    """
+    backend = (requested or os.environ.get(f"APP_BACKEND_{modelstr.upper()}")
+               or os.environ.get("APP_BACKEND") or "pytorch").strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+    if backend != "pytorch" and not (artifact_path(modelstr, backend).exists() and meta_path(modelstr).exists()):
+        print(f"[!] No {backend} export of {modelstr} in {EXPORT_DIR}, using pytorch "
+              f"(run: python export_models.py --model {modelstr})")
+        return "pytorch"
+    return backend
+
+
+class ExportedModel:
+    """
+    NAME: ExportedModel
+    DESC: One exported graph + its preprocessing metadata. run() takes a float32 NCHW batch and
+          returns the graph outputs as numpy arrays.
+    """
+    def __init__(self, modelstr:str, backend:str, root:Path = EXPORT_DIR):
+        self.modelstr = modelstr
+        self.backend = backend
+        self.meta = json.loads(meta_path(modelstr, root).read_text())
+        path = artifact_path(modelstr, backend, root)
+        threads = int(os.environ.get("APP_NUM_THREADS", 0))
+        if backend == "onnxruntime":
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            self._session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+            self._input = self._session.get_inputs()[0].name
+        else:
+            import torch
+            if threads:
+                torch.set_num_threads(threads)
+            self._module = torch.jit.load(str(path), map_location="cpu").eval()
+
+    @property
+    def classes(self) -> list:
+        return list(self.meta["classes"])
+
+    def run(self, inputs:np.ndarray) -> list:
+        if self.backend == "onnxruntime":
+            return self._session.run(None, {self._input: inputs})
+        import torch
+        with torch.no_grad():
+            outputs = self._module(torch.from_numpy(inputs))
+        if isinstance(outputs, torch.Tensor):
+            outputs = [outputs]
+        return [output.numpy() for output in outputs]
+
+    def normalise(self, image:np.ndarray) -> np.ndarray:
+        """BGR uint8 (H, W, 3) -> float32 (1, 3, H, W) as the model's data preprocessor does it"""
+        if self.meta["bgr_to_rgb"]:
+            image = image[..., ::-1]
+        image = (image.astype(np.float32) - np.float32(self.meta["mean"])) / np.float32(self.meta["std"])
+        return np.ascontiguousarray(image.transpose(2, 0, 1)[None])
+
+
+class ExportedSegmentor(ExportedModel):
+    """U-Net / DeepLabv3+ graph: normalised image -> logits at the input size"""
+
+    def resize(self, image:np.ndarray) -> np.ndarray:
+        h, w = image.shape[:2]
+        scale_w, scale_h = self.meta["scale"]
+        if self.meta["keep_ratio"]:
+            factor = min(max(scale_w, scale_h) / max(h, w), min(scale_w, scale_h) / min(h, w))
+            size = (int(w * factor + 0.5), int(h * factor + 0.5))
+        else:
+            size = (scale_w, scale_h)
+        return cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+
+    def logits(self, inputs:np.ndarray) -> np.ndarray:
+        """(1, C, H, W) logits over the resized image, whole or with the sliding window of the config"""
+        if self.meta["mode"] != "slide":
+            return self.run(inputs)[0]
+        crop_h, crop_w = self.meta["crop_size"]
+        stride_h, stride_w = self.meta["stride"]
+        _, _, h, w = inputs.shape
+        h_grids = max(h - crop_h + stride_h - 1, 0) // stride_h + 1
+        w_grids = max(w - crop_w + stride_w - 1, 0) // stride_w + 1
+        preds = None
+        count = np.zeros((1, 1, h, w), dtype=np.float32)
+        for h_idx in range(h_grids):
+            for w_idx in range(w_grids):
+                y2 = min(h_idx * stride_h + crop_h, h)
+                x2 = min(w_idx * stride_w + crop_w, w)
+                y1, x1 = max(y2 - crop_h, 0), max(x2 - crop_w, 0)
+                crop_logits = self.run(np.ascontiguousarray(inputs[:, :, y1:y2, x1:x2]))[0]
+                if preds is None:
+                    preds = np.zeros((1, crop_logits.shape[1], h, w), dtype=np.float32)
+                preds[:, :, y1:y2, x1:x2] += crop_logits
+                count[:, :, y1:y2, x1:x2] += 1
+        return preds / count
+
+    def predict(self, image:np.ndarray) -> np.ndarray:
+        """
+        NAME: predict
+        DESC: BGR image (as read by cv2.imread) -> raw (H, W) uint8 prediction mask at the original size
+        """
+        h, w = image.shape[:2]
+        logits = np.ascontiguousarray(self.logits(self.normalise(self.resize(image)))[0].transpose(1, 2, 0))
+        logits = cv2.resize(logits, (w, h), interpolation=cv2.INTER_LINEAR)
+        if logits.ndim == 2: # -- cv2 drops the channel axis of single channel images -- #
+            logits = logits[..., None]
+        return logits.argmax(axis=2).astype(np.uint8)
+
+
+class ExportedDetector(ExportedModel):
+    """MMYOLOv8 graph: normalised letterboxed image -> decoded boxes (1, N, 4) and sigmoid scores (1, N, C)"""
+
+    def letterbox(self, image:np.ndarray) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+        h, w = image.shape[:2]
+        scale_w, scale_h = self.meta["img_scale"]
+        ratio = min(scale_h / h, scale_w / w)
+        size = (int(w * ratio + 0.5), int(h * ratio + 0.5))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR)
+        pad_h, pad_w = scale_h - size[1], scale_w - size[0]
+        top, left = pad_h // 2, pad_w // 2
+        image = cv2.copyMakeBorder(image, top, pad_h - top, left, pad_w - left, cv2.BORDER_CONSTANT,
+                                   value=(self.meta["pad_val"],) * 3)
+        return image, ratio, (left, top)
+
+    def predict(self, image, score_thr:float = 0.0, topk:Optional[int] = None) -> dict:
+        """
+        NAME: predict
+        DESC: Image (path or BGR array) -> boxes / scores / labels in original image coordinates,
+              following the model's test_cfg (score_thr, nms_pre, nms iou, max_per_img)
+        OUTPUT: dict of boxes (N, 4) int32, scores (N,) float32, labels (N,) int64, best first
+        """
+        if isinstance(image, (str, Path)):
+            image = cv2.imread(str(image))
+        h, w = image.shape[:2]
+        letterboxed, ratio, (left, top) = self.letterbox(image)
+        boxes, scores = self.run(self.normalise(letterboxed))
+        boxes, scores = boxes[0], scores[0]
+        test_cfg = self.meta["test_cfg"]
+        # -- multi label: every (box, class) pair above the threshold is a candidate -- #
+        box_idx, labels = np.nonzero(scores > test_cfg["score_thr"])
+        candidate_scores = scores[box_idx, labels]
+        order = candidate_scores.argsort()[::-1][:test_cfg["nms_pre"]]
+        box_idx, labels, candidate_scores = box_idx[order], labels[order], candidate_scores[order]
+        candidates = boxes[box_idx]
+        # -- class aware NMS: offset each class so boxes of different classes never overlap -- #
+        offsets = labels[:, None].astype(np.float32) * (candidates.max() + 1 if len(candidates) else 0)
+        keep = nms(candidates + offsets, candidate_scores, test_cfg["iou_threshold"])[:test_cfg["max_per_img"]]
+        keep = keep[candidate_scores[keep] >= score_thr]
+        if topk is not None:
+            keep = keep[:topk]
+        candidates, candidate_scores, labels = candidates[keep], candidate_scores[keep], labels[keep]
+        # -- undo the letterbox -- #
+        candidates = (candidates - np.float32([left, top, left, top])) / ratio
+        candidates[:, 0::2] = candidates[:, 0::2].clip(0, w)
+        candidates[:, 1::2] = candidates[:, 1::2].clip(0, h)
+        return {"boxes": candidates.astype(np.int32),
+                "scores": candidate_scores.astype(np.float32),
+                "labels": labels.astype(np.int64)}
+
+
+@lru_cache(maxsize=None)
+def load_exported(modelstr:str, backend:str) -> ExportedModel:
+    """Loads an exported model once per process"""
+    meta = json.loads(meta_path(modelstr).read_text())
+    model_class = ExportedDetector if meta["task"] == "detection" else ExportedSegmentor
+    print(f"[*] Loading {modelstr} ({backend}) from {artifact_path(modelstr, backend)}")
+    return model_class(modelstr, backend)
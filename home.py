@@ -1,21 +1,27 @@
-import base64
-from io import BufferedReader, BytesIO
-import io
+import utils_common
 # -- [ For OpenMMLab (U-Net, DeepLabv3+, mmyolov8,  )(MMDETECTION, MMSEGMENTATION, MMYOLO) ] -- #
-from mmengine import Config
-from mmseg.apis import init_model, inference_model
-import registers
+# -- torch / OpenMMLab / SAM are only imported once a model is selected, not on page load, -- #
+# -- and never in this process when the models run on an inference server (APP_INFERENCE_SERVER) -- #
+inference = utils_common.LazyModule("inference")
+import mask_store
+import prediction_cache
+import exported_backend
+import warmup
+import jobs
+import inference_client
+import thumbnails
+import rendering
+import compositor
+import utils_metrics
 # -- [ For yolov8 ] -- #
 # from ultralytics import YOLO
 # -- [ The rest of the imports ] -- #
+import time
 from pathlib import Path
 import pandas as pd
 import streamlit as st
 import numpy as np
-import utils 
-from tempfile import NamedTemporaryFile
 import cv2
-import plotly.express as px
 # -0- testing new python package -- #
 from st_clickable_images import clickable_images
 # -- [ Page settings ] -- #
@@ -56,8 +62,180 @@ st.markdown(hide_streamlit_style, unsafe_allow_html=True)
 # ################################################################## #
 #@st.cache
 @st.cache_resource
-def register():
-    registers.registerstuff()
+def startup() -> warmup.ModelWarmup:
+    """Runs once per server process: starts the model warm-up (APP_WARMUP)"""
+    # -- with a shared inference server the models (and their warm-up) live over there -- #
+    return warmup.start_warmup([] if inference_client.server_address() else None)
+
+@st.cache_resource
+def prediction_store() -> prediction_cache.PredictionCache:
+    """On-disk prediction cache shared by every session of this server"""
+    return prediction_cache.PredictionCache()
+
+@st.cache_resource
+def render_cache() -> rendering.RenderCache:
+    """Pyramids / figures of the displayed images shared by every session of this server (rendering.py)"""
+    return rendering.RenderCache()
+
+def zoom_controls(shape) -> tuple:
+    """Full resolution region (x0, y0, x1, y1) picked with the Zoom sliders, None for the whole image"""
+    height, width = shape[:2]
+    with st.expander("Zoom (full resolution)"):
+        x0, x1 = st.slider("x", 0, width, (0, width), key=f"zoom_x_{width}")
+        y0, y1 = st.slider("y", 0, height, (0, height), key=f"zoom_y_{height}")
+    if (x0, y0, x1, y1) == (0, 0, width, height) or x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+def opacity_slider(side_tab_options) -> float:
+    """Mask opacity for the overlays, only the blend is redone when it moves"""
+    return side_tab_options[2].slider("Mask opacity", 0.0, 1.0, compositor.DEFAULT_OPACITY, 0.05, key="mask_opacity")
+
+def image_region(image):
+    """crop for render_layers: the zoomed window of an in-memory image"""
+    return lambda region: np.array(image[region[1]:region[3], region[0]:region[2]])
+
+def stored_region(name:str, palette=None):
+    """crop for render_layers: the zoomed window of a session store array (coloured with palette), nothing else is read"""
+    store = session_store()
+    def crop(region):
+        window = store.read_region(name, region[0], region[1], region[2] - region[0], region[3] - region[1])
+        return window if palette is None else compositor.colour_labels(window, palette)
+    return crop
+
+def mask_over_image(og_img, opacity:float):
+    """(layers, sources, build, crop) of the session's mask layer blended over the image"""
+    layer = st.session_state.mask_layer
+    image_crop, layer_crop = image_region(og_img), stored_region("mask_layer")
+    return (("image", "mask", f"opacity={opacity:.2f}"), [og_img, layer], lambda: compositor.blend(og_img, layer, opacity),
+            lambda region: compositor.blend(image_crop(region), layer_crop(region), opacity))
+
+def render_layers(placeholder, layers:tuple, sources:list, build=None, crop=None):
+    """
+    Draws the image made of layers from sources (build() on a render cache miss) at the current zoom.
+    crop(region) builds a full resolution zoomed in window on its own, without the whole image.
+    """
+    fig = render_cache().figure(layers, sources, build, region=st.session_state.get("view_region"), crop=crop)
+    placeholder.plotly_chart(fig, use_container_width=True)
+
+GALLERY_PAGE_SIZE = 6 # -- sample previews sent to the browser per gallery page -- #
+
+@st.cache_resource
+def thumbnail_store() -> thumbnails.ThumbnailCache:
+    """Gallery previews on disk, shared by every session of this server (THUMBNAIL_CACHE_DIR / _MAX_MB)"""
+    return thumbnails.ThumbnailCache()
+
+@st.cache_resource
+def job_queue() -> jobs.JobQueue:
+    """Worker pool shared by every session of this server (APP_JOB_WORKERS threads)"""
+    return jobs.JobQueue()
+
+@st.cache_resource
+def inference_engine():
+    """
+    Where the models run: the inference_server.py at APP_INFERENCE_SERVER, else this process, with
+    concurrent jobs micro-batched into shared forward passes (APP_BATCH_WINDOW_MS / APP_MAX_BATCH)
+    """
+    address = inference_client.server_address()
+    if address:
+        print(f"[*] Using the inference server at {address}")
+        return inference_client.InferenceClient(address)
+    return inference.BatchedInference()
+
+def cached_prediction(store, image, model_name, config, checkpoint, params=None):
+    """Looks the prediction up in store, returns (key to store it under, CachedPrediction or None)"""
+    key = prediction_cache.prediction_key(image, model_name, config, checkpoint, params)
+    cached = store.get(key)
+    print(f"[*] Prediction cache {'hit' if cached is not None else 'miss'} for {model_name}")
+    return key, cached
+
+@st.cache_data(ttl=60, show_spinner=False)
+def model_host() -> dict:
+    """
+    Device, INT8 default and default backends of where the models run: the inference server's when
+    APP_INFERENCE_SERVER is set (asked over /health, torch is never imported here), else this process's
+    """
+    address = inference_client.server_address()
+    if address:
+        health = inference_client.InferenceClient(address).health()
+        return {key: health[key] for key in ("device", "int8_default", "backends")}
+    import inference_server
+    return inference_server.model_host()
+
+def quantize_choice() -> bool:
+    """INT8 models for this session (Settings tab checkbox, default APP_QUANTIZE), CPU only"""
+    host = model_host()
+    requested = st.session_state.get("quantize")
+    return bool(host["int8_default"] if requested is None else requested) and host["device"] == "cpu"
+
+def quantize_params() -> dict:
+    """Cache key parameters for the quantized models (float keys stay as they were)"""
+    return {"int8": True} if quantize_choice() else {}
+
+def backend_choice(model_name) -> str:
+    """Backend chosen for this model in the Settings tab (default APP_BACKEND_<KEY> / APP_BACKEND)"""
+    modelstr = utils_common.model_key(model_name)
+    requested = st.session_state.get("backends", {}).get(modelstr)
+    if inference_client.server_address():
+        # -- the exports live next to the server, which falls back to pytorch if one is missing -- #
+        return requested or model_host()["backends"].get(modelstr, "pytorch")
+    return exported_backend.model_backend(modelstr, requested)
+
+def model_params(model_name) -> dict:
+    """Cache key parameters for quantized / exported models (native float keys stay as they were)"""
+    params = quantize_params()
+    backend = backend_choice(model_name)
+    if backend != "pytorch":
+        params["backend"] = backend
+    return params
+
+JOB_POLL_S = 0.5
+
+def submit_processing(model_name, img_name, image):
+    """Queues the chosen model on the image, the job is followed by job_monitor"""
+    job_id = job_queue().submit(session_store().session_id, models_selector(model_name), image, job_settings(model_name),
+                                name=f"{model_name} | {Path(img_name).name}")
+    st.session_state.job = (job_id, model_name)
+
+def job_monitor(img_name, given_image, stop_col):
+    """
+    NAME: job_monitor
+    DESC: Shows the progress of this session's job, re-running the script every JOB_POLL_S until it
+          is finished, then hands the result to the model's *_results function
+    """
+    job_id, model_name = st.session_state.job
+    job = job_queue().job(job_id)
+    if job is None: # -- forgotten (server restarted) -- #
+        del st.session_state.job
+        return
+    if job.state not in jobs.FINISHED:
+        if stop_col.button('Stop Processing'):
+            job_queue().cancel(job_id)
+        if job.state == jobs.QUEUED:
+            text = f"Queued, {job_queue().position(job_id)} job(s) ahead"
+        else:
+            text = f"In progress ({job.seconds}s)"
+        st.progress(job.progress, text="Stopping..." if job.cancel_requested.is_set() else text)
+        time.sleep(JOB_POLL_S)
+        st.rerun()
+    del st.session_state.job
+    job_queue().forget(job_id)
+    if job.state == jobs.DONE:
+        results_selector(model_name)(img_name, given_image, job.result)
+        st.success('Done')
+        st.session_state.is_processed = True
+    elif job.state == jobs.CANCELLED:
+        st.warning("Processing stopped")
+    else:
+        st.error(f"Processing failed: {job.error}")
+
+def session_store() -> mask_store.MaskStore:
+    """Memory-mapped store for this session's masks / overlays (created on first use)"""
+    if "mask_store" not in st.session_state:
+        # -- every new session clears out the folders of the ones which ended (tabs closed) -- #
+        mask_store.purge_stale()
+        st.session_state.mask_store = mask_store.MaskStore()
+    return st.session_state.mask_store
 
 
 # TODO[very low]: Get more models to use for selection. RTMDet, fasterSAM etc
@@ -71,6 +249,15 @@ def models_selector(chosen_model:str):
      }
     return models_dict.get(chosen_model)
 
+def results_selector(chosen_model:str):
+    models_dict = {
+        "U-Net": semantic_results,
+        "Deeplabv3+": semantic_results,
+        "MMYOLOv8": mmyolo_results,
+        "MMYOLO -> SAM": pipeline_results,
+     }
+    return models_dict.get(chosen_model)
+
 def show_selector(chosen_model:str):
     models_dict = {
         "U-Net": semantic_show,
@@ -80,91 +267,87 @@ def show_selector(chosen_model:str):
         "MMYOLO -> SAM": pipeline_show,
      }
     return models_dict.get(chosen_model)
-     
-def unet_processor(path_img, image, bar):
-    st.session_state.model_chosen = "U-Net"
-    config = Path("./models/semantic/unet/unet_test/unet.py")
-    pathfile = Path("./models/semantic/unet/unet_test/iter_20000.pth")
-    if not Path.exists(pathfile):
-        print("[*] Downloading unet weights from gdrive")
-        utils.download_path(modelstr="unet")
-    cfg = Config.fromfile(config)
-    bar.progress(20)
-    model = init_model(cfg, str(pathfile), 'cuda:0')
-    bar.progress(30)
-    classes = model.dataset_meta['classes']
-    palette = [[0,0,0],[0,255,0]]
-    bar.progress(40)
-    pred = process_images(path_img, model, classes, palette)
-    bar.progress(100)
-    # -- add the mask to current session-- #
-    st.session_state.batched_mask = pred
-
-def deeplab_processor(path_img, image, bar):
-    st.session_state.model_chosen = "Deeplabv3+"
-    config = Path("./models/semantic/deeplab/deeplab_test/deeplab.py")
-    pathfile = Path("./models/semantic/deeplab/deeplab_test/iter_20000.pth")
-    if not Path.exists(pathfile):
-        print("[*] Downloading deeplabv3+ weights from gdrive")
-        utils.download_path(modelstr="deeplab")
-    cfg = Config.fromfile(config)
-    bar.progress(20)
-    model = init_model(cfg, str(pathfile), 'cuda:0')
-    bar.progress(30)
-    classes = model.dataset_meta['classes']
-    palette = [[0,0,0],[0,255,0]]
-    bar.progress(40)
-    pred = process_images(path_img, model, classes, palette)
-    bar.progress(100)
-    # -- add the mask to current session-- #
-    st.session_state.batched_mask = pred
 
-def process_images(path_img, model, classes, palette):
-    img = cv2.imread(path_img)
-    result = inference_model(model, img)
-    mask = utils.numpy_from_result(result=result) # Prediction raw
+# -- [ Processors run as jobs in the worker pool: image + settings in, plain results out ] -- #
+# -- the *_results functions then put the results in the session (script thread only) -- #
+def job_settings(model_name) -> dict:
+    """Everything a processor needs from the session, read before submitting (workers can't use st.session_state)"""
+    settings = {"engine": inference_engine(), "store": prediction_store(), "params": model_params(model_name),
+                "quantize": quantize_choice(), "backend": backend_choice(model_name),
+                "score_thr": st.session_state.get("score_thr", 0.0)}
+    if model_name == "MMYOLO -> SAM":
+        settings["sam_model"] = st.session_state.get("sam_model") or utils_common.default_sam_model(model_host()["device"])
+        settings["sam_budget"] = st.session_state.get("sam_budget", 0)
+    return settings
+
+def unet_processor(image, settings, bar):
+    return process_images(image, "U-Net", settings, bar)
+
+def deeplab_processor(image, settings, bar):
+    return process_images(image, "Deeplabv3+", settings, bar)
+
+def process_images(image, model_name, settings, bar):
+    img = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    _, config, pathfile = utils_common.SEMANTIC_MODELS[model_name]
+    key, cached = cached_prediction(settings["store"], img, model_name, config, pathfile, settings["params"])
+    if cached is None:
+        mask = settings["engine"].semantic_inference(model_name, [img], bar=bar, quantize=settings["quantize"],
+                                            backend=settings["backend"])[0] # Prediction raw
+        meta = {"classes": settings["engine"].semantic_classes(model_name, backend=settings["backend"])}
+        settings["store"].put(key, {"mask": mask}, meta)
+    else:
+        mask, meta = cached.arrays["mask"], cached.meta
+    bar.progress(90)
+    # -- coloured once here, the opacity is applied at display time (compositor.blend) -- #
+    return {"model_name": model_name, "key": key, "mask": mask, "meta": meta,
+            "layer": compositor.colour_layer(mask, utils_common.SEMANTIC_PALETTE,
+                                             transparent=compositor.background_labels(meta["classes"]))}
+
+def semantic_results(path_img, image, result):
+    st.session_state.model_chosen = result["model_name"]
+    mask, meta = result["mask"], dict(result["meta"])
     # - - [ Saving raw image to session state to be used for different applications ] - - #
-    st.session_state.pred_mask_raw = mask
-    dest = mask_overlay(img, mask, classes, palette)
+    st.session_state.pred_mask_raw = session_store().put("pred_mask_raw", mask)
     # TODO[low]: Add metrics and overlay and pred_mask_raw to get deleted on image reset
     # For now use the fact that sample is only created if it is chosen as a sample image
     # for checking.
     if "sample" in st.session_state:
         if st.session_state.sample:
-            metrics = generate_metrics_per_img(path_img)
+            metrics = generate_metrics_per_img(path_img, cached_metrics=meta.get("metrics"))
             st.session_state.metrics = metrics
-    return dest
-
-def generate_metrics_per_img(img_path:str,):
-    gt_path = utils.name_processer(img=img_path)
-    gt_path = utils.mask_searcher(gt_path)
-    raw_mask:np.ndarray = st.session_state.pred_mask_raw
-    f = NamedTemporaryFile(dir='./temp', suffix='.png', delete=True)
-    _, buffer = cv2.imencode(".png", raw_mask) # Required for encoding binary images to file
-    io_buf = io.BytesIO(buffer) # Create a bufferable encoded file
-    f.write(io_buf.getbuffer()) # write to file
-    df = utils.model_accuracy(ground=Path(gt_path),prediction=Path(f.name))
-    # -- [ Get overlay for both gt and pred ] -- #
-    overlay =  utils.gt_pred_overlay(ground=Path(gt_path),prediction=Path(f.name))
-    st.session_state.overlay = overlay
+            meta["metrics"] = metrics[0].to_dict()
+    if meta != result["meta"]:
+        prediction_store().put(result["key"], {"mask": mask}, meta)
+    # -- add the mask to current session-- #
+    st.session_state.mask_layer = session_store().put("mask_layer", result["layer"])
+
+METRICS_BAND = 256 # -- rows of the prediction read (and counted) at a time -- #
+
+def generate_metrics_per_img(img_path:str, cached_metrics:dict = None):
+    gt_path = utils_common.name_processer(img=img_path)
+    gt_path = utils_common.mask_searcher(gt_path)
+    gt = utils_common.read_mask(gt_path)
+    store = session_store()
+    height, width = gt.shape[:2]
+    if st.session_state.pred_mask_raw.shape != gt.shape:
+        raise ValueError(f"Ground truth {gt.shape} and prediction {st.session_state.pred_mask_raw.shape} differ in shape")
+    num_classes = int(max(gt.max(), st.session_state.pred_mask_raw.max())) + 1
+    matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+    # -- [ gt / pred overlay codes (coloured at display time) and the metrics, band by band ] -- #
+    codes = np.empty((height, width), dtype=np.uint8)
+    for row in range(0, height, METRICS_BAND):
+        gt_band = gt[row:row + METRICS_BAND]
+        pred_band = store.read_region("pred_mask_raw", 0, row, width, METRICS_BAND)
+        codes[row:row + METRICS_BAND] = compositor.gt_pred_codes(gt_band, pred_band)
+        if cached_metrics is None:
+            matrix += utils_metrics.confusion_matrix(gt_band, pred_band, num_classes)
+    if cached_metrics is not None:
+        df = pd.DataFrame.from_dict(cached_metrics, orient='index')
+    else:
+        df = pd.DataFrame.from_dict({"name": Path(gt_path).stem, **utils_metrics.class_scores(matrix)}, orient='index')
+    st.session_state.overlay = store.put("overlay", codes)
     return df
 
-def mask_overlay(img, mask, classes, palette):
-    dest = img.copy()
-    labels = np.unique(mask)
-
-    for label in labels:
-        # skipping background (ugly in visualisations)
-        if classes[label].lower() in ["background", "bg"]:
-            continue
-        binary_mask = (mask == label)
-        colour_mask = np.zeros_like(img)
-        # -- Skipping outline for now
-        # TODO[medium/low]: Make transparency either a slider or modifiable.
-        colour_mask[...] = palette[label]
-        dest[binary_mask] = cv2.addWeighted(img, 1 - 0.5, colour_mask, 0.5, 0)[binary_mask]
-    return dest 
-
 # TODO[low]: Create Yolo processor for ultralytics
 # def yolo_processor(path_img, image, bar):
 #     st.session_state.model_chosen = "Yolov8"
@@ -173,18 +356,24 @@ def mask_overlay(img, mask, classes, palette):
 #     return "yolo"
 
 
-def mmyolo_processor(path_img, image, bar):
-    st.session_state.model_chosen = "MMYolov8"
-    config = Path("./models/objdetection/mmyolo/mmyolov8/mmyolov8_config.py")
-    pathfile = Path("./models/objdetection/mmyolo/mmyolov8/epoch_800.pth")
-    if not Path.exists(pathfile):
-        print("[*] Downloading mmyolov8 weights from gdrive")
-        utils.download_path(modelstr="mmyolo")
-    model = utils.mmyolo_init(config=config,pathfile=pathfile)
+def mmyolo_processor(image, settings, bar):
     # -- Inference detection -- #
-    detections = utils.inference_detections(model=model, image=path_img)
-    orig_bound_img = utils.show_box_cv(detections, image.copy())
-    st.session_state.bounded_img = orig_bound_img
+    _, config, pathfile = utils_common.DETECTOR_MODEL
+    key, cached = cached_prediction(settings["store"], image, "MMYOLOv8", config, pathfile,
+                                    {"score_thr": settings["score_thr"], **settings["params"]})
+    if cached is None:
+        detections = settings["engine"].detection_inference(cv2.cvtColor(image, cv2.COLOR_RGB2BGR), bar=bar,
+                                                   score_thr=settings["score_thr"], quantize=settings["quantize"],
+                                                   backend=settings["backend"])
+        settings["store"].put(key, detections._asdict())
+    else:
+        detections = utils_common.Detections(**cached.arrays)
+    bar.progress(90)
+    return utils_common.show_box_cv(detections.boxes, image.copy())
+
+def mmyolo_results(path_img, image, result):
+    st.session_state.model_chosen = "MMYolov8"
+    st.session_state.bounded_img = session_store().put("bounded_img", result)
 
 def instance_seg_show(processed_image, og_img, sidebar_option_subheader, side_tab_options, main_col_1):
     # TODO[low/medium]: Show GT bounding box regions for sample images as an overlay option
@@ -210,10 +399,10 @@ def instance_seg_show(processed_image, og_img, sidebar_option_subheader, side_ta
 
     if show_bound_checkbox and show_image_checkbox:
         # show both
-        show_image = st.session_state.bounded_img
+        layers, sources, crop = ("image", "boxes"), [st.session_state.bounded_img], stored_region("bounded_img")
     elif not show_bound_checkbox and show_image_checkbox:
         # just show original image
-        show_image = og_img
+        layers, sources, crop = ("image",), [og_img], image_region(og_img)
 
     if not show_bound_checkbox and not show_image_checkbox:
         processed_image.empty()
@@ -221,8 +410,7 @@ def instance_seg_show(processed_image, og_img, sidebar_option_subheader, side_ta
         processed_image.empty()
         st.warning("Cannot should bounding box region without image. Please choose both.")
     else:
-        fig = px.imshow(show_image,height=800,aspect='equal')
-        processed_image.plotly_chart(fig,use_container_width=True)
+        render_layers(processed_image, layers, sources, crop=crop)
     
 
 def semantic_show(processed_image, og_img, sidebar_option_subheader, side_tab_options, main_col_1):
@@ -244,40 +432,44 @@ def semantic_show(processed_image, og_img, sidebar_option_subheader, side_tab_op
         show_overlay_checkbox = False
     
     # -- [ setting all checkboxes]
+    build = crop = None
     if show_mask_checkbox and not show_image_checkbox and not show_overlay_checkbox:
-        show_image = utils.binary_to_bgr(img=st.session_state.pred_mask_raw)
-        fig = px.imshow(show_image,height=800,aspect='equal')
+        layers, sources = ("mask",), [st.session_state.pred_mask_raw]
+        build = lambda: compositor.colour_labels(st.session_state.pred_mask_raw, utils_common.SEMANTIC_PALETTE)
+        crop = stored_region("pred_mask_raw", utils_common.SEMANTIC_PALETTE)
     elif not show_mask_checkbox and show_image_checkbox and not show_overlay_checkbox:
-        show_image = og_img
-        fig = px.imshow(show_image,height=800,aspect='equal')
+        layers, sources, crop = ("image",), [og_img], image_region(og_img)
     elif not show_mask_checkbox and not show_image_checkbox and show_overlay_checkbox:
-        show_image = st.session_state.overlay
+        layers, sources = ("overlay",), [st.session_state.overlay]
     elif show_mask_checkbox and show_image_checkbox and not show_overlay_checkbox:
-        show_image = st.session_state.batched_mask      
+        layers, sources, build, crop = mask_over_image(og_img, opacity_slider(side_tab_options))
     elif not show_mask_checkbox and show_image_checkbox and show_overlay_checkbox:
         side_tab_options[2].warning("Overlay option has to be the only option toggled. This will show overlay only")
-        show_image = st.session_state.overlay     
+        layers, sources = ("overlay",), [st.session_state.overlay]
     elif show_mask_checkbox and not show_image_checkbox and show_overlay_checkbox:
         side_tab_options[2].warning("Overlay option has to be the only option toggled. This will show overlay only")
-        show_image = st.session_state.overlay    
+        layers, sources = ("overlay",), [st.session_state.overlay]
     elif show_mask_checkbox and show_image_checkbox and show_overlay_checkbox:
         side_tab_options[2].warning("Overlay option has to be the only option toggled. This will show overlay only")
-        show_image = st.session_state.overlay 
+        layers, sources = ("overlay",), [st.session_state.overlay]
+
+    if show_overlay_checkbox:
+        # -- the overlay is stored as gt / pred codes (compositor.gt_pred_codes) -- #
+        build = lambda: compositor.colour_labels(st.session_state.overlay, compositor.GT_PRED_PALETTE)
+        crop = stored_region("overlay", compositor.GT_PRED_PALETTE)
 
     if not show_mask_checkbox and not show_image_checkbox and not show_overlay_checkbox:
         processed_image.empty()
     else:
         if show_overlay_checkbox:
-            fig = px.imshow(show_image,height=800,aspect='equal')
-            processed_image.plotly_chart(fig,use_container_width=True)
+            render_layers(processed_image, layers, sources, build, crop)
             st.markdown('''
                         <span style="color:#0000FF;font-size:40.5px;font-weight:700"> | Ground Truth | </span> 
                         <span style="color:red;font-size:40.5px;font-weight:700"> | Prediction | </span> 
                         <span style="color:#FF00FF;font-size:40.5px;font-weight:700"> | Overlap | </span> 
                         ''',unsafe_allow_html=True)
         else:
-            fig = px.imshow(show_image,height=800,aspect='equal')
-            processed_image.plotly_chart(fig,use_container_width=True)
+            render_layers(processed_image, layers, sources, build, crop)
         
     side_tab_options[2].divider()
     # -- [ Get accuracy of the prediction result if sample image is chosen ] -- #
@@ -301,12 +493,10 @@ def metrics_viewer(data:pd.DataFrame, output):
     """
     df = {}
     df["Model"] = st.session_state.model_chosen
-    df["Name"] = data[0][0]
-    df["Accuracy"] = data[0][1]
-    df["Precision"] = data[0][2]
-    df["Recall"] = data[0][3]
-    df["F1"] = data[0][4]
-    df["IoU"] = data[0][5]
+    df["Name"] = data[0]["name"]
+    # -- float() also reads metrics cached as text by older versions -- #
+    for label, key in (("Accuracy", "accuracy"), ("Precision", "precision"), ("Recall", "recall"), ("F1", "f1"), ("IoU", "iou")):
+        df[label] = f"{float(data[0][key]):.4f}"
     metrics_data = pd.DataFrame.from_dict(data=df.items(),orient="columns")
     metrics_data.columns = [""," "]
     background_1 = ["#81b69d","#06768d"]
@@ -333,72 +523,69 @@ def metrics_viewer(data:pd.DataFrame, output):
             # TODO[low]: Finish this by adding explanations on all the metrics used
 
 def mmyolo_show(processed_image, og_img,sidebar_option_subheader, side_tab_options, main_col_1):
-    fig = px.imshow(st.session_state.batched_mask,height=800,aspect='equal',)
-    processed_image.plotly_chart(fig,use_container_width=True)
+    render_layers(processed_image, ("image", "boxes"), [st.session_state.batched_mask])
 
 def yolo_show(processed_image, og_img,sidebar_option_subheader, side_tab_options, main_col_1):
-    fig = px.imshow(st.session_state.batched_mask,height=800,aspect='equal',)
-    processed_image.plotly_chart(fig,use_container_width=True)
+    render_layers(processed_image, ("image", "boxes"), [st.session_state.batched_mask])
 
 
 
-def process_image_pipeline(path_img, image, bar):
+def process_image_pipeline(image, settings, bar):
     #TODO[low]: Add more options for pipeline (modular for instance and SAM)
-    config = Path("./models/objdetection/mmyolo/mmyolov8/mmyolov8_config.py")
-    pathfile = Path("./models/objdetection/mmyolo/mmyolov8/epoch_800.pth")
-    model = utils.mmyolo_init(config=config,pathfile=pathfile)
-    predictor = utils.sam_init()
-    bar.progress(10)
-    # -- Inference detection -- #
-    detections = utils.inference_detections(model=model, image=path_img) 
-    bar.progress(30)
-    # -- process inference to inputs for SAM -- #
-    inputs_boxes = utils.input_boxes_sam(detections)
-    bar.progress(50)
-    # -- get prediction information from SAM -- #
-    masks_list = utils.prediction_masks_sam(image=image, predictor=predictor, inputs_boxes=inputs_boxes)
-    bar.progress(70)
-    # -- process these masks into one image array -- #
-    batched_mask = utils.masks_array_sam(masks_list=masks_list)
-    bar.progress(90)
+    _, config, pathfile = utils_common.DETECTOR_MODEL
+    sam_model = settings["sam_model"]
+    params = {"score_thr": settings["score_thr"], "sam": prediction_cache.file_signature(utils_common.SAM_MODELS[sam_model][0]),
+              **settings["params"]}
+    key, cached = cached_prediction(settings["store"], image, "MMYOLO -> SAM", config, pathfile, params)
+    if cached is None:
+        result = settings["engine"].pipeline_inference(cv2.cvtColor(image, cv2.COLOR_RGB2BGR), image, bar=bar,
+                                              score_thr=settings["score_thr"], sam_budget=settings["sam_budget"],
+                                              sam_model=sam_model, quantize=settings["quantize"], backend=settings["backend"])
+        settings["store"].put(key, utils_common.pipeline_arrays(result), {"sam_timings": result.sam_timings})
+    else:
+        result = utils_common.pipeline_from_arrays(cached.arrays, cached.meta["sam_timings"])
+    return result
+
+def pipeline_results(path_img, image, result):
     # -- add the mask to current session-- #
-    st.session_state.detections = detections
-    st.session_state.batched_mask = batched_mask
+    st.session_state.sam_timings = result.sam_timings
+    st.session_state.detections = result.detections
+    st.session_state.instance_map = session_store().put("instance_map", result.instance_map)
+    st.session_state.instances = result.instances
+    # -- binary mask of every nucleus (for display / metrics) -- #
+    st.session_state.batched_mask = session_store().put("batched_mask", (result.instance_map > 0).astype(np.uint8))
+    # -- every nucleus in its own colour, blended over the image at display time -- #
+    st.session_state.mask_layer = session_store().put("mask_layer", compositor.colour_layer(
+        result.instance_map, compositor.INSTANCE_PALETTE))
 
 def pipeline_show(processed_image, og_img,sidebar_option_subheader, side_tab_options, main_col_1):
     sidebar_option_subheader.subheader("Please choose one of the following options:")
-    bounding_box_checkbox = side_tab_options.checkbox("Show Bounding Box", value=False)
-    show_mask_checkbox = side_tab_options.checkbox("Show Mask", value=True)
-
-    # -- Process the mask and output the overlay -- #
-    if "mask_img" not in st.session_state:
-        total_image = og_img.copy()
-        batched_mask = np.asarray(st.session_state.batched_mask) * 255
-        batched_mask = cv2.cvtColor(batched_mask.astype(np.float32), cv2.COLOR_RGBA2RGB)
-        total_image_covered = cv2.bitwise_or(total_image, batched_mask.astype(np.uint8))
-        # -- Saving mask + img for future ref -- #
-        st.session_state.mask_img = total_image_covered
-    # -- -------------------------------- -- #
-    show_image = og_img
-    if bounding_box_checkbox and show_mask_checkbox:
-            # -- Show both bounding box and mask on image
-            mask_bound_img = utils.show_box_cv(st.session_state.detections, st.session_state.mask_img.copy())
-            show_image = mask_bound_img
-    if bounding_box_checkbox and not show_mask_checkbox:
-            # -- show only bounding box on original image
-            orig_bound_img = utils.show_box_cv(st.session_state.detections, og_img.copy())
-            show_image = orig_bound_img
-    if not bounding_box_checkbox and show_mask_checkbox:
-            # -- show only mask on original image
-            show_image = st.session_state.mask_img
-    if not bounding_box_checkbox and not show_mask_checkbox:
-            # -- Just show original image
-            show_image = og_img
-    processed_image.image(show_image, caption=st.session_state.uploaded_image.name)
-    fig = px.imshow(show_image,height=800,aspect='equal',)
-    st.plotly_chart(fig,use_container_width=True)
-
-    main_col_1.download_button(label="Download", data=download_image(show_image), file_name=st.session_state.uploaded_image.name, mime="image/png")
+    bounding_box_checkbox = side_tab_options[2].checkbox("Show Bounding Box", value=False)
+    show_mask_checkbox = side_tab_options[2].checkbox("Show Mask", value=True)
+    if "instances" in st.session_state:
+        side_tab_options[2].caption(f"{len(st.session_state.instances.areas)} nuclei segmented")
+    if "sam_timings" in st.session_state:
+        timings = st.session_state.sam_timings
+        side_tab_options[2].caption(f"SAM: {len(timings)} batches in {sum(timings):.2f}s | per batch: "
+                                    + ", ".join(f"{t:.2f}s" for t in timings))
+
+    if show_mask_checkbox:
+        # -- mask on original image -- #
+        layers, sources, build, crop = mask_over_image(og_img, opacity_slider(side_tab_options))
+    else:
+        # -- Just the original image -- #
+        layers, sources, build, crop = ("image",), [og_img], None, image_region(og_img)
+    if bounding_box_checkbox:
+        # -- bounding boxes drawn on top of either -- #
+        boxes = st.session_state.detections.boxes
+        base, base_crop = build or og_img.copy, crop
+        layers, sources = layers + ("boxes",), sources + [boxes]
+        build = lambda: utils_common.show_box_cv(boxes, base())
+        crop = lambda region: utils_common.show_box_cv(boxes - np.array(region[:2] * 2, dtype=boxes.dtype), base_crop(region))
+    render_layers(processed_image, layers, sources, build, crop)
+
+    main_col_1.download_button(label="Download", data=render_cache().png(layers, sources, build),
+                               file_name=Path(st.session_state.image[1]).name, mime="image/png")
 
 def main():
     st.sidebar.title("Single Cell Nuclei Segmentation")
@@ -451,6 +638,44 @@ def main():
             side_tabs[0].warning("First processing of image will take a bit longer as the model weight will be downloaded.")
             side_tabs[0].warning("This will take a while to process and show.")
         st.session_state.model_option = overall_model
+        if model_option != "Semantic Segmentation":
+            st.session_state.score_thr = side_tabs[0].slider("Detection score threshold", 0.0, 1.0, 0.0, 0.01)
+        if overall_model == "MMYOLO -> SAM":
+            sam_options = list(utils_common.SAM_MODELS.keys())
+            st.session_state.sam_model = side_tabs[0].selectbox("SAM backbone", sam_options,
+                                                                index=sam_options.index(utils_common.default_sam_model(model_host()["device"])),
+                                                                help="vit_h is the most accurate, vit_b is the fastest (best on CPU)")
+            st.session_state.sam_budget = side_tabs[0].number_input("SAM memory budget per batch (MB, 0 = auto)",
+                                                                    min_value=0, value=0, step=256)
+        if overall_model is not None:
+            modelstr = utils_common.model_key(overall_model)
+            backends = list(exported_backend.BACKENDS)
+            st.session_state.setdefault("backends", {})
+            st.session_state.backends[modelstr] = side_tabs[0].selectbox(
+                "Detector backend" if overall_model == "MMYOLO -> SAM" else "Inference backend", backends,
+                index=backends.index(model_host()["backends"].get(modelstr, "pytorch")),
+                help="onnxruntime / torchscript run the exported model (python export_models.py) on CPU")
+        if model_host()["device"] == "cpu":
+            st.session_state.quantize = side_tabs[0].checkbox("INT8 quantization (CPU)", value=model_host()["int8_default"],
+                                                              help="Faster on CPU for a small accuracy cost, see evaluate_quantization.py")
+    # -- [ Background warm-up progress (APP_WARMUP) ] -- #
+    warmup_status = startup().status()
+    if warmup_status:
+        with side_tabs[0].expander("Model warm-up", expanded=any(row["state"] != warmup.READY for row in warmup_status)):
+            st.dataframe(pd.DataFrame(warmup_status), hide_index=True, use_container_width=True)
+            st.button("Refresh", key="warmup_refresh")
+    # -- [ Models already held in memory, with how long they took to load ] -- #
+    loaded_models = utils_common.model_stats()
+    if not loaded_models.empty:
+        with side_tabs[0].expander("Loaded models"):
+            st.caption(f"Device: {model_host()['device']} (set APP_DEVICE to change)")
+            st.dataframe(loaded_models, hide_index=True, use_container_width=True)
+
+    # -- [ Jobs of every session in the worker pool ] -- #
+    queued_jobs = job_queue().status()
+    if queued_jobs:
+        with side_tabs[0].expander("Processing queue"):
+            st.dataframe(pd.DataFrame(queued_jobs), hide_index=True, use_container_width=True)
 
     # -- [ IMAGE UPLOAD TAB INFO ] -- #
     side_tabs[1].header("Upload nuclei image:")
@@ -464,7 +689,7 @@ def main():
     # -- [ Be able to choose between different datasets which already have images with GT for metrics ] -- #
     side_tabs[1].header("Or, choose from our sample images:")
     side_tabs[1].warning("Sample images will also give metrics for how well the model did on that image [only works for semantic segmentation atm]")
-    image_files, images_subset = utils.load_images_test_datasets()
+    image_files, images_subset = utils_common.load_images_test_datasets()
     sets = side_tabs[1].multiselect("Dataset Selector", images_subset, key="dataset_multi")
     view_images = []
     for image_file in image_files:
@@ -473,29 +698,33 @@ def main():
         else:
             if "image" in st.session_state and uploaded_image is None:
                del st.session_state.image
-    images = []
-    for img in view_images:
-        with open(img, "rb") as image:
-            encoded = base64.b64encode(image.read()).decode()
-            images.append(f"data:image/png;base64,{encoded}")
-    n = 1
-    to_show = []
-    for i in range(0, int(len(images) / 2.5), n):
-        to_show.append(images[i:i+n])
+    # -- [ Gallery: one page of cached JPEG previews at a time instead of every full PNG inline ] -- #
+    pages = max(1, -(-len(view_images) // GALLERY_PAGE_SIZE))
+    page = side_tabs[1].number_input(f"Gallery page (of {pages})", min_value=1, max_value=pages, value=1,
+                                     key="gallery_page", disabled=pages == 1) if view_images else 1
+    page_start = (page - 1) * GALLERY_PAGE_SIZE
+    page_images = view_images[page_start:page_start + GALLERY_PAGE_SIZE]
+    thumbs = thumbnail_store()
     with side_tabs[1]:
-        clicked = clickable_images(to_show,
-                                titles=[],
+        clicked = clickable_images([thumbs.data_uri(img) for img in page_images],
+                                titles=[utils_common.name_processer(str(img)) for img in page_images],
                                 div_style={"display": "flex", "justify-content": "center", "flex-wrap": "wrap"},
-                                img_style={"margin": "5px", "height": "200px"},
-                                key="clickable_img"
+                                img_style={"margin": "5px", "height": f"{thumbnails.THUMBNAIL_HEIGHT}px"},
+                                key=f"clickable_img_{page}"
                                 )
-        if clicked > -1 and "dataset_multi" in st.session_state:
-            if len(view_images) > 0:
-                img = cv2.imread(view_images[clicked])
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                st.session_state.image = (img,view_images[clicked])
-                st.write(utils.name_processer(str(view_images[clicked])))
+        # -- every page keeps returning its last click, only a new one changes the image -- #
+        gallery_clicks = st.session_state.setdefault("gallery_clicks", {})
+        if clicked > -1 and gallery_clicks.get(page) != clicked and "dataset_multi" in st.session_state:
+            gallery_clicks[page] = clicked
+            if len(page_images) > 0:
+                # -- decoded once, reruns keep the array already in session state -- #
+                if st.session_state.get("image", (None, None))[1] != page_images[clicked]:
+                    img = cv2.imread(page_images[clicked])
+                    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+                    st.session_state.image = (img,page_images[clicked])
                 st.session_state.sample = True
+        if st.session_state.sample and "image" in st.session_state:
+            st.write(utils_common.name_processer(str(st.session_state.image[1])))
     side_tabs[1].warning("Uploaded image takes priority thus if selecting from sample, please remove uploaded file")
 
     # TODO[medium] - Add multi image input (list of images for processing)
@@ -507,15 +736,16 @@ def main():
     if uploaded_image is not None:
         if 'uploaded_image' not in st.session_state:
             st.session_state.uploaded_image = uploaded_image
-        f = NamedTemporaryFile(dir='./temp', suffix='.png', delete=True)
-        f.write(uploaded_image.getbuffer())
-        img = cv2.imread(f.name)
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         if not st.session_state.is_uploaded:
             st.session_state.is_uploaded = True
             st.rerun()
+        # -- decoded straight from the upload buffer, once per upload (reruns reuse the array) -- #
+        upload_id = getattr(uploaded_image, "file_id", uploaded_image.name)
+        if st.session_state.get("decoded_upload", (None, None))[0] != upload_id:
+            img = cv2.cvtColor(utils_common.decode_image(uploaded_image.getbuffer()), cv2.COLOR_BGR2RGB)
+            st.session_state.decoded_upload = (upload_id, img)
         # -- Define image for session state -- #
-        st.session_state.image = (img,f.name)
+        st.session_state.image = (st.session_state.decoded_upload[1], uploaded_image.name)
         if "sample" in st.session_state:
             st.session_state.sample = False
         # -- ------------------------------ -- #
@@ -523,8 +753,8 @@ def main():
     if "image" in st.session_state:
         processed_image = st.empty()
         given_image, img_name = st.session_state.image
-        fig = px.imshow(given_image,height=800,)
-        processed_image.plotly_chart(fig)
+        st.session_state.view_region = zoom_controls(given_image.shape)
+        render_layers(processed_image, ("image",), [given_image])
         cols = st.columns(3)
         if cols[2].button('Clear Image', disabled=(uploaded_image is not None)):
             app_rerunner()
@@ -536,21 +766,16 @@ def main():
         if 'process_button' not in st.session_state:
             st.session_state.process_button = False  
         # -- ---------------------------------------- -- #
-        if cols[0].button('Process Image', disabled=st.session_state.process_button):
+        if cols[0].button('Process Image', disabled=st.session_state.process_button or "job" in st.session_state):
                 if "model_option" in st.session_state:
-                    if cols[1].button('Stop Processing', disabled=st.session_state.process_button):
-                        st.stop()
-                    with st.spinner(text='In progress'):
-                        bar = st.progress(0)
-                        print(img_name)
-                        models_selector(st.session_state.model_option)(img_name, given_image, bar)
-                        bar.progress(100)
-                        st.success('Done')
-                        st.session_state.is_processed = True
+                    print(img_name)
+                    submit_processing(st.session_state.model_option, img_name, given_image)
                 else:
                     st.warning("Please Choose a model in the 'Settings' tab on the left (sidebar)")
                     st.stop()
-        
+        if "job" in st.session_state:
+            job_monitor(img_name, given_image, stop_col=cols[1])
+
 
         if st.session_state.is_processed:
             st.session_state.process_button = True
@@ -558,7 +783,7 @@ def main():
                                                             side_tab_options=side_tabs,
                                                             sidebar_option_subheader=sidebar_option_subheader,
                                                             main_col_1=cols[1],
-                                                            og_img=img,
+                                                            og_img=given_image,
                                                             )
     else:
         app_rerunner()
@@ -567,9 +792,15 @@ def app_rerunner():
     # TODO[low]: Recreate rerunner function to chose what not to delete rather than what to delete and this is not very scalable
     st.warning("Please use the sidebar <- to choose the model, upload the image for processing.")
     print("[*] Clearing local variables stored in cache for the image")
+    if "job" in st.session_state:
+        job_queue().cancel(st.session_state.job[0])
+        del st.session_state.job
+        print("[**] cancelled job")
     if 'uploaded_image' in st.session_state:
             del st.session_state.uploaded_image
             print("[**] cleared uploaded_image")
+    if 'decoded_upload' in st.session_state:
+        del st.session_state.decoded_upload
     if 'image' in st.session_state:
         del st.session_state.image
         print("[**] cleared image")
@@ -579,20 +810,29 @@ def app_rerunner():
     if "process_button" in st.session_state:
         del st.session_state.process_button
         print("[**] cleared process_button")
-    if "clickable_img" in st.session_state:
-        print("[**] deleting clickable image")
-        del st.session_state.clickable_img
+    for key in [key for key in st.session_state if key.startswith(("clickable_img", "zoom_")) or key in ("gallery_clicks", "view_region")]:
+        print(f"[**] deleting {key}")
+        del st.session_state[key]
     if 'detections' in st.session_state:
         del st.session_state.detections
         print("[**] cleared detections")
     if "batched_mask" in st.session_state:
         del st.session_state.batched_mask
         print("[**] cleared batched_mask")
-    if "mask_img" in st.session_state:
-        del st.session_state.mask_img
-        print("[**] cleared mask_img")
+    if "mask_layer" in st.session_state:
+        del st.session_state.mask_layer
+        print("[**] cleared mask_layer")
     if "processed_mask" in st.session_state:
         del st.session_state.processed_mask
+    if "mask_store" in st.session_state:
+        st.session_state.mask_store.clear()
+        print("[**] cleared mask store")
+    if "sam_timings" in st.session_state:
+        del st.session_state.sam_timings
+    if "instance_map" in st.session_state:
+        del st.session_state.instance_map
+        del st.session_state.instances
+        print("[**] cleared instance_map")
 
     new_tab = "\u2001Metrics\u2001\u2001"
     if new_tab in st.session_state.menu_tabs:
@@ -603,15 +843,7 @@ def app_rerunner():
         print("[**] cleared is_uploaded")
         st.rerun()
     
-def download_image(img):
-    img = img[:, :, [2, 1, 0]] #numpy.ndarray # from bgr to rgb
-    _, img_enco = cv2.imencode(".png", img)
-    srt_enco = img_enco.tobytes() #bytes
-    img_bytesio = BytesIO(srt_enco) #_io.BytesIO
-    img_bufferedreader = BufferedReader(img_bytesio) #_io.BufferedReader
-    return img_bufferedreader
-
 
 if __name__ == "__main__":
-    register()
+    startup()
     main()
\ No newline at end of file
@@ -0,0 +1,347 @@
+# -- [ Model inference without Streamlit session state ] -- #
+# The processors in home.py and the headless batch_infer.py CLI both go through these functions,
+# they only take images / paths in and hand plain results back.
+# backend= picks the native OpenMMLab model (pytorch) or an exported one (onnxruntime / torchscript),
+# see exported_backend.py.
+import copy
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple
+import cv2
+import numpy as np
+import torch
+import utils
+import exported_backend
+from batching import BATCH_WINDOW_MS, MAX_BATCH, MicroBatcher
+from devices import select_device
+from quantization import use_int8
+from utils_common import DETECTOR_MODEL, SEMANTIC_MODELS
+if TYPE_CHECKING:
+    from mmengine.dataset import Compose
+# -- ############################### -- #
+
+
+class NoProgress:
+    """Stand-in for st.progress when running headless (bars are jobs.JobProgress or this)"""
+    def progress(self, value):
+        pass
+
+    def check_cancelled(self):
+        pass
+
+# -- how often a job waiting on a micro-batch looks for a cancellation -- #
+CANCEL_POLL_S = 0.1
+
+def wait_result(future:Future, bar):
+    """future.result(), checking bar for cancellation meanwhile: a cancelled job stops waiting, the batch it is in still runs"""
+    while not future.done():
+        bar.check_cancelled()
+        wait([future], timeout=CANCEL_POLL_S)
+    return future.result()
+
+
+PipelineResult = utils.PipelineResult
+
+
+_registered = False
+_register_lock = threading.Lock()
+# -- SamPredictor keeps the image embedding on itself, so one image at a time per process -- #
+SAM_LOCK = threading.Lock()
+
+def register_models():
+    """Registers the OpenMMLab modules and the MoNuSeg dataset once per process, before building a model"""
+    global _registered
+    with _register_lock:
+        if not _registered:
+            import registers
+            registers.registerstuff()
+            _registered = True
+
+def ensure_weights(modelstr:str, pathfile:Path):
+    """
+    NAME: ensure_weights
+    DESC: Downloads the weights from gdrive if they are not on disk yet
+    """
+    if not Path.exists(pathfile):
+        print(f"[*] Downloading {modelstr} weights from gdrive")
+        utils.download_path(modelstr=modelstr)
+
+def semantic_model(model_name:str, device=None, quantize:Optional[bool]=None):
+    modelstr, config, pathfile = SEMANTIC_MODELS[model_name]
+    ensure_weights(modelstr, pathfile)
+    register_models()
+    # -- resolved before the cached init so None / "cuda" / "cuda:0" share one model -- #
+    device = select_device(device)
+    return utils.mmseg_init(config=config, pathfile=pathfile, device=device, quantize=use_int8(device, quantize))
+
+def detector_model(device=None, quantize:Optional[bool]=None):
+    modelstr, config, pathfile = DETECTOR_MODEL
+    ensure_weights(modelstr, pathfile)
+    register_models()
+    device = select_device(device)
+    return utils.mmyolo_init(config=config, pathfile=pathfile, device=device, quantize=use_int8(device, quantize))
+
+def semantic_classes(model_name:str, backend:Optional[str]=None) -> list:
+    """Class names of a semantic model, read from the export metadata when running an exported model"""
+    modelstr = SEMANTIC_MODELS[model_name][0]
+    backend = exported_backend.model_backend(modelstr, backend)
+    if backend != "pytorch":
+        return exported_backend.load_exported(modelstr, backend).classes
+    return list(semantic_model(model_name).dataset_meta['classes'])
+
+def semantic_inference(model_name:str, images:list, device=None, bar=None, quantize:Optional[bool]=None,
+                       backend:Optional[str]=None) -> List[np.ndarray]:
+    """
+    NAME: semantic_inference
+    DESC: Runs U-Net / Deeplabv3+ over a list of BGR images (as read by cv2.imread).
+          A cancelled job (bar) stops before the forward pass, or between images for exported models,
+          but the forward pass itself can't be interrupted.
+    OUTPUT: list of raw (H, W) uint8 prediction masks, one per image
+    """
+    bar = bar or NoProgress()
+    bar.progress(20)
+    modelstr = SEMANTIC_MODELS[model_name][0]
+    backend = exported_backend.model_backend(modelstr, backend)
+    if backend != "pytorch":
+        model = exported_backend.load_exported(modelstr, backend)
+        bar.progress(40)
+        masks = []
+        for image in images:
+            bar.check_cancelled()
+            masks.append(model.predict(image))
+        return masks
+    from mmseg.apis import inference_model
+    model = semantic_model(model_name, device=device, quantize=quantize)
+    bar.progress(40)
+    bar.check_cancelled()
+    results = inference_model(model, images)
+    if not isinstance(results, list):
+        results = [results]
+    return [utils.numpy_from_result(result=result) for result in results]
+
+# -- [ Batched semantic segmentation engine ] -- #
+def semantic_test_pipeline(model) -> "Compose":
+    """
+    NAME: semantic_test_pipeline
+    DESC: Builds the test_pipeline declared in the model config (unet.py / deeplab.py) for inference,
+          i.e. without LoadAnnotations since there is no ground truth. Images are loaded from file
+          by the pipeline itself so decoding happens in the I/O threads.
+    """
+    from mmengine.dataset import Compose
+    pipeline_cfg = [copy.deepcopy(t) for t in model.cfg.test_pipeline if t.get('type') != 'LoadAnnotations']
+    return Compose(pipeline_cfg)
+
+def batched_semantic_inference(model, image_paths:Iterable[str], batch_size:int = 4,
+                               io_workers:int = 2, prefetch_batches:int = 2, bar=None) -> Iterator[Tuple[str, np.ndarray]]:
+    """
+    NAME: batched_semantic_inference
+    DESC: Generator which runs U-Net / Deeplabv3+ over many images, batch_size tiles per forward pass.
+          Decoding + the test pipeline run in a thread pool, prefetch_batches batches ahead of the
+          model, so reading the next tiles overlaps with the current forward pass. The data
+          preprocessor needs every tile of a batch to be the same size, so a batch ends early at a
+          tile of another size (folders of mixed tile sizes run in smaller batches, not crash).
+          A cancelled job (bar) stops between batches, a forward pass can't be interrupted.
+    OUTPUT: (image path, raw (H, W) uint8 mask) for every image, in input order
+    """
+    bar = bar or NoProgress()
+    pipeline = semantic_test_pipeline(model)
+    paths = iter(image_paths)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=io_workers) as pool:
+        def fill():
+            while len(pending) < batch_size * (prefetch_batches + 1):
+                path = next(paths, None)
+                if path is None:
+                    return
+                pending.append((path, pool.submit(pipeline, dict(img_path=str(path)))))
+        fill()
+        while pending:
+            batch = [pending.popleft()]
+            shape = batch[0][1].result()["inputs"].shape
+            while pending and len(batch) < batch_size and pending[0][1].result()["inputs"].shape == shape:
+                batch.append(pending.popleft())
+            fill() # -- queue up the next tiles before the forward pass -- #
+            data = {"inputs": [], "data_samples": []}
+            for _, future in batch:
+                sample = future.result()
+                data["inputs"].append(sample["inputs"])
+                data["data_samples"].append(sample["data_samples"])
+            bar.check_cancelled()
+            with torch.no_grad():
+                results = model.test_step(data)
+            for (path, _), result in zip(batch, results):
+                yield path, utils.numpy_from_result(result=result)
+
+def semantic_throughput(model, image_paths:List[str], batch_size:int) -> float:
+    """
+    NAME: semantic_throughput
+    DESC: Images per second of batched_semantic_inference over the given images at this batch size
+    """
+    start = time.perf_counter()
+    count = sum(1 for _ in batched_semantic_inference(model, image_paths, batch_size=batch_size))
+    return count / (time.perf_counter() - start)
+
+def detection_inference(path_img, device=None, score_thr:float=0.0, topk:Optional[int]=None, bar=None,
+                        quantize:Optional[bool]=None, backend:Optional[str]=None) -> utils.Detections:
+    """
+    NAME: detection_inference
+    DESC: Runs MMYOLOv8 on an image (path or BGR array). A cancelled job (bar) stops before the
+          forward pass, not during it.
+    """
+    bar = bar or NoProgress()
+    backend = exported_backend.model_backend(DETECTOR_MODEL[0], backend)
+    if backend != "pytorch":
+        model = exported_backend.load_exported(DETECTOR_MODEL[0], backend)
+        bar.progress(30)
+        bar.check_cancelled()
+        return utils.Detections(**model.predict(path_img, score_thr=score_thr, topk=topk))
+    model = detector_model(device=device, quantize=quantize)
+    bar.progress(30)
+    bar.check_cancelled()
+    return utils.inference_detections(model=model, image=path_img, score_thr=score_thr, topk=topk)
+
+def reported(items:Iterable, bar, start:int, end:int, total:int) -> Iterator:
+    """Passes items through, moving bar from start to end as they go (and giving a cancelled job a place to stop)"""
+    for done, item in enumerate(items, 1):
+        yield item
+        bar.progress(start + (end - start) * done // max(total, 1))
+
+def pipeline_inference(path_img, image:np.ndarray, device=None, score_thr:float=0.0,
+                       sam_budget:float=0, sam_model:Optional[str]=None, bar=None,
+                       quantize:Optional[bool]=None, backend:Optional[str]=None, detect=None) -> PipelineResult:
+    """
+    NAME: pipeline_inference
+    DESC: MMYOLOv8 boxes -> SAM prompts -> instance map of every nucleus
+    ARGS:
+    -------
+    path_img: image path (or BGR array) for the detector
+    image (np.ndarray): the same image in RGB for SAM
+    sam_budget (float): memory budget (MB) per SAM batch, 0 = auto
+    sam_model (str, optional): SAM backbone (vit_h / vit_l / vit_b), None = utils.default_sam_model
+    quantize (bool, optional): int8 models on CPU, None = APP_QUANTIZE
+    backend (str, optional): detector backend (pytorch / onnxruntime / torchscript), SAM always runs in pytorch
+    detect (callable, optional): used in place of detection_inference (BatchedInference passes its batched one)
+    """
+    bar = bar or NoProgress()
+    detect = detect or detection_inference
+    device = select_device(device)
+    quantize = use_int8(device, quantize)
+    predictor = utils.sam_init(model_type=sam_model or utils.default_sam_model(device), device=device, quantize=quantize)
+    bar.progress(10)
+    # -- Inference detection -- #
+    detections = detect(path_img, device=device, score_thr=score_thr, quantize=quantize, backend=backend, bar=bar)
+    bar.progress(30)
+    # -- process inference to inputs for SAM -- #
+    batch_size = utils.sam_batch_size(image_shape=image.shape, device=predictor.device, memory_budget_mb=sam_budget)
+    inputs_boxes = utils.input_boxes_sam(detections.boxes, batch_size=batch_size)
+    bar.progress(50)
+    # -- get prediction information from SAM, streamed batch by batch into the instance map -- #
+    timings = []
+    with SAM_LOCK:
+        bar.check_cancelled() # -- the image embedding is the long step, it runs on the first batch -- #
+        sam_batches = utils.stream_masks_sam(image=image, predictor=predictor, inputs_boxes=inputs_boxes)
+        sam_batches = reported(sam_batches, bar, 50, 90, len(inputs_boxes))
+        instance_map, instances = utils.instance_masks_sam(sam_batches, image_shape=image.shape, timings=timings)
+    bar.progress(90)
+    return PipelineResult(detections=detections, instance_map=instance_map, instances=instances, sam_timings=timings)
+
+# -- [ Micro-batched inference for concurrent callers ] -- #
+def detector_test_pipeline(model) -> "Compose":
+    """
+    NAME: detector_test_pipeline
+    DESC: The detector's test_pipeline for images already in memory (what inference_detector builds
+          per call), without LoadAnnotations since there is no ground truth
+    """
+    from mmengine.dataset import Compose
+    from mmengine.registry import init_default_scope
+    init_default_scope(model.cfg.get("default_scope", "mmdet"))
+    pipeline_cfg = [copy.deepcopy(t) for t in model.cfg.test_pipeline if "LoadAnnotations" not in t.get("type")]
+    pipeline_cfg[0] = dict(type="mmdet.LoadImageFromNDArray")
+    return Compose(pipeline_cfg)
+
+_detector_pipelines = {}
+
+def batched_detection_inference(images:List[np.ndarray], device=None, score_thr:float=0.0, topk:Optional[int]=None,
+                                quantize:Optional[bool]=None, backend:Optional[str]=None) -> List[utils.Detections]:
+    """
+    NAME: batched_detection_inference
+    DESC: MMYOLOv8 over several BGR images in one forward pass (LetterResize gives every image the
+          same input size), inference_detector runs them one by one
+    """
+    backend = exported_backend.model_backend(DETECTOR_MODEL[0], backend)
+    if backend != "pytorch":
+        model = exported_backend.load_exported(DETECTOR_MODEL[0], backend)
+        return [utils.Detections(**model.predict(image, score_thr=score_thr, topk=topk)) for image in images]
+    model = detector_model(device=device, quantize=quantize)
+    if id(model) not in _detector_pipelines:
+        _detector_pipelines[id(model)] = detector_test_pipeline(model)
+    pipeline = _detector_pipelines[id(model)]
+    data = {"inputs": [], "data_samples": []}
+    for img_id, image in enumerate(images):
+        sample = pipeline(dict(img=image, img_id=img_id))
+        data["inputs"].append(sample["inputs"])
+        data["data_samples"].append(sample["data_samples"])
+    with torch.no_grad():
+        results = model.test_step(data)
+    return [utils.detections_from_result(result, score_thr=score_thr, topk=topk) for result in results]
+
+
+class BatchedInference:
+    """
+    NAME: BatchedInference
+    DESC: Same semantic / detection / pipeline functions as this module, for callers on many threads at
+          once (the job queue workers, the inference server). Single images from different callers
+          are micro-batched (batching.MicroBatcher) into one forward pass per model, settings and,
+          for the semantic models, tile size.
+    """
+    def __init__(self, window_ms:float = BATCH_WINDOW_MS, max_batch:int = MAX_BATCH):
+        self.semantic = MicroBatcher("semantic", self._run_semantic, window_ms, max_batch)
+        self.detect = MicroBatcher("detect", self._run_detect, window_ms, max_batch)
+
+    @staticmethod
+    def _run_semantic(key, images:list) -> list:
+        model_name, device, quantize, backend, _ = key
+        return semantic_inference(model_name, images, device=device, quantize=quantize, backend=backend)
+
+    @staticmethod
+    def _run_detect(key, images:list) -> list:
+        device, score_thr, topk, quantize, backend = key
+        return batched_detection_inference(images, device=device, score_thr=score_thr, topk=topk,
+                                           quantize=quantize, backend=backend)
+
+    def stats(self) -> dict:
+        return {"semantic": self.semantic.stats(), "detect": self.detect.stats()}
+
+    def semantic_inference(self, model_name:str, images:list, device=None, bar=None, quantize:Optional[bool]=None,
+                           backend:Optional[str]=None) -> List[np.ndarray]:
+        bar = bar or NoProgress()
+        bar.progress(20)
+        device = select_device(device)
+        futures = [self.semantic.submit((model_name, device, use_int8(device, quantize),
+                                         exported_backend.model_backend(SEMANTIC_MODELS[model_name][0], backend),
+                                         image.shape), image)
+                   for image in images]
+        return [wait_result(future, bar) for future in futures]
+
+    def semantic_classes(self, model_name:str, backend:Optional[str]=None) -> list:
+        return semantic_classes(model_name, backend=backend)
+
+    def detection_inference(self, path_img, device=None, score_thr:float=0.0, topk:Optional[int]=None, bar=None,
+                            quantize:Optional[bool]=None, backend:Optional[str]=None) -> utils.Detections:
+        bar = bar or NoProgress()
+        image = cv2.imread(str(path_img)) if isinstance(path_img, (str, Path)) else path_img
+        device = select_device(device)
+        bar.progress(30)
+        key = (device, score_thr, topk, use_int8(device, quantize), exported_backend.model_backend(DETECTOR_MODEL[0], backend))
+        return wait_result(self.detect.submit(key, image), bar)
+
+    def pipeline_inference(self, path_img, image:np.ndarray, device=None, score_thr:float=0.0,
+                           sam_budget:float=0, sam_model:Optional[str]=None, bar=None,
+                           quantize:Optional[bool]=None, backend:Optional[str]=None) -> PipelineResult:
+        # -- the detector is batched, SAM takes one image at a time (SAM_LOCK) -- #
+        return pipeline_inference(path_img, image, device=device, score_thr=score_thr, sam_budget=sam_budget,
+                                  sam_model=sam_model, bar=bar, quantize=quantize, backend=backend,
+                                  detect=self.detection_inference)
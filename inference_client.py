@@ -0,0 +1,132 @@
+# -- [ Thin client for the shared inference server (inference_server.py) ] -- #
+# Same functions (and signatures) as inference.py for the parts home.py uses, but the models run in the
+# server process, so any number of Streamlit processes can share one copy of the weights.
+# Only needs numpy / OpenCV, torch and OpenMMLab are never imported on this side.
+#   APP_INFERENCE_SERVER  = http://host:port or unix:/path/to/socket (unset: models run in-process)
+#   APP_INFERENCE_TIMEOUT = seconds to wait for one request (default 600)
+#
+# Wire format: POST /v1/<task> with an .npz body of the input arrays and the keyword arguments as
+# json in the X-Inference-Params header; the reply is an .npz of the output arrays with json
+# metadata in X-Inference-Meta.
+import http.client
+import io
+import json
+import os
+import socket
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+import cv2
+import numpy as np
+from utils_common import Detections, PipelineResult, pipeline_from_arrays
+# -- ############################### -- #
+
+SERVER_ENV = "APP_INFERENCE_SERVER"
+TIMEOUT_S = float(os.environ.get("APP_INFERENCE_TIMEOUT", 600))
+PARAMS_HEADER = "X-Inference-Params"
+META_HEADER = "X-Inference-Meta"
+
+
+def server_address(value:Optional[str] = None) -> Optional[str]:
+    """Inference server to use (value or APP_INFERENCE_SERVER), None to run the models in-process"""
+    value = os.environ.get(SERVER_ENV, "") if value is None else value
+    return value.strip() or None
+
+def encode_arrays(arrays:dict) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **{name: np.asarray(value) for name, value in arrays.items()})
+    return buffer.getvalue()
+
+def decode_arrays(body:bytes) -> dict:
+    with np.load(io.BytesIO(body), allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over a Unix domain socket"""
+    def __init__(self, socket_path:str, timeout:float = TIMEOUT_S):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class InferenceClient:
+    """
+    NAME: InferenceClient
+    DESC: Drop-in for the inference module when the models live in inference_server.py.
+          device= is accepted for compatibility and ignored, the server runs on its own device.
+          bar only moves before and after the request, a job cancelled meanwhile stops once it returns.
+    """
+    def __init__(self, address:str, timeout:float = TIMEOUT_S):
+        self.address = address
+        self.timeout = timeout
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self.address.startswith("unix:"):
+            return UnixHTTPConnection(self.address[len("unix:"):], timeout=self.timeout)
+        parts = urlsplit(self.address if "://" in self.address else f"http://{self.address}")
+        return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+
+    def call(self, task:str, arrays:Optional[dict] = None, **params) -> Tuple[dict, dict]:
+        """Runs task on the server, returns (output arrays, metadata)"""
+        connection = self._connection()
+        try:
+            connection.request("POST", f"/v1/{task}", body=encode_arrays(arrays or {}),
+                               headers={PARAMS_HEADER: json.dumps(params), "Content-Type": "application/octet-stream"})
+            response = connection.getresponse()
+            body = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"Inference server {self.address} failed on {task} "
+                                   f"({response.status}): {body.decode(errors='replace')}")
+            return decode_arrays(body), json.loads(response.getheader(META_HEADER) or "{}")
+        finally:
+            connection.close()
+
+    def health(self) -> dict:
+        connection = self._connection()
+        try:
+            connection.request("GET", "/health")
+            return json.loads(connection.getresponse().read())
+        finally:
+            connection.close()
+
+    # -- [ inference.py API ] -- #
+    def semantic_inference(self, model_name:str, images:list, device=None, bar=None, quantize:Optional[bool]=None,
+                           backend:Optional[str]=None) -> List[np.ndarray]:
+        if bar is not None:
+            bar.progress(20)
+        arrays, _ = self.call("semantic", {f"image_{i}": image for i, image in enumerate(images)},
+                              model_name=model_name, quantize=quantize, backend=backend)
+        if bar is not None:
+            bar.progress(80)
+        return [arrays[f"mask_{i}"] for i in range(len(images))]
+
+    def semantic_classes(self, model_name:str, backend:Optional[str]=None) -> list:
+        return self.call("classes", model_name=model_name, backend=backend)[1]["classes"]
+
+    def detection_inference(self, path_img, device=None, score_thr:float=0.0, topk:Optional[int]=None, bar=None,
+                            quantize:Optional[bool]=None, backend:Optional[str]=None) -> Detections:
+        if isinstance(path_img, (str, Path)):
+            path_img = cv2.imread(str(path_img))
+        if bar is not None:
+            bar.progress(30)
+        arrays, _ = self.call("detect", {"image": path_img}, score_thr=score_thr, topk=topk,
+                              quantize=quantize, backend=backend)
+        return Detections(**arrays)
+
+    def pipeline_inference(self, path_img, image:np.ndarray, device=None, score_thr:float=0.0,
+                           sam_budget:float=0, sam_model:Optional[str]=None, bar=None,
+                           quantize:Optional[bool]=None, backend:Optional[str]=None) -> PipelineResult:
+        if isinstance(path_img, (str, Path)):
+            path_img = cv2.imread(str(path_img))
+        if bar is not None:
+            bar.progress(10)
+        arrays, meta = self.call("pipeline", {"detector_image": path_img, "image": image}, score_thr=score_thr,
+                                 sam_budget=sam_budget, sam_model=sam_model, quantize=quantize, backend=backend)
+        if bar is not None:
+            bar.progress(90)
+        return pipeline_from_arrays(arrays, meta["sam_timings"])
@@ -0,0 +1,140 @@
+# -- [ Shared inference server ] -- #
+# Hosts U-Net / DeepLabv3+ / MMYOLOv8 / SAM once for every Streamlit process (or replica) pointed at it
+# with APP_INFERENCE_SERVER, instead of each one holding its own copy through @st.cache_resource.
+# Requests from all clients run through inference.BatchedInference, so images arriving within the
+# batching window (--window-ms, or until --max-batch are waiting) go through the model as one
+# forward pass per model / settings (and tile size for the semantic models), see batching.py.
+# Device, quantization, exported backends and warm-up follow the usual env vars
+# (APP_DEVICE, APP_QUANTIZE, APP_BACKEND*, APP_WARMUP).
+#
+# e.g. python inference_server.py --port 8765          + APP_INFERENCE_SERVER=http://127.0.0.1:8765
+#      python inference_server.py --socket /tmp/nuclei.sock + APP_INFERENCE_SERVER=unix:/tmp/nuclei.sock
+import argparse
+import json
+import os
+import socketserver
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from batching import BATCH_WINDOW_MS, MAX_BATCH
+from inference_client import META_HEADER, PARAMS_HEADER, decode_arrays, encode_arrays
+# -- ############################### -- #
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Shared inference server for the Streamlit app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="listen on this Unix socket instead of host:port")
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW_MS, help="batching window (APP_BATCH_WINDOW_MS)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="most images per forward pass (APP_MAX_BATCH)")
+    return parser.parse_args()
+
+
+def model_host() -> dict:
+    """
+    NAME: model_host
+    DESC: Where the models run: device, whether INT8 is on by default (APP_QUANTIZE) and the default
+          backend of every model (APP_BACKEND*). Clients use it instead of asking torch locally.
+    """
+    import exported_backend
+    from devices import select_device
+    from quantization import use_int8
+    from utils_common import DETECTOR_MODEL, SEMANTIC_MODELS
+    device = select_device()
+    keys = [key for key, _, _ in SEMANTIC_MODELS.values()] + [DETECTOR_MODEL[0]]
+    return {"device": device, "int8_default": use_int8(device),
+            "backends": {key: exported_backend.model_backend(key) for key in keys}}
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    server_version = "NucleiInference/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def reply(self, status:int, body:bytes, meta:dict = None, content_type:str = "application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if meta is not None:
+            self.send_header(META_HEADER, json.dumps(meta))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self.reply(404, b"not found", content_type="text/plain")
+        status = {**model_host(), "uptime_s": round(time.time() - self.server.started, 1),
+                  "batching": self.server.engine.stats(),
+                  "warmup": self.server.warmup.status()}
+        self.reply(200, json.dumps(status).encode(), content_type="application/json")
+
+    def do_POST(self):
+        task = self.path.rsplit("/", 1)[-1]
+        try:
+            params = json.loads(self.headers.get(PARAMS_HEADER) or "{}")
+            arrays = decode_arrays(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            outputs, meta = self.run_task(task, arrays, params)
+        except (KeyError, ValueError, TypeError) as error:
+            return self.reply(400, f"{type(error).__name__}: {error}".encode(), content_type="text/plain")
+        except Exception as error:
+            self.log_error("%s failed: %s", task, error)
+            return self.reply(500, f"{type(error).__name__}: {error}".encode(), content_type="text/plain")
+        self.reply(200, encode_arrays(outputs), meta)
+
+    def run_task(self, task:str, arrays:dict, params:dict):
+        engine = self.server.engine
+        if task == "classes":
+            return {}, {"classes": engine.semantic_classes(params["model_name"], backend=params.get("backend"))}
+        if task == "semantic":
+            masks = engine.semantic_inference(params["model_name"], [arrays[f"image_{i}"] for i in range(len(arrays))],
+                                              quantize=params.get("quantize"), backend=params.get("backend"))
+            return {f"mask_{i}": mask for i, mask in enumerate(masks)}, {}
+        if task == "detect":
+            detections = engine.detection_inference(arrays["image"], score_thr=params.get("score_thr", 0.0),
+                                                    topk=params.get("topk"), quantize=params.get("quantize"),
+                                                    backend=params.get("backend"))
+            return detections._asdict(), {}
+        if task == "pipeline":
+            import utils_common
+            result = engine.pipeline_inference(arrays["detector_image"], arrays["image"],
+                                               score_thr=params.get("score_thr", 0.0),
+                                               sam_budget=params.get("sam_budget", 0), sam_model=params.get("sam_model"),
+                                               quantize=params.get("quantize"), backend=params.get("backend"))
+            return utils_common.pipeline_arrays(result), {"sam_timings": result.sam_timings}
+        raise KeyError(f"Unknown task {task}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    args = parse_args()
+    import inference
+    import warmup
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, InferenceHandler)
+        where = f"unix:{args.socket}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), InferenceHandler)
+        where = f"http://{args.host}:{args.port}"
+    server.started = time.time()
+    server.engine = inference.BatchedInference(window_ms=args.window_ms, max_batch=args.max_batch)
+    server.warmup = warmup.start_warmup()
+    print(f"[*] Inference server listening on {where} (set APP_INFERENCE_SERVER={where})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# -- [ Local job queue for long running inference ] -- #
+# Processing runs in a pool of worker threads shared by every session of the server, so the
+# Streamlit script only submits a job and polls it instead of blocking until the model is done.
+#   - submit() returns a job ID straight away, status / progress / result are read with job()
+#   - jobs are handed to workers round robin over the sessions that have work queued, so one
+#     session queueing several images can't starve the others
+#   - cancel() drops a queued job, a running one is aborted at its next progress update or
+#     cancellation check (inference checks before every model call and between batches): the
+#     JobProgress given to the job (in place of st.progress) raises JobCancelled. A forward pass
+#     that has already started can't be interrupted, the job stops once it returns.
+#   APP_JOB_WORKERS = number of worker threads (default 2)
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+# -- ############################### -- #
+
+JOB_WORKERS = int(os.environ.get("APP_JOB_WORKERS", 2))
+# -- finished jobs nobody collected are forgotten after this long (closed browser tabs) -- #
+FINISHED_TTL_S = float(os.environ.get("APP_JOB_TTL_S", 3600))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it was cancelled"""
+
+
+class JobProgress:
+    """
+    NAME: JobProgress
+    DESC: Stand-in for st.progress handed to the job. progress() records the value for the UI,
+          it and check_cancelled() are where a cancelled job stops. Neither can interrupt a single
+          forward pass, so long running code calls check_cancelled() before each model call.
+    """
+    def __init__(self, job:"Job"):
+        self._job = job
+
+    def progress(self, value, text:Optional[str] = None):
+        self.check_cancelled()
+        self._job.progress = int(value)
+        if text is not None:
+            self._job.message = text
+
+    def check_cancelled(self):
+        if self._job.cancel_requested.is_set():
+            raise JobCancelled(self._job.job_id)
+
+
+class Job:
+    def __init__(self, owner:str, fn:Callable, args:tuple, kwargs:dict, name:str):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.owner = owner
+        self.name = name
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.state = QUEUED
+        self.progress = 0
+        self.message = ""
+        self.result = None
+        self.error = ""
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = threading.Event()
+
+    @property
+    def seconds(self) -> Optional[float]:
+        """Run time so far (or in total once finished)"""
+        if self.started is None:
+            return None
+        return round((self.finished or time.time()) - self.started, 2)
+
+    def row(self) -> dict:
+        return {"job": self.job_id, "session": self.owner[:8], "name": self.name, "state": self.state,
+                "progress": self.progress, "seconds": self.seconds, "error": self.error}
+
+
+class JobQueue:
+    """
+    NAME: JobQueue
+    DESC: Worker pool with one FIFO per owner (session), served round robin.
+          A job is any callable taking a bar= keyword (JobProgress), its return value is the result.
+    """
+    def __init__(self, workers:int = JOB_WORKERS):
+        self._lock = threading.Condition()
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._jobs: Dict[str, Job] = {}
+        self._workers = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, owner:str, fn:Callable, *args, name:str = "", **kwargs) -> str:
+        job = Job(owner, fn, args, kwargs, name or getattr(fn, "__name__", "job"))
+        with self._lock:
+            self._forget_stale()
+            self._jobs[job.job_id] = job
+            self._queues.setdefault(owner, deque()).append(job)
+            self._lock.notify()
+        print(f"[*] Job {job.job_id} ({job.name}) queued for session {owner[:8]}")
+        return job.job_id
+
+    def job(self, job_id:str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job_id:str) -> int:
+        """Jobs handed to a worker before this one (0 when running / finished)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != QUEUED:
+                return 0
+            # -- round robin: the job goes out in round <index in its queue>, owners ahead of its
+            #    owner get one more job in before it -- #
+            rounds = list(self._queues[job.owner]).index(job)
+            owners = list(self._queues)
+            ahead = owners[:owners.index(job.owner)]
+            return sum(min(len(queue), rounds + (owner in ahead)) if owner != job.owner else rounds
+                       for owner, queue in self._queues.items())
+
+    def cancel(self, job_id:str) -> bool:
+        """Cancels a queued or running job, False when it had already finished"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED:
+                return False
+            job.cancel_requested.set()
+            if job.state == QUEUED:
+                self._queues[job.owner].remove(job)
+                if not self._queues[job.owner]:
+                    del self._queues[job.owner]
+                self._finish(job, CANCELLED)
+        print(f"[*] Job {job_id} cancellation requested")
+        return True
+
+    def forget(self, job_id:str):
+        """Drops a finished job (and its result) once the session has collected it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.state in FINISHED:
+                del self._jobs[job_id]
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            return [job.row() for job in self._jobs.values()]
+
+    # -- [ workers ] -- #
+    def _next_job(self) -> Job:
+        with self._lock:
+            while not self._queues:
+                self._lock.wait()
+            owner, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            # -- owner goes to the back of the line (or out of it when it has nothing left) -- #
+            del self._queues[owner]
+            if queue:
+                self._queues[owner] = queue
+            job.state, job.started = RUNNING, time.time()
+            return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            bar = JobProgress(job)
+            try:
+                bar.check_cancelled()
+                result = job.fn(*job.args, bar=bar, **job.kwargs)
+            except JobCancelled:
+                self._finish(job, CANCELLED)
+            except Exception as error: # -- a failed job must never take the worker down -- #
+                job.error = f"{type(error).__name__}: {error}"
+                self._finish(job, FAILED)
+            else:
+                job.result = result
+                job.progress = 100
+                self._finish(job, DONE)
+            finally:
+                job.fn = job.args = job.kwargs = None
+
+    def _finish(self, job:Job, state:str):
+        job.state, job.finished = state, time.time()
+        print(f"[*] Job {job.job_id} ({job.name}) {state}" + (f" in {job.seconds}s" if job.seconds else "")
+              + (f": {job.error}" if job.error else ""))
+
+    def _forget_stale(self):
+        now = time.time()
+        stale = [job_id for job_id, job in self._jobs.items()
+                 if job.state in FINISHED and now - job.finished > FINISHED_TTL_S]
+        for job_id in stale:
+            del self._jobs[job_id]
@@ -0,0 +1,79 @@
+# -- [ Memory-mapped store for predicted masks / overlays ] -- #
+# Each session gets a folder of .npy files. Session state only keeps read-only memmaps of them,
+# so the pixels live in the (evictable) page cache instead of every session's heap, and
+# display / metrics code can read just the region it needs.
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+import numpy as np
+# -- ############################### -- #
+
+STORE_ROOT = Path(os.environ.get("MASK_STORE_DIR", "./temp/masks"))
+# -- session folders not touched for this long are removed (closed browser tabs never clean up) -- #
+STALE_AFTER_HOURS = float(os.environ.get("MASK_STORE_STALE_HOURS", 12))
+
+
+class MaskStore:
+    """
+    NAME: MaskStore
+    DESC: Folder of memory-mapped arrays for one session.
+          put() writes an array to <root>/<session>/<name>.npy and hands back a read-only memmap of it,
+          get() / read_region() reopen it lazily.
+    """
+    def __init__(self, session_id:Optional[str] = None, root:Path = STORE_ROOT):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.root = Path(root) / self.session_id
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, name:str) -> Path:
+        return self.root / f"{name}.npy"
+
+    def put(self, name:str, array:np.ndarray) -> np.memmap:
+        array = np.asarray(array)
+        # -- write next to it and swap in, memmaps already handed out keep the old file (inode) -- #
+        tmp_path = self.root / f"{name}.{uuid.uuid4().hex}.tmp"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=array.dtype, shape=array.shape)
+        out[...] = array
+        out.flush()
+        del out
+        os.replace(tmp_path, self.path(name))
+        return self.get(name)
+
+    def get(self, name:str) -> Optional[np.memmap]:
+        path = self.path(name)
+        if not path.exists():
+            return None
+        os.utime(self.root) # -- keeps the session folder from being seen as stale -- #
+        return np.load(path, mmap_mode="r")
+
+    def read_region(self, name:str, x:int, y:int, w:int, h:int) -> Optional[np.ndarray]:
+        """Copies just the (x, y, w, h) window of a stored array into memory"""
+        array = self.get(name)
+        if array is None:
+            return None
+        return np.array(array[y:y + h, x:x + w])
+
+    def delete(self, name:str):
+        path = self.path(name)
+        if path.exists():
+            path.unlink()
+
+    def clear(self):
+        for path in self.root.glob("*.npy"):
+            path.unlink()
+
+
+def purge_stale(root:Path = STORE_ROOT, max_age_hours:float = STALE_AFTER_HOURS):
+    """
+    NAME: purge_stale
+    DESC: Removes session folders which have not been used for max_age_hours
+    """
+    if not Path(root).exists():
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for folder in Path(root).iterdir():
+        if folder.is_dir() and folder.stat().st_mtime < cutoff:
+            shutil.rmtree(folder, ignore_errors=True)
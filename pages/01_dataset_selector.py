@@ -2,7 +2,8 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-from utils import load_images
+from utils_common import load_images
+import thumbnails
 # SOME LINKS FOR REFERENCE:
 # * https://plotly.com/python-api-reference/generated/plotly.express.pie
 # * https://plotly.com/python/builtin-colorscales/
@@ -22,6 +23,11 @@ hide_streamlit_style = """
             """
 st.markdown(hide_streamlit_style, unsafe_allow_html=True) 
 
+@st.cache_resource
+def thumbnail_store() -> thumbnails.ThumbnailCache:
+    """Tile previews on disk, shared by every session of this server"""
+    return thumbnails.ThumbnailCache()
+
 # -- ### - CONSTANTS - ### - #
 KIDNEY_RENAL = "Kidney renal clear cell carcinoma"
 BREAST_INVASIVE = "Breast invasive carcinoma"
@@ -133,7 +139,7 @@ def monuseg():
     for group in groups:
         colss = cols[1].columns(n)
         for i, image_file in enumerate(group):
-            colss[i].image(image_file)
+            colss[i].image(thumbnail_store().get(image_file)) # -- small cached JPEG, not the full PNG -- #
 
 #TODO[medium]: Finish the rest of the datasets. Find and add information for each
 def cryonuseg():
@@ -1,6 +1,6 @@
 import streamlit as st
-from tempfile import NamedTemporaryFile
 import cv2
+from utils_common import decode_image
 from streamlit_image_comparison import image_comparison
 
 st.set_page_config(page_title="Image Augmentation", 
@@ -68,34 +68,31 @@ def main():
     if uploaded_image is not None:
         if 'uploaded_image' not in st.session_state:
              st.session_state.uploaded_image = uploaded_image
-        with NamedTemporaryFile(dir='.', suffix='.png') as f:
-            f.write(uploaded_image.getbuffer())
-            img = cv2.imread(f.name)
-            if not st.session_state.is_uploaded:
-                st.session_state.is_uploaded = True
-                st.rerun()
-            
-            # -- Define image for session state -- #
-            if 'pre_image' not in st.session_state:
-                st.session_state.pre_image = img
-            # -- ------------------------------ -- #
-            #processed_image.image(st.session_state.pre_image, caption=uploaded_image.name, width=600,)
-            if preproc_option == "CLAHE":
-                # -- [ RUN THE CLAHE ALG ] -- #
-                thresh = st.slider("Choose CLAHE Threshold", 0.01, 10.0, 1.0,)
-                with cols[1]:
-                    clahed_image = clahe(st.session_state.pre_image.copy(), thresh)
-                    image_comparison(
-                        img1=st.session_state.pre_image,
-                        img2=clahed_image,
-                        label1="Original",
-                        label2="CLAHE: " + str(thresh),
-                        starting_position=50,
-                        show_labels=True,
-                        make_responsive=True,
-                        in_memory=True,
-                        width=700,
-                    )
+        if not st.session_state.is_uploaded:
+            st.session_state.is_uploaded = True
+            st.rerun()
+
+        # -- Define image for session state (decoded once, straight from the upload buffer) -- #
+        if 'pre_image' not in st.session_state:
+            st.session_state.pre_image = decode_image(uploaded_image.getbuffer())
+        # -- ------------------------------ -- #
+        #processed_image.image(st.session_state.pre_image, caption=uploaded_image.name, width=600,)
+        if preproc_option == "CLAHE":
+            # -- [ RUN THE CLAHE ALG ] -- #
+            thresh = st.slider("Choose CLAHE Threshold", 0.01, 10.0, 1.0,)
+            with cols[1]:
+                clahed_image = clahe(st.session_state.pre_image.copy(), thresh)
+                image_comparison(
+                    img1=st.session_state.pre_image,
+                    img2=clahed_image,
+                    label1="Original",
+                    label2="CLAHE: " + str(thresh),
+                    starting_position=50,
+                    show_labels=True,
+                    make_responsive=True,
+                    in_memory=True,
+                    width=700,
+                )
     else:
         if st.session_state.is_uploaded:
             st.session_state.clear()
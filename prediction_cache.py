@@ -0,0 +1,130 @@
+# -- [ Content-addressed prediction cache ] -- #
+# Predictions are stored on local disk under a key made from the image pixels, the model config,
+# the checkpoint and the inference parameters, so clicking the same sample image (or uploading the
+# same png again) is a lookup instead of another forward pass. Least recently used entries are
+# evicted once the cache grows past its size limit.
+import hashlib
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import NamedTuple, Optional
+import numpy as np
+# -- ############################### -- #
+
+CACHE_DIR = Path(os.environ.get("PREDICTION_CACHE_DIR", "./temp/prediction_cache"))
+CACHE_MAX_MB = float(os.environ.get("PREDICTION_CACHE_MAX_MB", 2048))
+
+
+class CachedPrediction(NamedTuple):
+    arrays: dict  # name -> np.ndarray (masks, boxes, scores ...)
+    meta: dict    # anything json-able (metrics, class names ...)
+
+
+def image_digest(image:np.ndarray) -> str:
+    """sha256 of the decoded pixels (+ shape and dtype), independent of file name or png encoding"""
+    digest = hashlib.sha256()
+    digest.update(f"{image.shape}|{image.dtype}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+def file_signature(path) -> str:
+    """
+    NAME: file_signature
+    DESC: Identifies a file by path, size and modification time. Used for checkpoints where hashing
+          hundreds of MB on every request would cost more than the cache saves.
+    """
+    path = Path(path)
+    if not path.exists():
+        return f"{path}|missing"
+    stat = path.stat()
+    return f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+
+def file_digest(path) -> str:
+    """sha256 of a (small) file's content, e.g. a model config"""
+    path = Path(path)
+    if not path.exists():
+        return f"{path}|missing"
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def prediction_key(image:np.ndarray, model_name:str, config, checkpoint, params:Optional[dict] = None) -> str:
+    """
+    NAME: prediction_key
+    DESC: Cache key for one prediction: image content + model name + config content + checkpoint + parameters
+    """
+    parts = [image_digest(image), model_name, file_digest(config), file_signature(checkpoint),
+             json.dumps(params or {}, sort_keys=True, default=str)]
+    return hashlib.sha256("||".join(parts).encode()).hexdigest()
+
+
+class PredictionCache:
+    """
+    NAME: PredictionCache
+    DESC: Size bounded LRU cache of predictions on local disk. Every entry is <key>.npz (arrays) and
+          <key>.json (meta). Reads bump the file modification time, eviction removes the oldest.
+    """
+    def __init__(self, root:Path = CACHE_DIR, max_mb:float = CACHE_MAX_MB):
+        self.root = Path(root)
+        self.max_bytes = int(max_mb * 1024**2)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self, key:str):
+        return self.root / f"{key}.npz", self.root / f"{key}.json"
+
+    def get(self, key:str) -> Optional[CachedPrediction]:
+        arrays_path, meta_path = self._paths(key)
+        if not (arrays_path.exists() and meta_path.exists()):
+            self.misses += 1
+            return None
+        try:
+            with np.load(arrays_path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            # -- half written / corrupted entry, treat as a miss and let it be rewritten -- #
+            self.misses += 1
+            return None
+        try:
+            os.utime(arrays_path)
+            os.utime(meta_path)
+        except FileNotFoundError:
+            pass # -- evicted since it was read, the loaded entry is still good -- #
+        self.hits += 1
+        return CachedPrediction(arrays=arrays, meta=meta)
+
+    def put(self, key:str, arrays:dict, meta:Optional[dict] = None):
+        arrays_path, meta_path = self._paths(key)
+        tmp = uuid.uuid4().hex
+        # -- write to temp names then rename so readers never see a partial entry -- #
+        tmp_arrays = self.root / f"{key}.{tmp}.npz.tmp"
+        tmp_meta = self.root / f"{key}.{tmp}.json.tmp"
+        with open(tmp_arrays, "wb") as f:
+            np.savez_compressed(f, **{name: np.asarray(value) for name, value in arrays.items()})
+        tmp_meta.write_text(json.dumps(meta or {}, default=str))
+        os.replace(tmp_arrays, arrays_path)
+        os.replace(tmp_meta, meta_path)
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for arrays_path in self.root.glob("*.npz"):
+                meta_path = arrays_path.with_suffix(".json")
+                try:
+                    size = arrays_path.stat().st_size + (meta_path.stat().st_size if meta_path.exists() else 0)
+                    entries.append((arrays_path.stat().st_mtime, size, arrays_path, meta_path))
+                except FileNotFoundError:
+                    continue
+                total += size
+            for _, size, arrays_path, meta_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                arrays_path.unlink(missing_ok=True)
+                meta_path.unlink(missing_ok=True)
+                total -= size
@@ -0,0 +1,95 @@
+# -- [ Import time profile of the Streamlit pages ] -- #
+# Cold start cost of every page: its top level imports are run in a fresh interpreter under
+# python -X importtime, so a change which drags torch / OpenMMLab back into page load shows up.
+# --save writes the numbers as a baseline, --baseline compares against one and exits non zero
+# when a page got slower than --tolerance allows.
+#
+# e.g. python profile_imports.py --save import_profile.json
+#      python profile_imports.py --baseline import_profile.json
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+# -- ############################### -- #
+
+ENTRY_POINTS = ["home.py", "pages/01_dataset_selector.py", "pages/02_Image_Augmentation.py"]
+# -- should only ever be imported once a model runs -- #
+HEAVY_MODULES = ["torch", "mmengine", "mmseg", "mmdet", "mmyolo", "segment_anything", "onnxruntime", "matplotlib"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import time profile of the Streamlit pages")
+    parser.add_argument("--pages", nargs="+", default=ENTRY_POINTS)
+    parser.add_argument("--repeats", type=int, default=3, help="fresh interpreters per page, the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports listed per page")
+    parser.add_argument("--save", type=Path, help="write the profile to this json file")
+    parser.add_argument("--baseline", type=Path, help="compare against a profile saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline (0.25 = 25%%)")
+    return parser.parse_args()
+
+def top_level_imports(page:str) -> list:
+    """import statements at the top level of a page, as source"""
+    tree = ast.parse(Path(page).read_text())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+def import_times(statements:list) -> dict:
+    """
+    NAME: import_times
+    DESC: Runs the statements in a fresh interpreter with -X importtime
+    OUTPUT: {module: cumulative microseconds} for every module imported, or raises on an import error
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "\n".join(statements)],
+                            capture_output=True, text=True, cwd=Path(__file__).parent)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[name] = int(cumulative)
+    return times
+
+def profile_page(page:str, repeats:int) -> dict:
+    statements = top_level_imports(page)
+    runs = [import_times(statements) for _ in range(repeats)]
+    # -- top level modules of the page are the ones it imports directly (no leading spaces) -- #
+    totals = [sum(us for name, us in run.items() if not name.startswith(" ")) for run in runs]
+    modules = {name.strip(): us for name, us in runs[-1].items()}
+    return {
+        "total_ms": round(float(np.median(totals)) / 1000, 1),
+        "heavy": [name for name in HEAVY_MODULES if name in modules],
+        "slowest": sorted(((name, round(us / 1000, 1)) for name, us in modules.items() if "." not in name),
+                          key=lambda item: -item[1]),
+    }
+
+def main():
+    args = parse_args()
+    profile = {}
+    for page in args.pages:
+        try:
+            result = profile_page(page, args.repeats)
+        except RuntimeError as error:
+            print(f"[!] {page}: could not be imported ({error})")
+            continue
+        profile[page] = result["total_ms"]
+        print(f"[*] {page}: {result['total_ms']} ms | heavy modules: {', '.join(result['heavy']) or 'none'}")
+        for name, ms in result["slowest"][:args.top]:
+            print(f"      {ms:>9.1f} ms  {name}")
+    if args.save:
+        args.save.write_text(json.dumps(profile, indent=2))
+        print(f"[*] Saved to {args.save}")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = [page for page, ms in profile.items()
+                       if page in baseline and ms > baseline[page] * (1 + args.tolerance)]
+        for page in regressions:
+            print(f"[!] {page} regressed: {baseline[page]} ms -> {profile[page]} ms")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# -- [ INT8 quantization for CPU inference ] -- #
+# Optional, off by default. Quantized kernels only run on the CPU, so this is ignored on GPU.
+#   SAM                         -> dynamic quantization of every nn.Linear (the ViT is almost all Linear)
+#   U-Net / DeepLabv3+ / MMYOLO -> static (FX graph mode) quantization of the conv submodules,
+#                                  calibrated on the MoNuSeg train tiles
+#   APP_QUANTIZE = off (default) | int8
+# Check what it costs in accuracy with: python evaluate_quantization.py
+import glob
+import os
+from typing import Callable, Iterable, Optional
+import cv2
+import torch
+from torch import nn
+# -- ############################### -- #
+
+QUANTIZE_ENV = "APP_QUANTIZE"
+CALIBRATION_IMAGES = "images/MoNuSeg/train/*.png"
+# -- submodules tried for static quantization, the data preprocessor / heads' post processing stay float -- #
+# -- backbone / neck are replaced by their quantized GraphModule -- #
+STATIC_SUBMODULES = ("backbone", "neck")
+# -- heads keep their module (predict(), loss_by_feat() ... aren't kept by fx), only forward is swapped -- #
+STATIC_HEADS = ("decode_head", "bbox_head")
+
+def use_int8(device, requested:Optional[bool] = None) -> bool:
+    """
+    NAME: use_int8
+    DESC: Whether models should be quantized: requested if given, else the APP_QUANTIZE env var.
+          Always False on GPU (no int8 CPU kernels there).
+    """
+    if requested is None:
+        requested = os.environ.get(QUANTIZE_ENV, "off").strip().lower() in ("int8", "on", "1", "true")
+    if requested and not str(device).startswith("cpu"):
+        print(f"[!] INT8 quantization is CPU only, running float on {device}")
+        return False
+    return bool(requested)
+
+def calibration_images(pattern:str = CALIBRATION_IMAGES, limit:int = 8) -> list:
+    """BGR tiles used to calibrate the activation ranges for static quantization"""
+    return [cv2.imread(path) for path in sorted(glob.glob(pattern))[:limit]]
+
+def quantize_dynamic_linear(model:nn.Module) -> nn.Module:
+    """
+    NAME: quantize_dynamic_linear
+    DESC: Swaps every nn.Linear for an int8 dynamic quantized one in place (weights int8, activations
+          quantized on the fly), e.g. for SAM.
+    """
+    torch.backends.quantized.engine = _quantized_engine()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def quantize_static_submodules(model:nn.Module, run:Callable[[object], object], images:Iterable,
+                               submodules:Iterable[str] = STATIC_SUBMODULES, heads:Iterable[str] = STATIC_HEADS) -> list:
+    """
+    NAME: quantize_static_submodules
+    DESC: Static int8 quantization of an OpenMMLab model, submodule by submodule (backbone, neck, head).
+          Each submodule is traced with torch.fx, observed while run() goes over the calibration
+          images, then converted. Submodules which can't be traced (e.g. shape asserts in the
+          forward) are left in float. fx GraphModules only keep forward(), so heads stay the same
+          module with just their forward replaced. The int8 model is then run once end to end,
+          if that fails everything goes back to float.
+    ARGS:
+    -------
+    model (nn.Module): model in eval mode on the CPU, modified in place
+    run (callable): runs the full model on one image, e.g. lambda img: inference_model(model, img)
+    images (iterable): calibration images for run()
+    OUTPUT: names of the submodules which were quantized
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+    engine = _quantized_engine()
+    torch.backends.quantized.engine = engine
+    images = list(images)
+    if not images:
+        print("[!] No calibration images, skipping static quantization")
+        return []
+    heads = set(heads)
+    targets = {name: getattr(model, name) for name in (*submodules, *heads)
+               if isinstance(getattr(model, name, None), nn.Module)}
+    # -- one float pass to capture example inputs for tracing. forward itself is wrapped (not a -- #
+    # -- forward pre hook) as mmseg's decode_head.predict() calls self.forward() directly -- #
+    example_inputs = {}
+    for name, module in targets.items():
+        module.forward = _capturing_forward(module.forward, example_inputs, name)
+    try:
+        with torch.no_grad():
+            run(images[0])
+    finally:
+        for module in targets.values():
+            del module.forward
+    prepared = {}
+    for name, module in targets.items():
+        if name not in example_inputs:
+            continue
+        try:
+            prepared[name] = prepare_fx(module, get_default_qconfig_mapping(engine), example_inputs[name])
+        except Exception as error: # -- fx raises many kinds of errors on untraceable python -- #
+            print(f"[!] {name} can't be traced for static quantization, kept in float ({type(error).__name__})")
+            continue
+        _install(model, name, prepared[name], name in heads)
+    try:
+        with torch.no_grad():
+            for image in images:
+                run(image)
+        for name, module in prepared.items():
+            _install(model, name, convert_fx(module), name in heads)
+        # -- the converted model has to work end to end, not just each traced piece -- #
+        with torch.no_grad():
+            run(images[0])
+    except Exception as error:
+        for name in prepared:
+            _restore(model, name, targets[name], name in heads)
+        print(f"[!] Static int8 quantization failed, model kept in float ({type(error).__name__}: {error})")
+        return []
+    print(f"[*] Static int8 quantization of {', '.join(prepared) or 'nothing'} ({len(images)} calibration images)")
+    return list(prepared)
+
+def _capturing_forward(forward:Callable, example_inputs:dict, name:str) -> Callable:
+    def capture(*args, **kwargs):
+        if not kwargs: # -- fx example inputs are positional only -- #
+            example_inputs.setdefault(name, args)
+        return forward(*args, **kwargs)
+    return capture
+
+def _install(model:nn.Module, name:str, graph_module:nn.Module, head:bool):
+    """Puts a prepared / converted GraphModule in place of model.<name> (or of its forward for heads)"""
+    if not head:
+        setattr(model, name, graph_module)
+        return
+    module = getattr(model, name)
+    module.int8_forward = graph_module          # -- registered submodule (state_dict, .to()) -- #
+    module.forward = graph_module.__call__      # -- instance attribute, shadows the class forward -- #
+
+def _restore(model:nn.Module, name:str, original:nn.Module, head:bool):
+    if not head:
+        setattr(model, name, original)
+        return
+    del original.int8_forward
+    original.__dict__.pop("forward", None)
+
+def _quantized_engine() -> str:
+    supported = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in supported:
+            return engine
+    return supported[0]
@@ -0,0 +1,132 @@
+# -- [ Rendering of large images for the browser ] -- #
+# px.imshow on a raw array puts every pixel into the figure JSON on every rerun. Instead each
+# displayed image (original, mask, overlay, boxes ...) is built once per (source arrays, layer set)
+# into a pyramid of halved copies, and a view sends the coarsest level that still has about one
+# pixel per screen pixel for the visible region as a compressed image (binary_string): the whole
+# image goes as a small JPEG, full resolution PNG is only sent for zoomed in regions. Those can be
+# built from just the window (crop, e.g. a MaskStore.read_region) without touching the pyramid.
+# Axes stay in full resolution pixel coordinates whatever the level.
+#   APP_DISPLAY_MAX_SIDE    = most pixels sent along the longer side of a view (default 1024)
+#   APP_RENDER_CACHE_ITEMS  = pyramids / figures kept in memory (default 32)
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+from prediction_cache import file_signature, image_digest
+# -- ############################### -- #
+
+DISPLAY_MAX_SIDE = int(os.environ.get("APP_DISPLAY_MAX_SIDE", 1024))
+RENDER_CACHE_ITEMS = int(os.environ.get("APP_RENDER_CACHE_ITEMS", 32))
+PREVIEW_FORMAT = "jpg"  # -- downsampled levels: small, artefacts don't matter at that scale -- #
+DETAIL_FORMAT = "png"   # -- full resolution regions: exact pixels -- #
+
+
+def array_token(array:np.ndarray) -> str:
+    """Identifies an array's content: arrays memory-mapped from the session store by file, others by their pixels"""
+    filename = getattr(array, "filename", None)
+    if filename:
+        return f"{file_signature(filename)}|{array.shape}|{array.dtype}"
+    return image_digest(array)
+
+def build_pyramid(image:np.ndarray, max_side:int = DISPLAY_MAX_SIDE) -> list:
+    """[image, image / 2, image / 4 ...] down to the first level whose longer side fits in max_side"""
+    levels = [np.ascontiguousarray(image)]
+    while max(levels[-1].shape[:2]) > max_side:
+        height, width = levels[-1].shape[:2]
+        levels.append(cv2.resize(levels[-1], ((width + 1) // 2, (height + 1) // 2), interpolation=cv2.INTER_AREA))
+    return levels
+
+def pick_level(region:Tuple[int, int, int, int], levels:int, max_side:int = DISPLAY_MAX_SIDE) -> int:
+    """Coarsest pyramid level that shows region (x0, y0, x1, y1) with at least max_side pixels along its longer side"""
+    side = max(region[2] - region[0], region[3] - region[1])
+    level = 0
+    while level + 1 < levels and side / 2 ** (level + 1) >= max_side:
+        level += 1
+    return level
+
+
+class RenderCache:
+    """
+    NAME: RenderCache
+    DESC: In-memory LRU of pyramids (keyed by layer set + source array tokens) and of the figures made
+          from them (+ view region and height). build() is only called to make a missing pyramid.
+    """
+    def __init__(self, max_items:int = RENDER_CACHE_ITEMS, max_side:int = DISPLAY_MAX_SIDE):
+        self.max_items = max_items
+        self.max_side = max_side
+        self._pyramids = OrderedDict()
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, store:OrderedDict, key, make:Callable):
+        with self._lock:
+            if key in store:
+                store.move_to_end(key)
+                self.hits += 1
+                return store[key]
+            self.misses += 1
+        value = make()
+        with self._lock:
+            store[key] = value
+            while len(store) > self.max_items:
+                store.popitem(last=False)
+        return value
+
+    def image_key(self, layers:Sequence[str], sources:Sequence[np.ndarray]) -> tuple:
+        return tuple(layers), tuple(array_token(source) for source in sources)
+
+    def pyramid(self, layers:Sequence[str], sources:Sequence[np.ndarray], build:Optional[Callable] = None) -> list:
+        """Pyramid of build() (default: the only source as is) for this layer set"""
+        build = build or (lambda: sources[0])
+        return self._lookup(self._pyramids, self.image_key(layers, sources),
+                            lambda: build_pyramid(build(), self.max_side))
+
+    def image(self, layers:Sequence[str], sources:Sequence[np.ndarray], build:Optional[Callable] = None) -> np.ndarray:
+        """The full resolution image for this layer set (e.g. for downloads)"""
+        return self.pyramid(layers, sources, build)[0]
+
+    def png(self, layers:Sequence[str], sources:Sequence[np.ndarray], build:Optional[Callable] = None) -> bytes:
+        """The full resolution (RGB) image for this layer set encoded as PNG, for download buttons"""
+        def encode():
+            image = self.image(layers, sources, build)
+            ok, buffer = cv2.imencode(".png", cv2.cvtColor(image, cv2.COLOR_RGB2BGR) if image.ndim == 3 else image)
+            if not ok:
+                raise ValueError(f"Could not encode {layers} as png")
+            return buffer.tobytes()
+        return self._lookup(self._figures, ("png", self.image_key(layers, sources)), encode)
+
+    def figure(self, layers:Sequence[str], sources:Sequence[np.ndarray], build:Optional[Callable] = None,
+               region:Optional[Tuple[int, int, int, int]] = None, height:int = 800, crop:Optional[Callable] = None):
+        """
+        NAME: figure
+        DESC: Plotly figure of region (x0, y0, x1, y1 in full resolution pixels, default everything) of
+              the layer set, from the pyramid level that matches the display size. When the region is
+              small enough to be shown at full resolution and crop is given, crop(region) builds just
+              that window instead (the pyramid isn't built or read).
+        """
+        key = (self.image_key(layers, sources), region, height)
+        # -- level 0 with two levels means level 0 with any number of them -- #
+        if region and crop is not None and pick_level(region, 2, self.max_side) == 0:
+            return self._lookup(self._figures, key, lambda: self._imshow(crop(region), region[0], region[1], 1, height,
+                                                                         DETAIL_FORMAT))
+        return self._lookup(self._figures, key, lambda: self._make_figure(self.pyramid(layers, sources, build), region, height))
+
+    def _make_figure(self, levels:list, region, height:int):
+        full_height, full_width = levels[0].shape[:2]
+        x0, y0, x1, y1 = region or (0, 0, full_width, full_height)
+        level = pick_level((x0, y0, x1, y1), len(levels), self.max_side)
+        scale = 2 ** level
+        view = levels[level][y0 // scale:-(-y1 // scale), x0 // scale:-(-x1 // scale)]
+        return self._imshow(view, (x0 // scale) * scale, (y0 // scale) * scale, scale, height,
+                            DETAIL_FORMAT if level == 0 and region else PREVIEW_FORMAT)
+
+    def _imshow(self, view:np.ndarray, x0:int, y0:int, scale:int, height:int, binary_format:str):
+        import plotly.express as px
+        fig = px.imshow(view, height=height, aspect="equal", binary_string=True, binary_format=binary_format)
+        # -- place the (possibly downsampled) pixels at their full resolution coordinates -- #
+        fig.update_traces(x0=x0 + (scale - 1) / 2, dx=scale, y0=y0 + (scale - 1) / 2, dy=scale)
+        return fig
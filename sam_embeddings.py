@@ -0,0 +1,112 @@
+# -- [ SAM image embedding cache ] -- #
+# SamPredictor.set_image runs the ViT image encoder, by far the slowest part of the pipeline.
+# The encoder output only depends on the image (and the SAM weights), so it is kept here keyed by
+# image hash: re-prompting the same image with other boxes only costs the mask decoder.
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional
+import numpy as np
+import torch
+from prediction_cache import image_digest
+# -- ############################### -- #
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("SAM_EMBEDDING_CACHE_SIZE", 16))   # entries kept in memory (~4 MB each)
+EMBEDDING_SPILL_DIR = os.environ.get("SAM_EMBEDDING_SPILL_DIR", "./temp/sam_embeddings") # "" disables spilling to disk
+EMBEDDING_SPILL_SIZE = int(os.environ.get("SAM_EMBEDDING_SPILL_SIZE", 256)) # entries kept on disk
+
+
+class ImageEmbedding(NamedTuple):
+    features: torch.Tensor  # (1, 256, 64, 64) image encoder output, kept on the host
+    original_size: tuple
+    input_size: tuple
+
+
+class EmbeddingCache:
+    """
+    NAME: EmbeddingCache
+    DESC: LRU of SAM image embeddings in memory. Entries pushed out of memory are spilled to
+          spill_dir (if set) and loaded back from there on the next hit.
+    """
+    def __init__(self, max_entries:int = EMBEDDING_CACHE_SIZE, spill_dir:Optional[str] = EMBEDDING_SPILL_DIR,
+                 max_spilled:int = EMBEDDING_SPILL_SIZE):
+        self.max_entries = max_entries
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.max_spilled = max_spilled
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def _spill_path(self, key:str) -> Path:
+        return self.spill_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.pt"
+
+    def get(self, key:str) -> Optional[ImageEmbedding]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.spill_dir is not None:
+            path = self._spill_path(key)
+            if path.exists():
+                try:
+                    saved = torch.load(path, map_location="cpu")
+                except Exception: # -- truncated / corrupted spill file (unpickling raises all sorts), a miss -- #
+                    return None
+                embedding = ImageEmbedding(features=saved["features"], original_size=tuple(saved["original_size"]),
+                                           input_size=tuple(saved["input_size"]))
+                os.utime(path)
+                self.put(key, embedding)
+                return embedding
+        return None
+
+    def put(self, key:str, embedding:ImageEmbedding):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+        for old_key, old_embedding in evicted:
+            self._spill(old_key, old_embedding)
+
+    def _spill(self, key:str, embedding:ImageEmbedding):
+        if self.spill_dir is None:
+            return
+        path = self._spill_path(key)
+        if not path.exists():
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            torch.save(embedding._asdict(), tmp_path)
+            os.replace(tmp_path, path)
+        spilled = sorted(self.spill_dir.glob("*.pt"), key=lambda p: p.stat().st_mtime)
+        for old in spilled[:max(0, len(spilled) - self.max_spilled)]:
+            old.unlink(missing_ok=True)
+
+
+# -- process wide cache, shared by every session -- #
+SAM_EMBEDDINGS = EmbeddingCache()
+
+
+def set_image_cached(predictor, image:np.ndarray, cache:EmbeddingCache = SAM_EMBEDDINGS) -> bool:
+    """
+    NAME: set_image_cached
+    DESC: Drop in replacement for predictor.set_image(image) which reuses the image embedding when
+          this image has already been encoded by the same SAM weights.
+    OUTPUT: True when the embedding came from the cache
+    """
+    key = f"{getattr(predictor, 'model_key', 'sam')}|{image_digest(image)}"
+    embedding = cache.get(key)
+    if embedding is not None:
+        predictor.reset_image()
+        predictor.original_size = embedding.original_size
+        predictor.input_size = embedding.input_size
+        predictor.features = embedding.features.to(predictor.device)
+        predictor.is_image_set = True
+        return True
+    predictor.set_image(image)
+    cache.put(key, ImageEmbedding(features=predictor.features.detach().cpu(),
+                                  original_size=tuple(predictor.original_size),
+                                  input_size=tuple(predictor.input_size)))
+    return False
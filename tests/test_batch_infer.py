@@ -0,0 +1,16 @@
+import csv
+import batch_infer
+
+
+def test_record_progress_follows_existing_metrics_header(tmp_path):
+    (tmp_path / batch_infer.METRICS_FILE).write_text("image,tp,fp\r\nold.png,1,2\r\n")
+    batch_infer.record_progress(tmp_path, "new.png", {"image": "new.png", "tp": 5, "fn": 3, "fp": 4})
+    with open(tmp_path / batch_infer.METRICS_FILE, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert rows == [{"image": "old.png", "tp": "1", "fp": "2"}, {"image": "new.png", "tp": "5", "fp": "4"}]
+
+def test_record_progress_writes_header_once(tmp_path):
+    for name, tp in (("a.png", 1), ("b.png", 2)):
+        batch_infer.record_progress(tmp_path, name, {"image": name, "tp": tp})
+    assert (tmp_path / batch_infer.METRICS_FILE).read_text().splitlines() == ["image,tp", "a.png,1", "b.png,2"]
+    assert batch_infer.load_progress(tmp_path) == {"a.png", "b.png"}
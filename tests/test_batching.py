@@ -0,0 +1,52 @@
+import threading
+import pytest
+from batching import MicroBatcher
+
+
+def test_requests_with_the_same_key_run_as_one_batch():
+    calls = []
+    def run(key, items):
+        calls.append((key, list(items)))
+        return [f"{key}:{item}" for item in items]
+    batcher = MicroBatcher("test", run, window_ms=200, max_batch=8)
+    futures = [batcher.submit("a", i) for i in range(3)] + [batcher.submit("b", 9)]
+    assert [future.result(timeout=5) for future in futures] == ["a:0", "a:1", "a:2", "b:9"]
+    assert calls == [("a", [0, 1, 2]), ("b", [9])]
+    stats = batcher.stats()
+    assert stats["requests"] == 4 and stats["batches"] == 2 and stats["largest"] == 3
+
+def test_max_batch_splits_a_burst():
+    sizes = []
+    def run(key, items):
+        sizes.append(len(items))
+        return items
+    batcher = MicroBatcher("test", run, window_ms=200, max_batch=2)
+    futures = [batcher.submit("a", i) for i in range(5)]
+    assert [future.result(timeout=5) for future in futures] == list(range(5))
+    assert sizes == [2, 2, 1]
+
+def test_blocking_call_from_threads():
+    batcher = MicroBatcher("test", lambda key, items: [item * 2 for item in items], window_ms=50)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher("k", i))) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert results == {0: 0, 1: 2, 2: 4, 3: 6}
+
+def test_errors_fail_every_request_of_the_batch():
+    def run(key, items):
+        if key == "bad":
+            raise ValueError("boom")
+        return items[:-1] if key == "short" else items
+    batcher = MicroBatcher("test", run, window_ms=50)
+    bad = [batcher.submit("bad", i) for i in range(2)]
+    short = batcher.submit("short", 1)
+    for future in bad:
+        with pytest.raises(ValueError, match="boom"):
+            future.result(timeout=5)
+    with pytest.raises(RuntimeError, match="gave 0 results"):
+        short.result(timeout=5)
+    # -- the scheduler keeps going -- #
+    assert batcher("good", 3) == 3
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from box_ops import box_iou, nms
+
+
+def test_nms_drops_overlapping_lower_scores():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30], [0, 0, 10, 9]])
+    scores = np.array([0.8, 0.9, 0.5, 0.1])
+    assert nms(boxes, scores, iou_thr=0.5).tolist() == [1, 2]
+    # -- a threshold above every IoU keeps everything, highest score first -- #
+    assert nms(boxes, scores, iou_thr=0.99).tolist() == [1, 0, 2, 3]
+
+def test_nms_of_nothing():
+    keep = nms(np.zeros((0, 4), np.int32), np.zeros(0, np.float32))
+    assert keep.dtype == np.int64 and keep.size == 0
+
+def test_box_iou():
+    a = np.array([[0, 0, 10, 10]])
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+    np.testing.assert_allclose(box_iou(a, b), [[1.0, 50 / 150, 0.0]])
+    assert box_iou(b, a).shape == (3, 1)
+    assert box_iou(a, a)[0, 0] == pytest.approx(1.0)
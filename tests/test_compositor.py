@@ -0,0 +1,41 @@
+import numpy as np
+import compositor
+
+
+def test_palette_lut_cycles_and_marks_transparent_labels():
+    lut = compositor.palette_lut([[1, 2, 3], [4, 5, 6]], 5, transparent=(0, 3, 7))
+    assert lut.shape == (5, 4) and lut.dtype == np.uint8
+    assert lut[:, :3].tolist() == [[1, 2, 3], [4, 5, 6], [1, 2, 3], [4, 5, 6], [1, 2, 3]]
+    assert lut[:, 3].tolist() == [0, 255, 255, 0, 255]
+
+def test_colour_labels():
+    labels = np.array([[0, 1], [2, 1]], dtype=np.uint8)
+    rgb = compositor.colour_labels(labels, [[0, 0, 0], [255, 0, 0], [0, 255, 0]])
+    assert rgb.shape == (2, 2, 3)
+    assert rgb[0, 1].tolist() == [255, 0, 0] and rgb[1, 0].tolist() == [0, 255, 0]
+    # -- bool masks and label ids past the palette (instance ids) -- #
+    assert compositor.colour_labels(labels > 0, compositor.BINARY_PALETTE)[1, 1].tolist() == [255, 255, 255]
+    ids = np.array([[0, 300]], dtype=np.int32)
+    assert compositor.colour_labels(ids, compositor.INSTANCE_PALETTE)[0, 1].tolist() == compositor.INSTANCE_PALETTE[300 % 10]
+
+def test_colour_layer_background_is_transparent():
+    layer = compositor.colour_layer(np.array([[0, 1]], dtype=np.uint8), compositor.BINARY_PALETTE)
+    assert layer[..., 3].tolist() == [[0, 255]]
+
+def test_blend():
+    image = np.full((1, 2, 3), 100, dtype=np.uint8)
+    layer = np.zeros((1, 2, 4), dtype=np.uint8)
+    layer[0, 1] = [200, 200, 200, 255]
+    np.testing.assert_array_equal(compositor.blend(image, layer, 0.0), image)
+    assert compositor.blend(image, layer, 1.0)[0].tolist() == [[100] * 3, [200] * 3]
+    assert compositor.blend(image, layer, 0.5)[0, 1].tolist() == [150] * 3
+    # -- transparent pixels keep the image whatever the opacity -- #
+    assert compositor.blend(image, layer, 1.0)[0, 0].tolist() == [100] * 3
+
+def test_gt_pred_codes():
+    gt = np.array([[0, 0, 255, 255]], dtype=np.uint8)
+    pred = np.array([[0, 1, 0, 1]], dtype=np.uint8)
+    assert compositor.gt_pred_codes(gt, pred).tolist() == [[0, 1, 2, 3]]
+
+def test_background_labels():
+    assert compositor.background_labels(["Background", "nucleus", "bg"]) == [0, 2]
@@ -0,0 +1,37 @@
+# -- [ Exported (ONNX / TorchScript) vs native model parity ] -- #
+# The same check as python export_models.py --check, over a few MoNuSeg test tiles. Each case skips
+# unless the export (models/exported), the native weights and the packages both sides need are present.
+import importlib.util
+from pathlib import Path
+import pytest
+
+MODELS = {"unet": ["mmseg"], "deeplab": ["mmseg"], "mmyolo": ["mmdet", "mmyolo"]}
+BACKEND_MODULES = {"onnxruntime": ["onnxruntime"], "torchscript": []}
+ROOT = Path(__file__).resolve().parent.parent # -- model / export paths are relative to the repo root -- #
+IMAGES = [str(path) for path in sorted(ROOT.glob("images/MoNuSeg/test/*.png"))[:3]]
+
+
+def native_model_files(modelstr:str):
+    from utils_common import DETECTOR_MODEL, SEMANTIC_MODELS
+    models = {key: (config, checkpoint) for key, config, checkpoint in SEMANTIC_MODELS.values()}
+    models[DETECTOR_MODEL[0]] = DETECTOR_MODEL[1:]
+    return models[modelstr]
+
+@pytest.mark.parametrize("backend", list(BACKEND_MODULES))
+@pytest.mark.parametrize("modelstr", list(MODELS))
+def test_exported_model_matches_native(modelstr, backend, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    missing = [module for module in MODELS[modelstr] + BACKEND_MODULES[backend] + ["streamlit"]
+               if importlib.util.find_spec(module) is None]
+    if missing:
+        pytest.skip(f"needs {', '.join(missing)}")
+    export_models = pytest.importorskip("export_models")
+    import exported_backend
+    if not (exported_backend.artifact_path(modelstr, backend).exists() and exported_backend.meta_path(modelstr).exists()):
+        pytest.skip(f"no {backend} export of {modelstr} (python export_models.py --model {modelstr})")
+    missing = [str(path) for path in native_model_files(modelstr) if not path.exists()]
+    if missing:
+        pytest.skip(f"no native weights / config: {', '.join(missing)}")
+    if not IMAGES:
+        pytest.skip("no MoNuSeg test images")
+    assert export_models.check(modelstr, backend, IMAGES)
@@ -0,0 +1,55 @@
+# -- [ Import chains that must not pull in OpenMMLab ] -- #
+# Each check runs in a fresh interpreter with every mm* package blocked, so a top level
+# OpenMMLab import anywhere on the chain fails it.
+import importlib.util
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+import pytest
+# -- ############################### -- #
+
+ROOT = Path(__file__).resolve().parents[1]
+BLOCKER = """
+import importlib.abc
+import sys
+BLOCKED = ("mmcv", "mmdet", "mmengine", "mmseg", "mmyolo")
+class Blocker(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in BLOCKED:
+            raise ImportError(f"BLOCKED {name}")
+sys.meta_path.insert(0, Blocker())
+"""
+
+
+def run_blocked(code:str, env:dict = None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", BLOCKER + textwrap.dedent(code)], cwd=ROOT, env=env,
+                          capture_output=True, text=True, timeout=300)
+
+def require(*modules):
+    missing = [name for name in modules if importlib.util.find_spec(name) is None]
+    if missing:
+        pytest.skip(f"needs {', '.join(missing)}")
+
+
+def test_inference_imports_without_openmmlab(monkeypatch):
+    require("torch", "cv2", "pandas", "streamlit", "matplotlib", "segment_anything")
+    monkeypatch.setenv("APP_BACKEND", "onnxruntime")
+    result = run_blocked("""
+        import inference
+        import inference_server
+        import exported_backend
+        loaded = sorted(name for name in sys.modules if name.split(".")[0] in BLOCKED)
+        assert not loaded, loaded
+        print(exported_backend.model_backend("unet"))
+    """)
+    assert result.returncode == 0, result.stderr
+
+def test_exported_backend_imports_without_openmmlab():
+    require("cv2")
+    result = run_blocked("""
+        import exported_backend
+        import box_ops
+        assert not [name for name in sys.modules if name.split(".")[0] in BLOCKED]
+    """)
+    assert result.returncode == 0, result.stderr
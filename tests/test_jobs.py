@@ -0,0 +1,76 @@
+import threading
+import time
+import pytest
+import jobs
+from jobs import JobQueue
+
+
+def wait_finished(queue:JobQueue, job_id:str, timeout:float = 5):
+    end = time.time() + timeout
+    while queue.job(job_id).state not in jobs.FINISHED:
+        assert time.time() < end, queue.job(job_id).row()
+        time.sleep(0.01)
+    return queue.job(job_id)
+
+def test_job_result_and_progress():
+    queue = JobQueue(workers=1)
+    def work(x, bar, scale=1):
+        bar.progress(50, "half way")
+        return x * scale
+    job = wait_finished(queue, queue.submit("session", work, 3, scale=2))
+    assert (job.state, job.result, job.progress, job.message, job.name) == (jobs.DONE, 6, 100, "half way", "work")
+    queue.forget(job.job_id)
+    assert queue.job(job.job_id) is None
+
+def test_failed_job_keeps_the_worker():
+    queue = JobQueue(workers=1)
+    def fail(bar):
+        raise ValueError("bad input")
+    job = wait_finished(queue, queue.submit("session", fail))
+    assert job.state == jobs.FAILED and job.error == "ValueError: bad input"
+    assert wait_finished(queue, queue.submit("session", lambda bar: 1)).result == 1
+
+def test_cancel_queued_and_running_jobs():
+    queue = JobQueue(workers=1)
+    started, release = threading.Event(), threading.Event()
+    def long_job(bar):
+        started.set()
+        release.wait(5)
+        bar.check_cancelled()
+        return "not cancelled"
+    running = queue.submit("session", long_job)
+    assert started.wait(5)
+    queued = queue.submit("session", lambda bar: "ran")
+    assert queue.cancel(queued)
+    assert queue.job(queued).state == jobs.CANCELLED
+    assert queue.cancel(running)
+    release.set()
+    assert wait_finished(queue, running).state == jobs.CANCELLED
+    assert not queue.cancel(running)
+
+def test_sessions_are_served_round_robin():
+    queue = JobQueue(workers=1)
+    started, release = threading.Event(), threading.Event()
+    order = []
+    def blocker(bar):
+        started.set()
+        release.wait(5)
+    def record(tag, bar):
+        order.append(tag)
+    first = queue.submit("a", blocker)
+    assert started.wait(5)
+    ids = {tag: queue.submit(tag[0], record, tag) for tag in ("a2", "a3", "a4", "b1")}
+    assert [queue.position(ids[tag]) for tag in ("a2", "a3", "a4", "b1")] == [0, 2, 3, 1]
+    assert queue.position(first) == 0
+    release.set()
+    for job_id in ids.values():
+        wait_finished(queue, job_id)
+    assert order == ["a2", "b1", "a3", "a4"]
+
+def test_cancelled_job_stops_at_its_next_progress_update():
+    bar = jobs.JobProgress(jobs.Job("session", None, (), {}, "job"))
+    bar.progress(10)
+    bar._job.cancel_requested.set()
+    with pytest.raises(jobs.JobCancelled):
+        bar.progress(20)
+    assert bar._job.progress == 10
@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import prediction_cache
+from prediction_cache import PredictionCache, image_digest, prediction_key
+
+
+def test_image_digest_depends_on_pixels_shape_and_dtype():
+    image = np.zeros((4, 4), np.uint8)
+    assert image_digest(image) == image_digest(image.copy())
+    assert image_digest(image) != image_digest(image.reshape(2, 8))
+    assert image_digest(image) != image_digest(image.astype(np.uint16))
+    image[0, 0] = 1
+    assert image_digest(image) != image_digest(np.zeros((4, 4), np.uint8))
+
+def test_prediction_key(tmp_path):
+    image = np.zeros((4, 4, 3), np.uint8)
+    config, checkpoint = tmp_path / "config.py", tmp_path / "model.pth"
+    config.write_text("model = 1")
+    key = prediction_key(image, "unet", config, checkpoint, {"thr": 0.3})
+    assert key == prediction_key(image, "unet", config, checkpoint, {"thr": 0.3})
+    assert key != prediction_key(image, "unet", config, checkpoint, {"thr": 0.5})
+    assert key != prediction_key(image, "deeplab", config, checkpoint, {"thr": 0.3})
+    config.write_text("model = 2")
+    assert key != prediction_key(image, "unet", config, checkpoint, {"thr": 0.3})
+
+def test_put_get(tmp_path):
+    cache = PredictionCache(tmp_path, max_mb=10)
+    assert cache.get("key") is None
+    mask = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    cache.put("key", {"mask": mask}, {"iou": 0.5})
+    entry = cache.get("key")
+    np.testing.assert_array_equal(entry.arrays["mask"], mask)
+    assert entry.meta == {"iou": 0.5}
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["key.json", "key.npz"]
+
+def test_corrupted_entry_is_a_miss(tmp_path):
+    cache = PredictionCache(tmp_path, max_mb=10)
+    cache.put("key", {"mask": np.zeros(3)})
+    (tmp_path / "key.npz").write_bytes(b"not a zip")
+    assert cache.get("key") is None and cache.misses == 1
+
+def test_entry_evicted_after_it_was_read_is_still_returned(tmp_path, monkeypatch):
+    cache = PredictionCache(tmp_path, max_mb=10)
+    cache.put("key", {"mask": np.ones(3)}, {"a": 1})
+    def evicted(path):
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(prediction_cache.os, "utime", evicted)
+    assert cache.get("key").meta == {"a": 1}
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    rng = np.random.default_rng(0)
+    noise = {name: rng.integers(0, 255, 40_000, dtype=np.uint8) for name in "abc"}
+    cache = PredictionCache(tmp_path, max_mb=0.09)
+    cache.put("a", {"x": noise["a"]})
+    cache.put("b", {"x": noise["b"]})
+    # -- "a" is read last, so "b" is the oldest when "c" doesn't fit -- #
+    os.utime(tmp_path / "b.npz", (1, 1))
+    assert cache.get("a") is not None
+    cache.put("c", {"x": noise["c"]})
+    assert sorted(path.stem for path in tmp_path.glob("*.npz")) == ["a", "c"]
+    assert not (tmp_path / "b.json").exists()
@@ -0,0 +1,65 @@
+import numpy as np
+import torch
+from sam_embeddings import EmbeddingCache, ImageEmbedding, set_image_cached
+
+
+def embedding(value:float) -> ImageEmbedding:
+    return ImageEmbedding(features=torch.full((1, 2, 4, 4), value), original_size=(8, 8), input_size=(16, 16))
+
+def test_least_recently_used_entry_leaves_memory():
+    cache = EmbeddingCache(max_entries=2, spill_dir=None)
+    cache.put("a", embedding(1))
+    cache.put("b", embedding(2))
+    assert cache.get("a") is not None
+    cache.put("c", embedding(3))
+    assert cache.get("b") is None
+    assert cache.get("a").features[0, 0, 0, 0] == 1 and cache.get("c") is not None
+
+def test_evicted_entries_are_spilled_and_loaded_back(tmp_path):
+    cache = EmbeddingCache(max_entries=1, spill_dir=tmp_path, max_spilled=1)
+    cache.put("a", embedding(1))
+    cache.put("b", embedding(2))
+    assert len(list(tmp_path.glob("*.pt"))) == 1
+    loaded = cache.get("a")
+    torch.testing.assert_close(loaded.features, embedding(1).features)
+    assert loaded.original_size == (8, 8) and loaded.input_size == (16, 16)
+    # -- loading "a" pushed "b" out to disk, only max_spilled files are kept -- #
+    assert cache.get("b") is not None
+    assert len(list(tmp_path.glob("*.pt"))) == 1
+
+def test_unreadable_spill_file_is_a_miss(tmp_path):
+    cache = EmbeddingCache(max_entries=1, spill_dir=tmp_path)
+    cache.put("a", embedding(1))
+    cache.put("b", embedding(2))
+    next(tmp_path.glob("*.pt")).write_bytes(b"truncated")
+    assert cache.get("a") is None
+
+
+class Predictor:
+    """The parts of segment_anything's SamPredictor set_image_cached uses"""
+    device = "cpu"
+    model_key = "sam_test"
+
+    def __init__(self):
+        self.encoded = 0
+        self.reset_image()
+
+    def reset_image(self):
+        self.features = self.original_size = self.input_size = None
+        self.is_image_set = False
+
+    def set_image(self, image):
+        self.encoded += 1
+        self.features = torch.full((1, 2, 4, 4), float(image.mean()))
+        self.original_size, self.input_size = image.shape[:2], (16, 16)
+        self.is_image_set = True
+
+def test_set_image_cached_encodes_each_image_once():
+    cache = EmbeddingCache(max_entries=4, spill_dir=None)
+    predictor = Predictor()
+    image, other = np.full((8, 8, 3), 7, np.uint8), np.full((8, 8, 3), 9, np.uint8)
+    assert not set_image_cached(predictor, image, cache)
+    assert not set_image_cached(predictor, other, cache)
+    assert set_image_cached(predictor, image, cache)
+    assert predictor.encoded == 2 and predictor.is_image_set
+    assert predictor.features[0, 0, 0, 0] == 7 and predictor.original_size == (8, 8)
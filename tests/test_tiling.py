@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+tiling = pytest.importorskip("tiling") # -- imports utils, which needs the app's full environment -- #
+
+
+@pytest.mark.parametrize("height, width, tile, overlap", [(1000, 1000, 1000, 128), (2500, 1800, 1000, 128),
+                                                          (300, 700, 256, 32), (513, 257, 256, 0)])
+def test_tile_grid_covers_the_image(height, width, tile, overlap):
+    grid = tiling.tile_grid(height, width, tile, overlap)
+    covered = np.zeros((height, width), bool)
+    for x, y, w, h in grid:
+        assert 0 <= x and x + w <= width and 0 <= y and y + h <= height
+        assert (w, h) == (min(tile, width), min(tile, height))
+        covered[y:y + h, x:x + w] = True
+    assert covered.all()
+    # -- row-major, neighbours overlap by at least overlap pixels -- #
+    assert grid == sorted(grid, key=lambda window: (window[1], window[0]))
+    xs = sorted({x for x, _, _, _ in grid})
+    assert all(b - a <= tile - overlap for a, b in zip(xs, xs[1:]))
+
+def test_tile_grid_rejects_overlap_of_a_whole_tile():
+    with pytest.raises(AssertionError):
+        tiling.tile_grid(100, 100, tile=64, overlap=64)
+
+def test_blend_window():
+    weights = tiling.blend_window(6, 10, overlap=2)
+    assert weights.shape == (6, 10)
+    assert weights.min() > 0 and weights.max() == 1.0
+    np.testing.assert_allclose(weights[0, :3], [1 / 9, 2 / 9, 1 / 3])
+    np.testing.assert_allclose(weights, weights[::-1, ::-1])
+    assert (tiling.blend_window(4, 4, overlap=0) == 1).all()
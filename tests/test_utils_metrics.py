@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import utils_metrics as metrics
+
+
+@pytest.mark.parametrize("gt, pred", [
+    ([[0, 0, 1]], [[2, 0, 1]]),   # -- prediction above num_classes used to be counted as (1, 0) -- #
+    ([[0, 0, 2]], [[0, 0, 1]]),
+    ([[0, -1, 1]], [[0, 0, 1]]),
+    ([[0, 0, 1]], [[0, -1, 1]]),
+])
+def test_confusion_matrix_rejects_labels_out_of_range(gt, pred):
+    with pytest.raises(ValueError):
+        metrics.confusion_matrix(np.array(gt), np.array(pred), 2)
+
+def test_confusion_matrix_rejects_negative_labels_without_num_classes():
+    with pytest.raises(ValueError):
+        metrics.confusion_matrix(np.array([[0, -1, 1]]), np.array([[0, 0, 1]]))
+
+def test_confusion_matrix_counts_pixels():
+    gt = np.array([[0, 0, 1, 1], [2, 2, 1, 0]])
+    pred = np.array([[0, 1, 1, 1], [2, 0, 1, 0]])
+    assert metrics.confusion_matrix(gt, pred).tolist() == [[2, 1, 0], [0, 3, 0], [1, 0, 1]]
+    assert metrics.confusion_matrix(gt, pred, 4).shape == (4, 4)
+
+def test_confusion_matrix_trims_8_bit_masks():
+    gt = np.array([[0, 3]], dtype=np.uint8)
+    pred = np.array([[0, 1]], dtype=np.uint8)
+    assert metrics.confusion_matrix(gt, pred).tolist() == [[1, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 1, 0, 0]]
+    # -- bool masks count as 0 / 1 and always give at least a 2 x 2 matrix -- #
+    assert metrics.confusion_matrix(np.zeros((2, 2), bool), np.zeros((2, 2), bool)).tolist() == [[4, 0], [0, 0]]
+
+def test_confusion_matrix_rejects_shape_mismatch():
+    with pytest.raises(ValueError):
+        metrics.confusion_matrix(np.zeros((2, 2), np.uint8), np.zeros((2, 3), np.uint8))
+
+def test_class_scores():
+    matrix = metrics.counts_matrix(tp=6, fp=2, fn=4, tn=8)
+    scores = metrics.class_scores(matrix)
+    assert metrics.class_counts(matrix) == {"tp": 6, "fp": 2, "fn": 4, "tn": 8}
+    assert scores["accuracy"] == pytest.approx(14 / 20)
+    assert scores["precision"] == pytest.approx(6 / 8)
+    assert scores["recall"] == pytest.approx(6 / 10)
+    assert scores["f1"] == pytest.approx(2 * 0.75 * 0.6 / 1.35)
+    assert scores["iou"] == pytest.approx(6 / 12)
+    assert list(scores) == metrics.METRIC_NAMES
+
+def test_class_scores_of_absent_class_are_zero():
+    scores = metrics.class_scores(np.array([[5]]), class_idx=1)
+    assert scores == {"accuracy": 1.0, "precision": 0.0, "recall": 0.0, "f1": 0.0, "iou": 0.0}
+
+def test_per_class_scores():
+    scores = metrics.per_class_scores(np.array([[3, 1], [0, 4]]))
+    np.testing.assert_allclose(scores["precision"], [1.0, 0.8])
+    np.testing.assert_allclose(scores["recall"], [0.75, 1.0])
+    np.testing.assert_allclose(scores["iou"], [0.75, 0.8])
+    assert scores["pixel_accuracy"] == pytest.approx(7 / 8)
+    assert scores["mean_iou"] == pytest.approx(0.775)
+
+def test_running_confusion_matrix_matches_one_pass():
+    rng = np.random.default_rng(0)
+    gts = rng.integers(0, 3, (4, 16, 16))
+    preds = rng.integers(0, 3, (4, 16, 16))
+    running = metrics.ConfusionMatrix(num_classes=3)
+    for gt, pred in zip(gts, preds):
+        running.update(gt, pred)
+    assert running.images == 4
+    np.testing.assert_array_equal(running.matrix, metrics.confusion_matrix(gts, preds, 3))
+    assert running.scores(2) == metrics.class_scores(running.matrix, 2)
+
+def test_single_metrics_agree_with_class_scores():
+    gt = np.array([[0, 1, 1, 2], [1, 0, 2, 2]])
+    pred = np.array([[1, 1, 0, 2], [1, 0, 2, 1]])
+    scores = metrics.class_scores(metrics.confusion_matrix(gt == 2, pred == 2, 2))
+    assert metrics.precision(gt, pred, 2) == scores["precision"]
+    assert metrics.recall(gt, pred, 2) == scores["recall"]
+    assert metrics.accuracy(gt, pred, 2) == scores["accuracy"]
+    assert metrics.iou(gt, pred, 2) == scores["iou"]
+    assert metrics.f1(0.0, 0.0) == 0.0
@@ -0,0 +1,93 @@
+# -- [ Thumbnail cache for the image galleries ] -- #
+# Full resolution tiles are only ever shown a couple of hundred pixels high in the galleries, so
+# they are shrunk once to small JPEG previews kept on local disk, keyed by the file's path, size and
+# modification time (a changed file gets a new preview) plus the preview size / quality.
+# Least recently used previews are evicted once the cache grows past its size limit.
+#   THUMBNAIL_CACHE_DIR    = where previews are kept (default ./temp/thumbnails)
+#   THUMBNAIL_CACHE_MAX_MB = size limit (default 64)
+import base64
+import hashlib
+import os
+import threading
+import uuid
+from pathlib import Path
+import cv2
+from prediction_cache import file_signature
+# -- ############################### -- #
+
+THUMBNAIL_DIR = Path(os.environ.get("THUMBNAIL_CACHE_DIR", "./temp/thumbnails"))
+THUMBNAIL_MAX_MB = float(os.environ.get("THUMBNAIL_CACHE_MAX_MB", 64))
+THUMBNAIL_HEIGHT = 200
+THUMBNAIL_QUALITY = 80
+
+
+class ThumbnailCache:
+    """
+    NAME: ThumbnailCache
+    DESC: Size bounded LRU cache of JPEG previews on local disk, one <key>.jpg per (image, height,
+          quality). get() makes the preview on a miss, reads bump the file modification time and
+          eviction removes the oldest.
+    """
+    def __init__(self, root:Path = THUMBNAIL_DIR, max_mb:float = THUMBNAIL_MAX_MB):
+        self.root = Path(root)
+        self.max_bytes = int(max_mb * 1024**2)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, path, height:int, quality:int) -> str:
+        return hashlib.sha256(f"{file_signature(path)}|{height}|{quality}".encode()).hexdigest()
+
+    def get(self, path, height:int = THUMBNAIL_HEIGHT, quality:int = THUMBNAIL_QUALITY) -> bytes:
+        """JPEG bytes of the preview of the image at path, height pixels high"""
+        thumb_path = self.root / f"{self.key(path, height, quality)}.jpg"
+        try:
+            data = thumb_path.read_bytes()
+            os.utime(thumb_path)
+            self.hits += 1
+            return data
+        except FileNotFoundError:
+            self.misses += 1
+        data = make_thumbnail(path, height, quality)
+        # -- write to a temp name then rename so readers never see a partial preview -- #
+        tmp_path = self.root / f"{thumb_path.stem}.{uuid.uuid4().hex}.tmp"
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, thumb_path)
+        self.evict()
+        return data
+
+    def data_uri(self, path, height:int = THUMBNAIL_HEIGHT, quality:int = THUMBNAIL_QUALITY) -> str:
+        """The preview as a data: URI (what clickable_images takes)"""
+        return "data:image/jpeg;base64," + base64.b64encode(self.get(path, height, quality)).decode()
+
+    def evict(self):
+        """Removes least recently used previews until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for thumb_path in self.root.glob("*.jpg"):
+                try:
+                    stat = thumb_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, thumb_path))
+                total += stat.st_size
+            for _, size, thumb_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                thumb_path.unlink(missing_ok=True)
+                total -= size
+
+
+def make_thumbnail(path, height:int = THUMBNAIL_HEIGHT, quality:int = THUMBNAIL_QUALITY) -> bytes:
+    """JPEG bytes of the image at path shrunk to height pixels high (done once per image, then cached)"""
+    image = cv2.imread(str(path))
+    if image is None:
+        raise ValueError(f"Could not read image {path}")
+    width = max(1, round(image.shape[1] * height / image.shape[0]))
+    image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"Could not encode a preview of {path}")
+    return buffer.tobytes()
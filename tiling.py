@@ -0,0 +1,175 @@
+# -- [ Sliding-window (tiled) inference for images larger than the 1000 x 1000 MoNuSeg ROIs ] -- #
+# Tiles are read from disk one at a time and results are written into on-disk arrays, so the
+# whole slide never has to sit in memory and peak RAM stays at roughly one tile whatever its size.
+from pathlib import Path
+from typing import List, Tuple
+import cv2
+import numpy as np
+import torch
+import utils
+from box_ops import nms
+# -- ############################### -- #
+
+WSI_SUFFIXES = {".svs", ".ndpi", ".mrxs", ".scn"}
+TIFF_SUFFIXES = {".tif", ".tiff"}
+
+# -- [ Readers: read_region(x, y, w, h) -> BGR uint8 tile ] -- #
+class ArrayRegionReader:
+    """Reader over anything indexable as (H, W, 3) BGR, e.g. a memory-mapped .npy or a zarr array"""
+    def __init__(self, array):
+        self.array = array
+        self.shape = tuple(array.shape)
+
+    def read_region(self, x:int, y:int, w:int, h:int) -> np.ndarray:
+        return np.ascontiguousarray(self.array[y:y + h, x:x + w, :3])
+
+
+class OpenSlideRegionReader:
+    """Reader for whole slide formats (level 0) through openslide"""
+    def __init__(self, path):
+        import openslide
+        self.slide = openslide.OpenSlide(str(path))
+        width, height = self.slide.dimensions
+        self.shape = (height, width, 3)
+
+    def read_region(self, x:int, y:int, w:int, h:int) -> np.ndarray:
+        tile = np.asarray(self.slide.read_region((x, y), 0, (w, h)).convert("RGB"))
+        return cv2.cvtColor(tile, cv2.COLOR_RGB2BGR)
+
+
+def open_region_reader(path):
+    """
+    NAME: open_region_reader
+    DESC: Opens an image for tile by tile reading without decoding all of it.
+          .npy (H, W, 3 BGR) is memory mapped, tiffs go through tifffile's zarr store and whole
+          slide formats through openslide. Anything else (png/jpg) cannot be read partially,
+          so it is decoded once with cv2.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".npy":
+        return ArrayRegionReader(np.load(path, mmap_mode="r"))
+    if suffix in WSI_SUFFIXES:
+        return OpenSlideRegionReader(path)
+    if suffix in TIFF_SUFFIXES:
+        import tifffile
+        import zarr
+        store = tifffile.imread(str(path), aszarr=True)
+        rgb = zarr.open(store, mode="r")
+        if not hasattr(rgb, "shape"): # pyramidal tiff opens as a group, level 0 is the full resolution
+            rgb = rgb[0]
+        return ArrayRegionReader(_RGBToBGR(rgb))
+    image = cv2.imread(str(path))
+    assert image is not None, f"Image File not recognised: {path}"
+    return ArrayRegionReader(image)
+
+
+class _RGBToBGR:
+    """Swaps channels on read for RGB sources (tiff) so every reader hands back BGR like cv2"""
+    def __init__(self, array):
+        self.array = array
+        self.shape = tuple(array.shape)
+
+    def __getitem__(self, key):
+        return np.asarray(self.array[key])[..., ::-1]
+
+
+# -- [ Tile grid ] -- #
+def tile_grid(height:int, width:int, tile:int = 1000, overlap:int = 128) -> List[Tuple[int, int, int, int]]:
+    """
+    NAME: tile_grid
+    DESC: (x, y, w, h) windows covering the image, neighbours overlapping by overlap pixels.
+          The last row / column is shifted back so every tile stays inside the image.
+    """
+    assert 0 <= overlap < tile, "overlap has to be smaller than the tile size"
+    stride = tile - overlap
+    def starts(size):
+        if size <= tile:
+            return [0]
+        points = list(range(0, size - tile, stride))
+        return points + [size - tile]
+    return [(x, y, min(tile, width), min(tile, height)) for y in starts(height) for x in starts(width)]
+
+def blend_window(h:int, w:int, overlap:int) -> np.ndarray:
+    """Weights ramping up over overlap pixels from each tile edge, so overlapping tiles cross fade"""
+    def ramp(n):
+        idx = np.arange(n, dtype=np.float32)
+        return np.minimum(1.0, (np.minimum(idx, n - 1 - idx) + 1) / (overlap + 1))
+    return np.outer(ramp(h), ramp(w))
+
+
+# -- [ Semantic segmentation ] -- #
+def tiled_semantic_inference(model, reader, out_path, tile:int = 1000, overlap:int = 128) -> np.ndarray:
+    """
+    NAME: tiled_semantic_inference
+    DESC: Runs an mmseg model window by window and blends the class probabilities of overlapping
+          tiles. tile_grid is row-major, so probabilities are only accumulated for the current row
+          of tiles, in a float32 (C, tile, W) .npy memmap next to out_path. Once a row of tiles is
+          done, the rows no later tile reaches are arg-maxed (one tile wide block at a time) into
+          the uint8 mask memmap at out_path and the overlap is shifted up for the next row.
+    OUTPUT: the (H, W) uint8 mask, memory mapped from out_path
+    """
+    from mmseg.apis import inference_model
+    out_path = Path(out_path)
+    height, width = reader.shape[:2]
+    acc_path = out_path.with_name(out_path.stem + "_probs.npy")
+    mask = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.uint8, shape=(height, width))
+    grid = tile_grid(height, width, tile, overlap)
+    rows = sorted({y for _, y, _, _ in grid}) + [height]
+    acc, top = None, 0
+    for i, (x, y, w, h) in enumerate(grid):
+        result = inference_model(model, reader.read_region(x, y, w, h))
+        probs = torch.softmax(result.seg_logits.data.float(), dim=0).cpu().numpy()
+        if acc is None:
+            # -- sized from what the head outputs, the checkpoint's class list can be shorter -- #
+            acc = np.lib.format.open_memmap(acc_path, mode="w+", dtype=np.float32, shape=(probs.shape[0], h, width))
+        acc[:, :h, x:x + w] += probs * blend_window(h, w, overlap)
+        if i + 1 < len(grid) and grid[i + 1][1] == y:
+            continue
+        # -- row of tiles done: nothing below the next row's start changes any more -- #
+        next_top = rows[rows.index(y) + 1]
+        done, keep = next_top - top, top + h - next_top if next_top < height else 0
+        for col in range(0, width, tile):
+            block = slice(col, col + tile)
+            # -- the blend weights are the same for every class, so no need to normalise before argmax -- #
+            mask[top:next_top, block] = acc[:, :done, block].argmax(axis=0)
+            if keep > 0:
+                acc[:, :keep, block] = acc[:, done:done + keep, block]
+            acc[:, keep:, block] = 0
+        top = next_top
+    mask.flush()
+    del acc
+    acc_path.unlink()
+    return np.load(out_path, mmap_mode="r")
+
+
+# -- [ Object detection ] -- #
+def tiled_detection_inference(model, reader, tile:int = 1000, overlap:int = 128, score_thr:float = 0.0,
+                              iou_thr:float = 0.5, edge:int = 2) -> utils.Detections:
+    """
+    NAME: tiled_detection_inference
+    DESC: Runs the detector window by window, shifts the boxes to slide coordinates and stitches
+          them with cross-tile NMS. Boxes touching an inner tile edge (cut off nuclei) are dropped,
+          the neighbouring tile sees those nuclei whole as long as they are smaller than overlap.
+    """
+    height, width = reader.shape[:2]
+    boxes, scores, labels = [], [], []
+    for x, y, w, h in tile_grid(height, width, tile, overlap):
+        dets = utils.inference_detections(model=model, image=reader.read_region(x, y, w, h), score_thr=score_thr)
+        tile_boxes = dets.boxes
+        inner = np.ones(len(tile_boxes), dtype=bool)
+        if overlap > 0:
+            if x > 0:
+                inner &= tile_boxes[:, 0] > edge
+            if y > 0:
+                inner &= tile_boxes[:, 1] > edge
+            if x + w < width:
+                inner &= tile_boxes[:, 2] < w - 1 - edge
+            if y + h < height:
+                inner &= tile_boxes[:, 3] < h - 1 - edge
+        boxes.append(tile_boxes[inner] + np.array([x, y, x, y], dtype=np.int32))
+        scores.append(dets.scores[inner])
+        labels.append(dets.labels[inner])
+    boxes, scores, labels = np.concatenate(boxes), np.concatenate(scores), np.concatenate(labels)
+    keep = nms(boxes, scores, iou_thr)
+    return utils.Detections(boxes=boxes[keep], scores=scores[keep], labels=labels[keep])
@@ -1,28 +1,43 @@
 # -- [ MMDETECTION | MMYOLO  Dependencies ] -- #
-from pathlib import Path
-import pandas as pd
+# -- imported inside the native model functions, exported (onnxruntime / torchscript) models never need them -- #
 import torch
-from mmdet.apis import init_detector, inference_detector
-from mmdet.registry import VISUALIZERS
-from mmseg.structures import SegDataSample
 import argparse 
 import sys
 import numpy as np
 import gc
+import time
+from typing import TYPE_CHECKING, NamedTuple, Optional
 import matplotlib.pyplot as plt
-import cv2
 # -- [ SEGMENT ANYTHING MODEL ] -- #
 from segment_anything import sam_model_registry, SamPredictor
+from sam_embeddings import set_image_cached
+from devices import select_device
+import quantization
 # -- [ STREAMLIT TOOLS ] -- #
 import streamlit as st
-import glob
 import os
-# -- [ For metrics (semantic seg demo) -- ]
-import utils_metrics as metrics
-# -- [ FOR DOWNLOADING GDRIVE WEIGHTS ] -- #
-import gdown
+# -- [ Lightweight helpers, re-exported so utils.<name> keeps working ] -- #
+from utils_common import (show_box_cv, MODEL_STATS, resident_memory_mb, track_model_load, model_stats,
+                          SAM_MODELS, default_sam_model, Detections, InstanceTable, PipelineResult,
+                          load_images, load_images_test_datasets, binary_to_bgr, name_processer,
+                          mask_searcher, decode_image, read_mask, model_accuracy, gt_pred_overlay, models_url, model_dest, download_path)
+if TYPE_CHECKING:
+    from mmseg.structures import SegDataSample
 # -- ############################### -- #
 
+__all__ = [
+    # -- defined here -- #
+    "show_mask", "show_box_plt", "get_images_old", "mmseg_init", "mmyolo_init", "sam_checkpoint_path", "sam_init",
+    "inference_detections", "detections_from_result", "SAM_MEMORY_BUDGET_MB", "available_memory_mb",
+    "sam_prompt_memory_mb", "sam_batch_size", "input_boxes_sam", "SamBatch", "stream_masks_sam",
+    "stream_prompts_sam", "instance_masks_sam", "numpy_from_result",
+    # -- re-exported from utils_common -- #
+    "show_box_cv", "MODEL_STATS", "resident_memory_mb", "track_model_load", "model_stats", "SAM_MODELS",
+    "default_sam_model", "Detections", "InstanceTable", "PipelineResult", "load_images",
+    "load_images_test_datasets", "binary_to_bgr", "name_processer", "mask_searcher", "decode_image", "read_mask",
+    "model_accuracy", "gt_pred_overlay", "models_url", "model_dest", "download_path",
+]
+
 # -- [ Show Mask Function ] -- #
 
 def show_mask(mask, ax, random_color=False):
@@ -52,104 +67,267 @@ def show_box_plt(box, ax):
     w, h = box[2] - box[0], box[3] - box[1]
     ax.add_patch(plt.Rectangle((x0, y0), w, h, edgecolor='green', facecolor=(0,0,0,0), lw=1))    
 
-def show_box_cv(box_s, img):
-    for box in box_s:
-        x1, y1 = box[0], box[1]
-        x2, y2 = box[2], box[3]
-        cv2.rectangle(img, (x1,y1), (x2,y2), color=(255,0,0), thickness=1)
-    return img
-
 # -- [ Get images function ] -- #
 def get_images_old(args: argparse.Namespace):
     images = args.dataset_root / args.dataset / args.set
     return sorted(images.glob("*.png"))
 
 
+# -- [ MMSEG INIT (U-Net, DeepLabv3+) ] -- #
+@st.cache_resource
+def mmseg_init(config, pathfile, device=None, quantize:bool=False):
+    from mmengine import Config
+    from mmseg.apis import init_model, inference_model
+    device = select_device(device)
+    print("[*] Loading config file...")
+    print("[*] Building model..")
+    with track_model_load("mmseg-int8" if quantize else "mmseg", config, pathfile, device):
+        cfg = Config.fromfile(config)
+        model = init_model(cfg, str(pathfile), device)
+        if quantize:
+            quantization.quantize_static_submodules(model, lambda img: inference_model(model, img),
+                                                    quantization.calibration_images())
+    return model
+
 # -- [ YOLO INIT ] -- #
 @st.cache_resource
-def mmyolo_init(config, pathfile):
+def mmyolo_init(config, pathfile, device=None, quantize:bool=False):
+    from mmdet.apis import init_detector, inference_detector
+    from mmdet.registry import VISUALIZERS
+    device = select_device(device)
     print("[*] Loading path file...")
     print("[*] Loading config file...")
     print("[*] Building model..")
-    model = init_detector(str(config), str(pathfile), device='cuda:0')
+    with track_model_load("mmyolo-int8" if quantize else "mmyolo", config, pathfile, device):
+        model = init_detector(str(config), str(pathfile), device=device)
+        if quantize:
+            quantization.quantize_static_submodules(model, lambda img: inference_detector(model, img),
+                                                    quantization.calibration_images())
     print("[*] Initialising Visualiser..")
     visualizer = VISUALIZERS.build(model.cfg.visualizer)
     visualizer.dataset_meta = model.dataset_meta
     return model
 
 # -- [SAM INIT ] -- #
+def sam_checkpoint_path(model_type:str) -> str:
+    """Checkpoint of the SAM backbone, downloaded from the official release if it is not on disk yet"""
+    sam_checkpoint, url = SAM_MODELS[model_type]
+    if not os.path.isfile(sam_checkpoint):
+        print(f"[*] Downloading SAM {model_type} weights")
+        os.makedirs(os.path.dirname(sam_checkpoint), exist_ok=True)
+        torch.hub.download_url_to_file(url, sam_checkpoint)
+    return sam_checkpoint
+
 @st.cache_resource
-def sam_init():
+def sam_init(model_type:Optional[str] = None, device=None, quantize:bool=False):
     sys.path.append("..")
-    sam_checkpoint = "models/sam/sam_vit_h_4b8939.pth"
-    model_type = "vit_h"
-    device = "cuda"
-    sam = sam_model_registry[model_type](checkpoint=sam_checkpoint)
-    sam.to(device=device)
+    device = select_device(device)
+    model_type = model_type or default_sam_model(device)
+    sam_checkpoint = sam_checkpoint_path(model_type)
+    with track_model_load("sam_" + model_type + ("-int8" if quantize else ""), model_type, sam_checkpoint, device):
+        sam = sam_model_registry[model_type](checkpoint=sam_checkpoint)
+        sam.to(device=device)
+        if quantize:
+            sam.eval()
+            quantization.quantize_dynamic_linear(sam)
     predictor = SamPredictor(sam)
+    # -- identifies the weights for the embedding cache -- #
+    predictor.model_key = f"{model_type}|{sam_checkpoint}" + ("|int8" if quantize else "")
     return predictor
 
 
-def inference_detections(model, image):
-    #print("[*] Generating result for image: " + image.name)
-    result = inference_detector(model, image)
-    nuclei_list = []
-    for xx in range(1000):
-        X1 = int(result.pred_instances.bboxes[xx][0])
-        Y1 = int(result.pred_instances.bboxes[xx][1])
-        X2 = int(result.pred_instances.bboxes[xx][2])
-        Y2 = int(result.pred_instances.bboxes[xx][3])
+def inference_detections(model, image, score_thr: float = 0.0, topk: Optional[int] = None) -> Detections:
+    """
+    NAME: inference_detections
+    DESC: Runs the detector on an image and moves all boxes, scores and labels to the host in one transfer.
+    ARGS:
+    -------
+    model: mmdet/mmyolo detector (from mmyolo_init)
+    image: path or image array accepted by inference_detector
+    score_thr (float): drop boxes scoring below this
+    topk (int, optional): keep at most this many of the highest scoring boxes
+    """
+    from mmdet.apis import inference_detector
+    return detections_from_result(inference_detector(model, image), score_thr=score_thr, topk=topk)
+
+def detections_from_result(result, score_thr: float = 0.0, topk: Optional[int] = None) -> Detections:
+    """Detections of one DetDataSample (score_thr / topk as in inference_detections)"""
+    instances = result.pred_instances
+    scores = instances.scores
+    keep = scores >= score_thr
+    bboxes, scores, labels = instances.bboxes[keep], scores[keep], instances.labels[keep]
+    if topk is not None and scores.numel() > topk:
+        scores, order = scores.topk(topk)
+        bboxes, labels = bboxes[order], labels[order]
+    # -- [ pack everything into one tensor so there is a single device -> host copy ] -- #
+    packed = torch.cat([bboxes, scores[:, None], labels[:, None].to(bboxes.dtype)], dim=1).cpu().numpy()
+    return Detections(boxes=packed[:, :4].astype(np.int32),
+                      scores=packed[:, 4].astype(np.float32),
+                      labels=packed[:, 5].astype(np.int64))
+
+# -- [ SAM PROMPT BATCHING ] -- #
+# Budget (MB) for one batch of SAM prompts, 0 / unset means "use half of what is free on the device"
+SAM_MEMORY_BUDGET_MB = float(os.environ.get("SAM_MEMORY_BUDGET_MB", 0))
+
+def available_memory_mb(device) -> float:
+    """
+    NAME: available_memory_mb
+    DESC: Free memory (MB) on the given device, GPU memory for cuda devices and available RAM otherwise
+    """
+    if str(device).startswith("cuda") and torch.cuda.is_available():
+        free, _ = torch.cuda.mem_get_info(torch.device(device))
+        return free / 1024**2
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 1024**2
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 4096.0 # cannot tell, assume a small machine
+
+def sam_prompt_memory_mb(image_shape) -> float:
+    """
+    NAME: sam_prompt_memory_mb
+    DESC: Rough peak memory (MB) one box prompt costs inside SamPredictor.predict_torch.
+          The mask decoder repeats the 256x64x64 image embedding per prompt, upscales to 32x256x256
+          features, then the logits are resized to 1024x1024 and to the original image (float32)
+          before being thresholded into a bool mask.
+    """
+    h, w = image_shape[:2]
+    per_prompt = (256 * 64 * 64 * 4) * 2 + 32 * 256 * 256 * 4 + 1024 * 1024 * 4 + h * w * 4 + h * w
+    return per_prompt / 1024**2
 
-        nuclei_list.append([X1,Y1,X2,Y2])
-    return nuclei_list
+def sam_batch_size(image_shape, device, memory_budget_mb: float = 0, max_batch: int = 1024) -> int:
+    """
+    NAME: sam_batch_size
+    DESC: Largest number of box prompts per predict_torch call that fits in the memory budget
+    ARGS:
+    -------
+    image_shape: shape of the image given to SAM
+    device: device SAM runs on
+    memory_budget_mb (float): MB allowed per batch, 0 uses SAM_MEMORY_BUDGET_MB or half of the free memory
+    max_batch (int): upper limit on the batch size
+    """
+    budget = memory_budget_mb or SAM_MEMORY_BUDGET_MB or 0.5 * available_memory_mb(device)
+    return int(max(1, min(max_batch, budget // sam_prompt_memory_mb(image_shape))))
 
-@st.cache_data
-def input_boxes_sam(nuclei_list):
-    inputs_boxes = [nuclei_list[0:199],nuclei_list[200:399],nuclei_list[400:599],nuclei_list[600:799],nuclei_list[800:999]]
+def input_boxes_sam(boxes: np.ndarray, batch_size: int = 200):
+    """
+    NAME: input_boxes_sam
+    DESC: Splits the (N, 4) detection boxes into consecutive batches of prompts for SAM (every box is kept)
+    """
+    inputs_boxes = [boxes[i:i + batch_size] for i in range(0, len(boxes), batch_size)]
     return inputs_boxes
 
 
-def prediction_masks_sam(image, predictor, inputs_boxes):
-    masks_list = []
-    predictor.set_image(image)
+class SamBatch(NamedTuple):
+    """Output of one predict_torch call"""
+    masks: torch.Tensor            # (B, 1, H, W) bool, on the predictor device
+    iou_predictions: torch.Tensor  # (B, 1)
+    seconds: float
+
+
+def stream_masks_sam(image, predictor, inputs_boxes):
+    """
+    NAME: stream_masks_sam
+    DESC: Generator which embeds the image once and then pushes each batch of boxes through
+          SamPredictor.predict_torch, yielding a SamBatch (with its timing) as soon as it is done.
+          The image embedding is reused from sam_embeddings when this image was encoded before.
+    """
+    start = time.perf_counter()
+    reused = set_image_cached(predictor, image)
+    print(f"[**] SAM image embedding {'reused' if reused else 'computed'} in {time.perf_counter() - start:.2f}s")
+    yield from stream_prompts_sam(image.shape, predictor, inputs_boxes)
+
+
+def stream_prompts_sam(image_shape, predictor, inputs_boxes):
+    """
+    NAME: stream_prompts_sam
+    DESC: Mask decoder only part of stream_masks_sam, for a predictor which already has the image set
+    """
     for section in inputs_boxes:
-        input_box = np.array(section)
-        input_box = torch.tensor(input_box, device=predictor.device)
-        transformed_boxes = predictor.transform.apply_boxes_torch(input_box, image.shape[:2])
-        masks, _, _ = predictor.predict_torch(
+        start = time.perf_counter()
+        input_box = torch.as_tensor(section, device=predictor.device)
+        transformed_boxes = predictor.transform.apply_boxes_torch(input_box, image_shape[:2])
+        masks, iou_predictions, _ = predictor.predict_torch(
                 point_coords=None,
                 point_labels=None,
                 boxes=transformed_boxes,
                 multimask_output=False,
             )
-        masks_list.append(masks)
-    return masks_list
+        if predictor.device.type == "cuda":
+            torch.cuda.synchronize(predictor.device)
+        yield SamBatch(masks=masks, iou_predictions=iou_predictions, seconds=time.perf_counter() - start)
 
 
-def masks_array_sam(masks_list):
-    masked_out_list = []
-    for masks in masks_list:
-        #print("[**] Plotting batch masks | batch: " + str(ii))
-        sub_mask_list = []
-        for mask in masks:
-            #show_mask(mask.cpu().numpy(), plt.gca())
-            color = np.array([30/255, 144/255, 255/255, 0.6])
-            h, w = mask.cpu().numpy().shape[-2:]
-            mask_image = mask.cpu().numpy().reshape(h, w, 1) * color.reshape(1, 1, -1)
-            sub_mask_list.append(mask_image)
-        #print("[**] saving batch of masks | batch: " + str(ii))
-        batched_mask = sub_mask_list[0]
-        for iii in range(len(sub_mask_list)):
-            batched_mask = cv2.bitwise_or(batched_mask, sub_mask_list[iii])
-        masked_out_list.append(batched_mask)
-    
-    batched_mask = masked_out_list[0]
-    for ii in range(len(masked_out_list)):
-        batched_mask = cv2.bitwise_or(batched_mask, masked_out_list[ii])
-    
-    return batched_mask
-
-def numpy_from_result(result: SegDataSample, squeeze: bool = True, as_uint: bool = True) -> np.ndarray:
+def instance_masks_sam(sam_batches, image_shape, timings: Optional[list] = None):
+    """
+    NAME: instance_masks_sam
+    DESC: Builds an instance ID map and an InstanceTable from SAM output in one vectorised pass over
+          each batch of masks, on the device the masks are on. Batches are consumed as they arrive so
+          stream_masks_sam can be passed straight in without holding every mask in memory.
+          Where masks overlap, the earlier instance keeps the pixel.
+    ARGS:
+    -------
+    sam_batches: iterable of SamBatch
+    image_shape: shape of the image given to SAM
+    timings (list, optional): per batch SAM timings are appended to it
+    OUTPUT: (H, W) uint16 instance map (uint32 past 65535 instances, 0 = background), InstanceTable
+    """
+    h, w = image_shape[:2]
+    label_map = None
+    stats = []
+    offset = 0
+    for batch in sam_batches:
+        if timings is not None:
+            timings.append(batch.seconds)
+        masks = batch.masks[:, 0]
+        if len(masks) == 0:
+            continue
+        device = masks.device
+        if label_map is None:
+            label_map = torch.zeros((h, w), dtype=torch.int32, device=device)
+        # -- [ Row/column projections give area, centroid and bbox without touching the masks again ] -- #
+        row_counts = masks.sum(dim=2)
+        col_counts = masks.sum(dim=1)
+        areas = row_counts.sum(dim=1)
+        ys = torch.arange(h, device=device, dtype=torch.float32)
+        xs = torch.arange(w, device=device, dtype=torch.float32)
+        cy = (row_counts.float() @ ys) / areas.clamp(min=1)
+        cx = (col_counts.float() @ xs) / areas.clamp(min=1)
+        rows, cols = row_counts > 0, col_counts > 0
+        y1 = rows.byte().argmax(dim=1)
+        y2 = (h - 1) - rows.flip(1).byte().argmax(dim=1)
+        x1 = cols.byte().argmax(dim=1)
+        x2 = (w - 1) - cols.flip(1).byte().argmax(dim=1)
+        bboxes = torch.stack([x1, y1, x2, y2], dim=1) * (areas > 0)[:, None]
+        stats.append(torch.cat([bboxes.float(), areas[:, None].float(), cx[:, None], cy[:, None],
+                                batch.iou_predictions.reshape(-1, 1).float()], dim=1))
+        # -- [ Instance IDs: first mask of the batch covering a pixel, unless an earlier batch has it ] -- #
+        ids = masks.view(torch.uint8).argmax(dim=0).to(torch.int32) + (offset + 1)
+        free = masks.any(dim=0) & (label_map == 0)
+        label_map = torch.where(free, ids, label_map)
+        offset += len(masks)
+
+    if label_map is None:
+        return np.zeros((h, w), dtype=np.uint16), InstanceTable(
+            bboxes=np.zeros((0, 4), dtype=np.int32), areas=np.zeros(0, dtype=np.int64),
+            centroids=np.zeros((0, 2), dtype=np.float32), scores=np.zeros(0, dtype=np.float32))
+    stats = torch.cat(stats).cpu().numpy()
+    label_dtype = np.uint16 if offset <= np.iinfo(np.uint16).max else np.uint32
+    table = InstanceTable(bboxes=stats[:, 0:4].astype(np.int32),
+                          areas=stats[:, 4].astype(np.int64),
+                          centroids=stats[:, 5:7].astype(np.float32),
+                          scores=stats[:, 7].astype(np.float32))
+    return label_map.cpu().numpy().astype(label_dtype), table
+
+def numpy_from_result(result: "SegDataSample", squeeze: bool = True, as_uint: bool = True) -> np.ndarray:
     """Converts an mmsegmentation inference result into a numpy array (for exporting and visualisation)
 
     Parameters
@@ -172,137 +350,3 @@ def numpy_from_result(result: SegDataSample, squeeze: bool = True, as_uint: bool
     if as_uint:
         array = array.astype(np.uint8)
     return array
-
-# -- [ Adding more util functions from dataset_selector ] -- #
-@st.cache_data
-def load_images():
-    image_files = glob.glob("images/MoNuSeg/*/*.png")
-    images_subset = []
-    for image_file in image_files:
-        image_file = image_file.replace("\\", "/")
-        image_subset = image_file.split("/")
-        if image_subset[2] not in images_subset:
-            images_subset.append(image_subset[2])
-
-    images_subset.sort()
-    return image_files, images_subset
-
-@st.cache_data
-def load_images_test_datasets():
-    image_files = glob.glob("images/*/test/*.png")
-    images_subset = []
-    for image_file in image_files:
-        image_file = image_file.replace("\\", "/")
-        image_subset = image_file.split("/")
-        # will select dataset name from list of images
-        if image_subset[1] not in images_subset:
-            images_subset.append(image_subset[1])
-    images_subset.sort()
-    return image_files, images_subset
-
-
-def binary_to_bgr(img: np.ndarray) -> np.ndarray:
-    """binary_to_bgr
-    DESCRIPTION: Function which takes in binary image (GT mask or prediction mask) and 
-    creates a BGR image of it. This image can be seen and used for displaying.
-    ARGS:
-    -------
-    img (np.ndarray): binary image to convert to BGR
-    """
-    _,pred_mask = cv2.threshold(img,0,255,cv2.THRESH_BINARY)
-    pred_mask_3d = np.zeros((np.array(pred_mask).shape[0], np.array(pred_mask).shape[1],3),dtype="uint8")   
-    pred_mask_3d[:,:,0] = pred_mask
-    pred_mask_3d[:,:,1] = pred_mask
-    pred_mask_3d[:,:,2] = pred_mask
-    return pred_mask_3d
-
-def name_processer(img:str):
-    imagepre = img.split(sep="/")
-    name = imagepre[3]
-    return name
-
-def mask_searcher(name:str):
-    mask_file = f"images/MoNuSeg/masks/test/{name}"
-    file = None
-    if os.path.isfile(mask_file):
-        file = mask_file
-    else:
-        file = None
-    return file
-
-
-@st.cache_data
-def model_accuracy(ground: Path, prediction: Path, class_idx=1) -> pd.DataFrame:
-    """
-    NAME: model_accuracy
-    DESC: Function which gives the metrics for a particular image from prediction and GT
-    """
-    results = {}
-    results["name"] = ground.stem
-    # need to read in the data
-    gt = cv2.imread(str(ground),cv2.IMREAD_GRAYSCALE)
-    pred = cv2.imread(str(prediction),cv2.IMREAD_GRAYSCALE)
-
-    results["accuracy"] = str(metrics.accuracy(gt, pred))
-    results["precision"] = str(metrics.precision(gt, pred))
-    results["recall"] = str(metrics.recall(gt, pred))
-    results["f1"] = str(metrics.f1(metrics.precision(gt, pred), metrics.recall(gt, pred)))
-    results["iou"] = str(metrics.iou(gt, pred))
-    df = pd.DataFrame.from_dict(results, orient='index',)
-    return df
-
-
-@st.cache_data
-def gt_pred_overlay(ground: Path, prediction: Path):
-    """
-    NAME: gt_pred_overlay
-    DESC: Function which gives a colourful image of how close prediction mask was to the ground truth
-    """
-    gt = cv2.imread(str(ground), cv2.IMREAD_GRAYSCALE)
-    pred = cv2.imread(str(prediction), cv2.IMREAD_GRAYSCALE)
-    gt_mask_3d = binary_to_bgr(img=gt)
-    pred_mask_3d = binary_to_bgr(img=pred)
-    # -- [ adding colour to binary images ] -- #
-    green = [0, 255, 0]
-    blue =  [0, 0, 255]
-    yel =   [255, 255, 0]
-    red =   [255, 0, 0] 
-    white = [255, 255, 255]
-    # -- [ Colouring all white pixels to another colour] -- #
-    pred_mask_3d[np.where((pred_mask_3d==[255,255,255]).all(axis=2))] = red # Prediction mask
-    gt_mask_3d[np.where((gt_mask_3d==[255,255,255]).all(axis=2))] = blue    # Ground truth mask
-    # -- [ Converting all image masks made above to RGB ] -- #
-    pred_mask_3d = cv2.cvtColor(pred_mask_3d, cv2.COLOR_BGR2RGB)
-    gt_mask_3d = cv2.cvtColor(gt_mask_3d, cv2.COLOR_BGR2RGB)
-    # -- [ Perform the subtraction ] -- #
-    overlap = cv2.bitwise_xor(gt_mask_3d,pred_mask_3d)
-    return overlap
-
-# -- [ GOOGLE DRIVE LINKS FOR MY WEIGHTS ] -- #
-def models_url(model:str):
-    '''
-    NAME: models_url
-    DESC: takes in type of model (deeplab, unet) and ouputs part of gdrive link
-    '''
-    urls = {
-        "deeplab":"https://drive.google.com/file/d/1Mo7_mY2S5_ojv9IQAO8eVTrwZfmJnYg9/view?usp=sharing",
-        "unet":"https://drive.google.com/file/d/1Y26DUPsp-SmLx5VQ17qQUIn_qqvYJtGS/view?usp=sharing",
-        "mmyolo":"https://drive.google.com/file/d/10dbZCqCNWOvAEFMYLvq1lajeJKCysSol/view?usp=sharing",
-        #"yolo":"",
-    }
-    return urls.get(model)
-
-def model_dest(model:str):
-    dirfull = {
-        "deeplab":"models/semantic/deeplab/deeplab_test/iter_20000.pth",
-        "unet":"models/semantic/unet/unet_test/iter_20000.pth", # 224.6MB
-        "mmyolo":"models/objdetection/mmyolo/mmyolov8/epoch_800.pth",
-        #"yolo":"",
-    }
-    return dirfull.get(model)
-
-# -- [ USING gdown module for downloading from gdrive url ]
-def download_path(modelstr:str):
-    url_coding = models_url(model=modelstr)
-    output = model_dest(model=modelstr)
-    gdown.download(url=url_coding, output=output, quiet=False, fuzzy=True)
\ No newline at end of file
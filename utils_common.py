@@ -0,0 +1,314 @@
+# -- [ Lightweight helpers (no torch / OpenMMLab / SAM) ] -- #
+# Everything here only needs numpy, OpenCV, pandas and streamlit, so the pages and the start of
+# home.py can use it without paying for the deep learning imports. utils.py re-exports all of it.
+import glob
+import importlib
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, NamedTuple
+import cv2
+import numpy as np
+import pandas as pd
+import streamlit as st
+# -- [ For metrics (semantic seg demo) -- ]
+import utils_metrics as metrics
+import compositor
+from devices import select_device
+# -- ############################### -- #
+
+
+class LazyModule:
+    """
+    NAME: LazyModule
+    DESC: Stands in for a module and only imports it on first attribute access, e.g.
+          inference = LazyModule("inference") keeps torch / OpenMMLab out of a page until a model runs
+    """
+    def __init__(self, name:str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+# -- [ Show Box Function ] -- #
+def show_box_cv(box_s: np.ndarray, img):
+    """
+    INPUT: box_s: (N, 4) int array of x1,y1,x2,y2 boxes (Detections.boxes), img: image to draw on
+    OUTPUT: img with the boxes drawn
+    """
+    for x1, y1, x2, y2 in np.asarray(box_s).tolist():
+        cv2.rectangle(img, (x1,y1), (x2,y2), color=(255,0,0), thickness=1)
+    return img
+
+
+# -- [ MODEL REGISTRY STATS ] -- #
+# Models are held process-wide by @st.cache_resource (keyed by config, checkpoint and device),
+# this dict just records how expensive each one was to load so it can be shown in the app.
+MODEL_STATS = {}
+
+def resident_memory_mb() -> float:
+    """
+    NAME: resident_memory_mb
+    DESC: Resident set size of this process in MB (0.0 if it cannot be read on this platform)
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024**2
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+def _device_memory_mb(device) -> float:
+    if not str(device).startswith("cuda"):
+        return 0.0
+    import torch # -- only reached while loading a model, torch is already imported by then -- #
+    if torch.cuda.is_available():
+        return torch.cuda.memory_allocated(torch.device(device)) / 1024**2
+    return 0.0
+
+@contextmanager
+def track_model_load(name:str, config, pathfile, device):
+    """
+    NAME: track_model_load
+    DESC: Context manager which times a model load and records the load time and memory it added
+          (host RSS and device memory) into MODEL_STATS
+    """
+    rss_before = resident_memory_mb()
+    device_before = _device_memory_mb(device)
+    start = time.perf_counter()
+    yield
+    load_time = time.perf_counter() - start
+    stats = {
+        "model": name,
+        "config": str(config),
+        "checkpoint": str(pathfile),
+        "device": str(device),
+        "load_time_s": round(load_time, 2),
+        "rss_mb": round(resident_memory_mb() - rss_before, 1),
+        "device_mb": round(_device_memory_mb(device) - device_before, 1),
+    }
+    MODEL_STATS[(name, str(config), str(pathfile), str(device))] = stats
+    print(f"[*] Loaded {name} on {device} in {stats['load_time_s']}s (+{stats['rss_mb']} MB RSS, +{stats['device_mb']} MB device)")
+
+def model_stats() -> pd.DataFrame:
+    """
+    NAME: model_stats
+    DESC: Table of every model loaded in this process with its load time and resident memory
+    """
+    return pd.DataFrame(list(MODEL_STATS.values()))
+
+
+# -- [ Model name -> (gdrive key, config, checkpoint) ] -- #
+# -- here rather than in inference.py so the UI can use them without importing torch / OpenMMLab -- #
+SEMANTIC_MODELS = {
+    "U-Net": ("unet",
+              Path("./models/semantic/unet/unet_test/unet.py"),
+              Path("./models/semantic/unet/unet_test/iter_20000.pth")),
+    "Deeplabv3+": ("deeplab",
+                   Path("./models/semantic/deeplab/deeplab_test/deeplab.py"),
+                   Path("./models/semantic/deeplab/deeplab_test/iter_20000.pth")),
+}
+DETECTOR_MODEL = ("mmyolo",
+                  Path("./models/objdetection/mmyolo/mmyolov8/mmyolov8_config.py"),
+                  Path("./models/objdetection/mmyolo/mmyolov8/epoch_800.pth"))
+SEMANTIC_PALETTE = [[0,0,0],[0,255,0]]
+
+def model_key(model_name:str) -> str:
+    """gdrive / export key of a model shown in the app, the pipeline's key is its detector's"""
+    if model_name in SEMANTIC_MODELS:
+        return SEMANTIC_MODELS[model_name][0]
+    return DETECTOR_MODEL[0]
+
+# -- backbone -> (checkpoint, download url). vit_h is the most accurate, vit_b is ~4x smaller and much faster on CPU -- #
+SAM_MODELS = {
+    "vit_h": ("models/sam/sam_vit_h_4b8939.pth", "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_h_4b8939.pth"), # 2.5GB
+    "vit_l": ("models/sam/sam_vit_l_0b3195.pth", "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_l_0b3195.pth"), # 1.2GB
+    "vit_b": ("models/sam/sam_vit_b_01ec64.pth", "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_b_01ec64.pth"), # 375MB
+}
+
+def default_sam_model(device=None) -> str:
+    """
+    NAME: default_sam_model
+    DESC: SAM backbone to use when none is chosen: SAM_MODEL_TYPE env var if set, otherwise vit_h on
+          GPU and the lightweight vit_b on CPU. device is taken as already resolved (e.g. an inference
+          server's), only None asks devices.select_device (which imports torch).
+    """
+    env_model = os.environ.get("SAM_MODEL_TYPE")
+    if env_model in SAM_MODELS:
+        return env_model
+    device = select_device() if device is None else str(device)
+    return "vit_h" if device.startswith("cuda") else "vit_b"
+
+
+class Detections(NamedTuple):
+    """Detector output for one image, already on the host"""
+    boxes: np.ndarray   # (N, 4) int32 | x1, y1, x2, y2
+    scores: np.ndarray  # (N,) float32
+    labels: np.ndarray  # (N,) int64
+
+
+class InstanceTable(NamedTuple):
+    """Per nucleus measurements, row i describes label i + 1 of the instance map"""
+    bboxes: np.ndarray     # (N, 4) int32 | x1, y1, x2, y2 of the mask extent
+    areas: np.ndarray      # (N,) int64 | pixels
+    centroids: np.ndarray  # (N, 2) float32 | x, y
+    scores: np.ndarray     # (N,) float32 | SAM predicted IoU
+
+
+class PipelineResult(NamedTuple):
+    detections: Detections
+    instance_map: np.ndarray
+    instances: InstanceTable
+    sam_timings: List[float]
+
+
+def pipeline_arrays(result:PipelineResult) -> dict:
+    """Flat {name: array} of a PipelineResult (prediction cache / inference server payload)"""
+    return {**result.detections._asdict(),
+            **{"instance_" + k: v for k, v in result.instances._asdict().items()},
+            "instance_map": result.instance_map}
+
+def pipeline_from_arrays(arrays:dict, sam_timings:List[float]) -> PipelineResult:
+    """Inverse of pipeline_arrays"""
+    return PipelineResult(
+        detections=Detections(**{k: arrays[k] for k in Detections._fields}),
+        instance_map=arrays["instance_map"],
+        instances=InstanceTable(**{k: arrays["instance_" + k] for k in InstanceTable._fields}),
+        sam_timings=list(sam_timings))
+
+
+# -- [ Adding more util functions from dataset_selector ] -- #
+@st.cache_data
+def load_images():
+    image_files = glob.glob("images/MoNuSeg/*/*.png")
+    images_subset = []
+    for image_file in image_files:
+        image_file = image_file.replace("\\", "/")
+        image_subset = image_file.split("/")
+        if image_subset[2] not in images_subset:
+            images_subset.append(image_subset[2])
+
+    images_subset.sort()
+    return image_files, images_subset
+
+@st.cache_data
+def load_images_test_datasets():
+    image_files = glob.glob("images/*/test/*.png")
+    images_subset = []
+    for image_file in image_files:
+        image_file = image_file.replace("\\", "/")
+        image_subset = image_file.split("/")
+        # will select dataset name from list of images
+        if image_subset[1] not in images_subset:
+            images_subset.append(image_subset[1])
+    images_subset.sort()
+    return image_files, images_subset
+
+
+def binary_to_bgr(img: np.ndarray) -> np.ndarray:
+    """binary_to_bgr
+    DESCRIPTION: Function which takes in binary image (GT mask or prediction mask) and 
+    creates a BGR image of it (white where non zero). This image can be seen and used for displaying.
+    ARGS:
+    -------
+    img (np.ndarray): binary image to convert to BGR
+    """
+    return compositor.colour_labels(np.asarray(img) > 0, compositor.BINARY_PALETTE)
+
+def name_processer(img:str):
+    imagepre = img.split(sep="/")
+    name = imagepre[3]
+    return name
+
+def mask_searcher(name:str):
+    mask_file = f"images/MoNuSeg/masks/test/{name}"
+    file = None
+    if os.path.isfile(mask_file):
+        file = mask_file
+    else:
+        file = None
+    return file
+
+
+# -- [ In-memory image I/O ] -- #
+def decode_image(data, flags:int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """
+    NAME: decode_image
+    DESC: Decodes an encoded image (bytes, or the buffer of an uploaded file) in memory, no temp file
+    OUTPUT: image as cv2.imread would give it (BGR for the default flags)
+    """
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if image is None:
+        raise ValueError("Could not decode the image, is it a valid png?")
+    return image
+
+@st.cache_data
+def read_mask(path:str) -> np.ndarray:
+    """Grayscale ground truth mask, decoded once per server"""
+    return cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+
+
+@st.cache_data
+def model_accuracy(gt: np.ndarray, pred: np.ndarray, name: str = "", class_idx=1) -> pd.DataFrame:
+    """
+    NAME: model_accuracy
+    DESC: Function which gives the metrics for a particular image from prediction and GT
+          (one confusion matrix pass, values are floats)
+    ARGS:
+    -------
+    gt, pred (np.ndarray): (H, W) ground truth / raw prediction masks
+    name (str): image name shown with the metrics
+    class_idx (int): class scored against all the others
+    """
+    results = {"name": name, **metrics.class_scores(metrics.confusion_matrix(gt, pred), class_idx)}
+    df = pd.DataFrame.from_dict(results, orient='index',)
+    return df
+
+
+@st.cache_data
+def gt_pred_overlay(gt: np.ndarray, pred: np.ndarray):
+    """
+    NAME: gt_pred_overlay
+    DESC: Function which gives a colourful image of how close prediction mask was to the ground truth
+          (RGB: ground truth blue, prediction red, overlap magenta)
+    """
+    return compositor.colour_labels(compositor.gt_pred_codes(gt, pred), compositor.GT_PRED_PALETTE)
+
+# -- [ GOOGLE DRIVE LINKS FOR MY WEIGHTS ] -- #
+def models_url(model:str):
+    '''
+    NAME: models_url
+    DESC: takes in type of model (deeplab, unet) and ouputs part of gdrive link
+    '''
+    urls = {
+        "deeplab":"https://drive.google.com/file/d/1Mo7_mY2S5_ojv9IQAO8eVTrwZfmJnYg9/view?usp=sharing",
+        "unet":"https://drive.google.com/file/d/1Y26DUPsp-SmLx5VQ17qQUIn_qqvYJtGS/view?usp=sharing",
+        "mmyolo":"https://drive.google.com/file/d/10dbZCqCNWOvAEFMYLvq1lajeJKCysSol/view?usp=sharing",
+        #"yolo":"",
+    }
+    return urls.get(model)
+
+def model_dest(model:str):
+    dirfull = {
+        "deeplab":"models/semantic/deeplab/deeplab_test/iter_20000.pth",
+        "unet":"models/semantic/unet/unet_test/iter_20000.pth", # 224.6MB
+        "mmyolo":"models/objdetection/mmyolo/mmyolov8/epoch_800.pth",
+        #"yolo":"",
+    }
+    return dirfull.get(model)
+
+# -- [ USING gdown module for downloading from gdrive url ]
+def download_path(modelstr:str):
+    import gdown
+    url_coding = models_url(model=modelstr)
+    output = model_dest(model=modelstr)
+    gdown.download(url=url_coding, output=output, quiet=False, fuzzy=True)
\ No newline at end of file
@@ -1,35 +1,130 @@
-import cv2
 import numpy as np
 # ---------------------------------------------------------------------------------------------------- #
-def precision(X: np.ndarray, y: np.ndarray, class_idx=1):
-    ground_truth = np.equal(X, class_idx)
-    predicted = np.equal(y, class_idx)
+# -- Every metric comes from the confusion matrix (rows ground truth, columns prediction), which is
+# -- built in one bincount pass over the pixels, for any number of classes. ConfusionMatrix adds
+# -- matrices up over many images for dataset level scores.
+METRIC_NAMES = ["accuracy", "precision", "recall", "f1", "iou"]
 
-    if predicted.sum() == 0:
-        return 0.0
-    else:
-        return (np.logical_and(ground_truth, predicted).sum() / predicted.sum())
 
-def accuracy(X: np.ndarray, y: np.ndarray, class_idx=1):
-    ground_truth = np.equal(X, class_idx)
-    predicted = np.equal(y, class_idx)
-    not_ground_truth = np.logical_not(ground_truth)
-    not_predicted = np.logical_not(predicted)
+def _labels(mask) -> np.ndarray:
+    mask = np.asarray(mask)
+    return mask.view(np.uint8) if mask.dtype == bool else mask
 
-    tp = np.logical_and(ground_truth, predicted).sum()
-    tn = np.logical_and(not_ground_truth, not_predicted).sum()
+def confusion_matrix(X: np.ndarray, y: np.ndarray, num_classes=None) -> np.ndarray:
+    """
+    NAME: confusion_matrix
+    DESC: (num_classes, num_classes) int64 pixel counts, [ground truth X, prediction y].
+          Without num_classes it covers labels 0 .. the largest one present.
+    """
+    ground_truth, predicted = _labels(X), _labels(y)
+    if ground_truth.shape != predicted.shape:
+        raise ValueError(f"Ground truth {ground_truth.shape} and prediction {predicted.shape} differ in shape")
+    trim = False
+    if num_classes is None:
+        # -- 8 bit masks: count all 256 labels and trim, saves two passes looking for the largest -- #
+        trim = ground_truth.dtype == np.uint8 and predicted.dtype == np.uint8
+        num_classes = 256 if trim else int(max(ground_truth.max(initial=0), predicted.max(initial=0))) + 1
+    # -- a label out of range would land in another cell of the flat index instead of failing -- #
+    for labels in (ground_truth, predicted):
+        negative = labels.dtype.kind not in "ub" and labels.min(initial=0) < 0
+        if negative or (not trim and labels.max(initial=0) >= num_classes):
+            raise ValueError(f"Labels outside 0 .. {num_classes - 1}")
+    index = ground_truth.astype(np.intp) * num_classes
+    index += predicted
+    counts = np.bincount(index.ravel(), minlength=num_classes * num_classes)
+    matrix = counts.reshape(num_classes, num_classes)
+    if trim:
+        used = np.flatnonzero(matrix.any(axis=0) | matrix.any(axis=1))
+        size = max(2, int(used[-1]) + 1) if used.size else 2
+        matrix = matrix[:size, :size]
+    return matrix
 
-    # ground_truth.size represents TN + TP + FN + FP, as it contains all pixels.
-    return ((tp + tn) / ground_truth.size)
+def class_counts(matrix: np.ndarray, class_idx=1) -> dict:
+    """tp / fp / fn / tn of class_idx against every other class"""
+    total = int(matrix.sum())
+    if class_idx >= len(matrix):
+        return {"tp": 0, "fp": 0, "fn": 0, "tn": total}
+    tp = int(matrix[class_idx, class_idx])
+    fp = int(matrix[:, class_idx].sum()) - tp
+    fn = int(matrix[class_idx, :].sum()) - tp
+    return {"tp": tp, "fp": fp, "fn": fn, "tn": total - tp - fp - fn}
 
-def recall(X: np.ndarray, y: np.ndarray, class_idx=1):
-    ground_truth = np.equal(X, class_idx)
-    predicted = np.equal(y, class_idx)
+def counts_matrix(tp: int, fp: int, fn: int, tn: int) -> np.ndarray:
+    """Binary confusion matrix back from class_counts (e.g. summed over many images)"""
+    return np.array([[tn, fp], [fn, tp]], dtype=np.int64)
 
-    if ground_truth.sum() == 0:
-        return 0.0
-    else:
-        return (np.logical_and(ground_truth, predicted).sum() / ground_truth.sum())
+def class_scores(matrix: np.ndarray, class_idx=1) -> dict:
+    """accuracy / precision / recall / f1 / iou (floats) of class_idx against every other class"""
+    counts = class_counts(matrix, class_idx)
+    tp, fp, fn, tn = counts["tp"], counts["fp"], counts["fn"], counts["tn"]
+    total = tp + fp + fn + tn
+    precision_ = tp / (tp + fp) if tp + fp else 0.0
+    recall_ = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "accuracy": (tp + tn) / total if total else 0.0,
+        "precision": precision_,
+        "recall": recall_,
+        "f1": f1(precision_, recall_),
+        "iou": tp / (tp + fp + fn) if tp + fp + fn else 0.0,
+    }
+
+def per_class_scores(matrix: np.ndarray) -> dict:
+    """precision / recall / f1 / iou arrays (one value per class) plus overall pixel accuracy and mean IoU"""
+    matrix = matrix.astype(np.float64)
+    tp = np.diag(matrix)
+    predicted = matrix.sum(axis=0)
+    ground_truth = matrix.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision_ = np.where(predicted > 0, tp / predicted, 0.0)
+        recall_ = np.where(ground_truth > 0, tp / ground_truth, 0.0)
+        f1_ = np.where(precision_ + recall_ > 0, 2 * precision_ * recall_ / (precision_ + recall_), 0.0)
+        union = predicted + ground_truth - tp
+        iou_ = np.where(union > 0, tp / union, 0.0)
+    present = ground_truth > 0
+    return {
+        "precision": precision_, "recall": recall_, "f1": f1_, "iou": iou_,
+        "pixel_accuracy": float(tp.sum() / matrix.sum()) if matrix.sum() else 0.0,
+        "mean_iou": float(iou_[present].mean()) if present.any() else 0.0,
+    }
+
+
+class ConfusionMatrix:
+    """
+    NAME: ConfusionMatrix
+    DESC: Running confusion matrix over many images, update() with each (ground truth, prediction)
+          pair then read the dataset level scores.
+    """
+    def __init__(self, num_classes=2):
+        self.num_classes = num_classes
+        self.matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self.images = 0
+
+    def update(self, X: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Adds one image, returns its own matrix (for per image scores)"""
+        matrix = confusion_matrix(X, y, self.num_classes)
+        self.add(matrix)
+        return matrix
+
+    def add(self, matrix: np.ndarray):
+        self.matrix += matrix
+        self.images += 1
+
+    def scores(self, class_idx=1) -> dict:
+        return class_scores(self.matrix, class_idx)
+
+    def per_class(self) -> dict:
+        return per_class_scores(self.matrix)
+
+
+# -- [ Single metrics of class_idx (one pass each, prefer class_scores when several are needed) ] -- #
+def precision(X: np.ndarray, y: np.ndarray, class_idx=1):
+    return class_scores(confusion_matrix(np.equal(X, class_idx), np.equal(y, class_idx), 2))["precision"]
+
+def accuracy(X: np.ndarray, y: np.ndarray, class_idx=1):
+    return class_scores(confusion_matrix(np.equal(X, class_idx), np.equal(y, class_idx), 2))["accuracy"]
+
+def recall(X: np.ndarray, y: np.ndarray, class_idx=1):
+    return class_scores(confusion_matrix(np.equal(X, class_idx), np.equal(y, class_idx), 2))["recall"]
 
 def f1(precision: float, recall: float):
     if (precision + recall) == 0:
@@ -38,14 +133,4 @@ def f1(precision: float, recall: float):
     return 2 * ((precision * recall) / (precision + recall))
 
 def iou(X: np.ndarray, y: np.ndarray, class_idx=1):
-    ground_truth = np.equal(X, class_idx)
-    predicted = np.equal(y, class_idx)
-
-    intersection = np.logical_and(ground_truth, predicted).sum()
-    union = predicted.sum() + ground_truth.sum() - intersection
-
-    if union == 0:
-        return 0.0
-    else:
-        return intersection / union
-
+    return class_scores(confusion_matrix(np.equal(X, class_idx), np.equal(y, class_idx), 2))["iou"]
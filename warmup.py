@@ -0,0 +1,121 @@
+# -- [ Background model warm-up at server start ] -- #
+# Loads the configured models into the process wide cache (the same @st.cache_resource entries the
+# processors use) and runs one dummy forward pass at the real tile size, so weight downloads,
+# registry setup and first-call autotuning happen before the first user clicks Process.
+# Runs in a daemon thread, the UI stays responsive and reads per-model readiness from status().
+#   APP_WARMUP      = comma separated models to warm up: U-Net, Deeplabv3+, MMYOLOv8, SAM or all (default: none)
+#   APP_WARMUP_TILE = side of the dummy tile in pixels (default 1000, a MoNuSeg ROI)
+import os
+import threading
+import time
+from typing import List, Optional
+import numpy as np
+# -- ############################### -- #
+
+WARMUP_MODELS = ["U-Net", "Deeplabv3+", "MMYOLOv8", "SAM"]
+WARMUP_TILE = int(os.environ.get("APP_WARMUP_TILE", 1000))
+
+PENDING, LOADING, WARMING, READY, FAILED = "pending", "loading", "warming up", "ready", "failed"
+
+
+def configured_models(value:Optional[str] = None) -> List[str]:
+    """Models named in APP_WARMUP (or value), in warm-up order"""
+    value = os.environ.get("APP_WARMUP", "") if value is None else value
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    if any(name.lower() == "all" for name in names):
+        return list(WARMUP_MODELS)
+    unknown = [name for name in names if name not in WARMUP_MODELS]
+    if unknown:
+        print(f"[!] Unknown warm-up models {unknown}, expected some of {WARMUP_MODELS}")
+    return [name for name in WARMUP_MODELS if name in names]
+
+
+class ModelWarmup:
+    """
+    NAME: ModelWarmup
+    DESC: Warms up models one after another in a background thread and keeps a status row per model
+          (state, load seconds, dummy forward seconds, error).
+    """
+    def __init__(self, models:List[str], tile:int = WARMUP_TILE):
+        self.models = list(models)
+        self.tile = tile
+        self._lock = threading.Lock()
+        self._status = {name: {"model": name, "state": PENDING, "load_s": None, "forward_s": None, "error": ""}
+                        for name in self.models}
+        self._thread = None
+
+    def start(self) -> "ModelWarmup":
+        if self.models and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            return [dict(row) for row in self._status.values()]
+
+    def is_ready(self, model:str) -> bool:
+        """True when model was warmed up (models not configured for warm-up are never 'ready')"""
+        with self._lock:
+            return self._status.get(model, {}).get("state") == READY
+
+    def _update(self, model:str, **fields):
+        with self._lock:
+            self._status[model].update(fields)
+
+    def _run(self):
+        for model in self.models:
+            try:
+                self._update(model, state=LOADING)
+                start = time.perf_counter()
+                forward = self._load(model)
+                self._update(model, state=WARMING, load_s=round(time.perf_counter() - start, 2))
+                start = time.perf_counter()
+                forward()
+                self._update(model, state=READY, forward_s=round(time.perf_counter() - start, 2))
+                print(f"[*] Warm-up: {model} ready")
+            except Exception as error: # -- a failed warm-up must never take the server down -- #
+                self._update(model, state=FAILED, error=f"{type(error).__name__}: {error}")
+                print(f"[!] Warm-up of {model} failed: {error}")
+
+    def _load(self, model:str):
+        """Loads model into the shared cache, returns the dummy forward pass to run next"""
+        import exported_backend
+        import inference
+        import utils
+        from devices import select_device
+        from quantization import use_int8
+        from utils_common import model_key
+        tile = np.zeros((self.tile, self.tile, 3), dtype=np.uint8)
+        if model in inference.SEMANTIC_MODELS:
+            modelstr = model_key(model)
+            backend = exported_backend.model_backend(modelstr)
+            if backend == "pytorch":
+                inference.semantic_model(model)
+            else:
+                exported_backend.load_exported(modelstr, backend)
+            return lambda: inference.semantic_inference(model, [tile])
+        if model == "MMYOLOv8":
+            backend = exported_backend.model_backend(inference.DETECTOR_MODEL[0])
+            if backend == "pytorch":
+                inference.detector_model()
+            else:
+                exported_backend.load_exported(inference.DETECTOR_MODEL[0], backend)
+            return lambda: inference.detection_inference(tile)
+        # -- SAM: image encoder + one prompt through the decoder, bypassing the embedding cache -- #
+        device = select_device()
+        # -- same arguments as inference.pipeline_inference so it hits the same cache entry -- #
+        predictor = utils.sam_init(model_type=utils.default_sam_model(device), device=device, quantize=use_int8(device))
+        def forward():
+            with inference.SAM_LOCK:
+                predictor.set_image(tile)
+                box = np.array([[0, 0, self.tile // 4, self.tile // 4]], dtype=np.int32)
+                for _ in utils.stream_prompts_sam(tile.shape, predictor, utils.input_boxes_sam(box)):
+                    pass
+                predictor.reset_image()
+        return forward
+
+
+def start_warmup(models:Optional[List[str]] = None) -> ModelWarmup:
+    """Starts warming up models (default: APP_WARMUP) in the background"""
+    return ModelWarmup(configured_models() if models is None else models).start()